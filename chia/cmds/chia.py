@@ -2,6 +2,7 @@ import click
 
 from chia import __version__
 from chia.cmds.configure import configure_cmd
+from chia.cmds.db import db_cmd
 from chia.cmds.farm import farm_cmd
 from chia.cmds.init import init_cmd
 from chia.cmds.keys import keys_cmd
@@ -72,6 +73,7 @@ cli.add_command(start_cmd)
 cli.add_command(stop_cmd)
 cli.add_command(netspace_cmd)
 cli.add_command(farm_cmd)
+cli.add_command(db_cmd)
 
 
 def main() -> None:
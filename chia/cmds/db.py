@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import click
+
+
+@click.group("db", short_help="Manage the blockchain database")
+def db_cmd() -> None:
+    pass
+
+
+@db_cmd.command("upgrade", short_help="Convert a v1 blockchain database to the v2 schema")
+@click.option("--input", default=None, type=click.Path(), help="Path to the v1 database")
+@click.option(
+    "--output",
+    default=None,
+    type=click.Path(),
+    help="Path to write the v2 database to, defaults to the v1 path with _v1_ replaced by _v2_",
+)
+@click.option(
+    "--no-update-config",
+    default=False,
+    is_flag=True,
+    help="Don't point the full node's database_path at the new database once the upgrade is done",
+)
+@click.pass_context
+def db_upgrade_cmd(ctx: click.Context, no_update_config: bool, **kwargs) -> None:
+    from .db_upgrade_func import db_upgrade_func
+
+    in_db_path = kwargs.get("input")
+    out_db_path = kwargs.get("output")
+    db_upgrade_func(
+        Path(ctx.obj["root_path"]),
+        None if in_db_path is None else Path(in_db_path),
+        None if out_db_path is None else Path(out_db_path),
+        not no_update_config,
+    )
@@ -0,0 +1,246 @@
+import sqlite3
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from chia.util.config import load_config, save_config
+from chia.util.db_version import lookup_db_version_sync, set_db_version
+from chia.util.path import mkdir, path_from_root
+
+# Number of rows copied and committed at a time. Progress is saved after each batch, so an interrupted
+# upgrade resumes from the last committed batch
+BATCH_SIZE = 10000
+
+# The source database may still be in use by a running full node. Coins created or spent this close to the
+# peak seen when the upgrade started are copied again at the end, to pick up changes from new blocks and reorgs
+REORG_MARGIN = 100
+
+
+def db_upgrade_func(
+    root_path: Path,
+    in_db_path: Optional[Path] = None,
+    out_db_path: Optional[Path] = None,
+    update_config: bool = True,
+) -> None:
+    config: Dict = load_config(root_path, "config.yaml")
+    db_pattern: str = config["full_node"]["database_path"]
+    selected_network: str = config["full_node"]["selected_network"]
+
+    # Only keep the CHALLENGE placeholder in the config when both paths come from it
+    new_db_pattern: Optional[str] = None
+    if in_db_path is None and out_db_path is None and "_v1_" in db_pattern:
+        new_db_pattern = db_pattern.replace("_v1_", "_v2_")
+
+    if in_db_path is None:
+        in_db_path = path_from_root(root_path, db_pattern.replace("CHALLENGE", selected_network))
+    if out_db_path is None:
+        if "_v1_" not in in_db_path.name:
+            raise RuntimeError(f"Cannot derive the output path from {in_db_path}, please specify --output")
+        out_db_path = in_db_path.parent / in_db_path.name.replace("_v1_", "_v2_")
+
+    print(f"upgrading {in_db_path} to {out_db_path}")
+    mkdir(out_db_path.parent)
+    convert_v1_to_v2(in_db_path, out_db_path)
+
+    if update_config:
+        new_db_path = new_db_pattern if new_db_pattern is not None else str(out_db_path.resolve())
+        print(f"updating config.yaml database_path to {new_db_path}")
+        config["full_node"]["database_path"] = new_db_path
+        save_config(root_path, "config.yaml", config)
+
+    print(f"\n\nLEAVING PREVIOUS DB FILE UNTOUCHED {in_db_path}\n")
+
+
+def _hash_to_bytes(value: str) -> bytes:
+    return bytes.fromhex(value)
+
+
+def _convert_coin_record(row: Tuple) -> Tuple:
+    return (
+        _hash_to_bytes(row[0]),
+        row[1],
+        row[2],
+        row[3],
+        row[4],
+        _hash_to_bytes(row[5]),
+        _hash_to_bytes(row[6]),
+        row[7],
+        row[8],
+    )
+
+
+def _convert_full_block(row: Tuple) -> Tuple:
+    return (_hash_to_bytes(row[0]), row[1], row[2], row[3], row[4])
+
+
+def _convert_block_record(row: Tuple) -> Tuple:
+    return (_hash_to_bytes(row[0]), _hash_to_bytes(row[1]), row[2], row[3], row[4], row[5], row[6])
+
+
+def _convert_unchanged(row: Tuple) -> Tuple:
+    return tuple(row)
+
+
+# (table name, number of columns, row conversion)
+TABLES: List[Tuple[str, int, Callable[[Tuple], Tuple]]] = [
+    ("full_blocks", 5, _convert_full_block),
+    ("block_records", 7, _convert_block_record),
+    ("sub_epoch_segments_v3", 2, _convert_unchanged),
+    ("coin_record", 9, _convert_coin_record),
+]
+
+
+def _create_v2_tables(out_db: sqlite3.Connection) -> None:
+    # Indices are created by the stores when the full node opens the database, which keeps the bulk inserts fast
+    out_db.execute(
+        "CREATE TABLE IF NOT EXISTS full_blocks(header_hash blob PRIMARY KEY, height bigint,"
+        "  is_block tinyint, is_fully_compactified tinyint, block blob)"
+    )
+    out_db.execute(
+        "CREATE TABLE IF NOT EXISTS block_records(header_hash "
+        "blob PRIMARY KEY, prev_hash blob, height bigint,"
+        "block blob, sub_epoch_summary blob, is_peak tinyint, is_block tinyint)"
+    )
+    out_db.execute(
+        "CREATE TABLE IF NOT EXISTS sub_epoch_segments_v3(ses_block_hash text PRIMARY KEY, challenge_segments blob)"
+    )
+    out_db.execute(
+        "CREATE TABLE IF NOT EXISTS coin_record("
+        "coin_name blob PRIMARY KEY,"
+        " confirmed_index bigint,"
+        " spent_index bigint,"
+        " spent int,"
+        " coinbase int,"
+        " puzzle_hash blob,"
+        " coin_parent blob,"
+        " amount blob,"
+        " timestamp bigint)"
+    )
+    out_db.execute("CREATE TABLE IF NOT EXISTS block_compression_dicts(id integer PRIMARY KEY, dict blob)")
+    out_db.execute("CREATE TABLE IF NOT EXISTS migration_progress(name text PRIMARY KEY, value bigint)")
+    out_db.commit()
+
+
+def _get_progress(out_db: sqlite3.Connection, name: str) -> Optional[int]:
+    row = out_db.execute("SELECT value from migration_progress WHERE name=?", (name,)).fetchone()
+    return None if row is None else row[0]
+
+
+def _set_progress(out_db: sqlite3.Connection, name: str, value: int) -> None:
+    out_db.execute("INSERT OR REPLACE INTO migration_progress VALUES(?, ?)", (name, value))
+
+
+def _copy_table(
+    in_db: sqlite3.Connection,
+    out_db: sqlite3.Connection,
+    table: str,
+    num_columns: int,
+    convert: Callable[[Tuple], Tuple],
+    batch_size: int,
+) -> int:
+    """
+    Copies the rows of a table in rowid order, in batches. Each batch is committed together with the last
+    copied rowid, so the copy can be resumed. Rows replaced in the source get a new rowid, and are copied again.
+    """
+    last_rowid: int = _get_progress(out_db, table) or 0
+    placeholders = ", ".join(["?"] * num_columns)
+    copied = 0
+    start = time.time()
+    while True:
+        rows = in_db.execute(
+            f"SELECT rowid, * FROM {table} WHERE rowid>? ORDER BY rowid LIMIT ?", (last_rowid, batch_size)
+        ).fetchall()
+        if len(rows) == 0:
+            break
+        out_db.executemany(f"INSERT OR REPLACE INTO {table} VALUES({placeholders})", [convert(row[1:]) for row in rows])
+        last_rowid = rows[-1][0]
+        _set_progress(out_db, table, last_rowid)
+        out_db.commit()
+        copied += len(rows)
+        print(f"\r{table}: {copied} rows copied ({copied / max(time.time() - start, 0.001):0.0f} rows/s)", end="")
+    if copied > 0:
+        print()
+    return copied
+
+
+def _sync_recent_coins(in_db: sqlite3.Connection, out_db: sqlite3.Connection, height: int) -> None:
+    # Mirrors a rollback to height in the output, then copies the current state of all coins created or spent
+    # above it. This covers coins spent, unspent or removed by a node that kept running during the upgrade.
+    out_db.execute("DELETE FROM coin_record WHERE confirmed_index>?", (height,))
+    out_db.execute("UPDATE coin_record SET spent_index=0, spent=0 WHERE spent_index>?", (height,))
+    rows = in_db.execute(
+        "SELECT * FROM coin_record WHERE confirmed_index>? OR spent_index>?", (height, height)
+    ).fetchall()
+    out_db.executemany(
+        "INSERT OR REPLACE INTO coin_record VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [_convert_coin_record(row) for row in rows],
+    )
+
+
+def _copy_compression_dicts(in_db: sqlite3.Connection, out_db: sqlite3.Connection) -> None:
+    # Compressed blocks are copied as they are, so the dictionaries they were compressed with are needed too
+    table = in_db.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='block_compression_dicts'"
+    ).fetchone()
+    if table is None:
+        return
+    rows = in_db.execute("SELECT id, dict FROM block_compression_dicts").fetchall()
+    out_db.executemany("INSERT OR REPLACE INTO block_compression_dicts VALUES(?, ?)", rows)
+
+
+def convert_v1_to_v2(in_path: Path, out_path: Path, batch_size: int = BATCH_SIZE) -> None:
+    """
+    Converts a version 1 full node database (hex text keys) to version 2 (32 byte blob keys). The output is
+    written to a temporary file next to out_path, which is renamed once the conversion is complete. Running
+    the conversion again after an interruption resumes from the temporary file.
+    """
+    if out_path.exists():
+        raise RuntimeError(f"output file already exists: {out_path}")
+    if not in_path.exists():
+        raise RuntimeError(f"input file doesn't exist: {in_path}")
+
+    tmp_path = out_path.parent / (out_path.name + ".upgrading")
+    # The input is only read from. Autocommit mode lets the final catch up run in an explicit read transaction
+    in_db = sqlite3.connect(in_path, isolation_level=None)
+    out_db = sqlite3.connect(tmp_path)
+    try:
+        if lookup_db_version_sync(in_db) != 1:
+            raise RuntimeError(f"{in_path} is not a version 1 database")
+
+        _create_v2_tables(out_db)
+        start_height: Optional[int] = _get_progress(out_db, "start_peak_height")
+        if start_height is None:
+            peak_row = in_db.execute("SELECT height from block_records WHERE is_peak=1").fetchone()
+            start_height = 0 if peak_row is None else peak_row[0]
+            _set_progress(out_db, "start_peak_height", start_height)
+            out_db.commit()
+        else:
+            print(f"resuming upgrade in {tmp_path}")
+
+        for table, num_columns, convert in TABLES:
+            _copy_table(in_db, out_db, table, num_columns, convert, batch_size)
+
+        # Catch up with anything the full node wrote in the meantime, from a consistent snapshot of the input
+        in_db.execute("BEGIN")
+        try:
+            for table, num_columns, convert in TABLES:
+                _copy_table(in_db, out_db, table, num_columns, convert, batch_size)
+            _sync_recent_coins(in_db, out_db, max(start_height - REORG_MARGIN, 0) - 1)
+            _copy_compression_dicts(in_db, out_db)
+
+            peak_row = in_db.execute("SELECT header_hash from block_records WHERE is_peak=1").fetchone()
+            out_db.execute("UPDATE block_records SET is_peak=0 WHERE is_peak=1")
+            if peak_row is not None:
+                out_db.execute("UPDATE block_records SET is_peak=1 WHERE header_hash=?", (_hash_to_bytes(peak_row[0]),))
+            out_db.execute("DROP TABLE migration_progress")
+            out_db.commit()
+        finally:
+            in_db.execute("ROLLBACK")
+
+        set_db_version(out_db, 2)
+    finally:
+        in_db.close()
+        out_db.close()
+
+    tmp_path.rename(out_path)
+    print(f"upgrade complete: {out_path}")
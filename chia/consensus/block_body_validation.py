@@ -2,7 +2,7 @@ import collections
 import logging
 from typing import Dict, List, Optional, Set, Tuple, Union, Callable
 
-from blspy import AugSchemeMPL, G1Element
+from blspy import G1Element
 from chiabip158 import PyBIP158
 from clvm.casts import int_from_bytes
 
@@ -15,9 +15,11 @@ from chia.consensus.coinbase import create_farmer_coin, create_pool_coin
 from chia.consensus.constants import ConsensusConstants
 from chia.consensus.cost_calculator import NPCResult, calculate_cost_of_program
 from chia.consensus.find_fork_point import find_fork_point_in_chain
+from chia.consensus.npc_result_cache import NPCResultCache
 from chia.full_node.block_store import BlockStore
 from chia.full_node.coin_store import CoinStore
 from chia.full_node.mempool_check_conditions import get_name_puzzle_conditions
+from chia.types.block_coin_changes import BlockCoinChanges
 from chia.types.blockchain_format.coin import Coin
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.coin_record import CoinRecord
@@ -27,6 +29,7 @@ from chia.types.full_block import FullBlock
 from chia.types.generator_types import BlockGenerator
 from chia.types.name_puzzle_condition import NPC
 from chia.types.unfinished_block import UnfinishedBlock
+from chia.util import cached_bls
 from chia.util.condition_tools import (
     pkm_pairs_for_conditions_dict,
     coin_announcements_names_for_npc,
@@ -54,6 +57,7 @@ async def validate_block_body(
     npc_result: Optional[NPCResult],
     fork_point_with_peak: Optional[uint32],
     get_block_generator: Callable,
+    npc_result_cache: Optional[NPCResultCache] = None,
 ) -> Tuple[Optional[Err], Optional[NPCResult]]:
     """
     This assumes the header block has been completely validated.
@@ -61,7 +65,7 @@ async def validate_block_body(
     validates correctly, or an Err if something does not validate. For the second value, returns a CostResult
     only if validation succeeded, and there are transactions. In other cases it returns None. The NPC result is
     the result of running the generator with the previous generators refs. It is only present for transaction
-    blocks which have spent coins.
+    blocks which have spent coins. If npc_result_cache is given, it is used for the generators of fork blocks.
     """
     if isinstance(block, FullBlock):
         assert height == block.height
@@ -307,61 +311,35 @@ async def validate_block_body(
 
         # For height 0, there are no additions and removals before this block, so we can skip
         if height > 0:
-            # First, get all the blocks in the fork > fork_h, < block.height
-            prev_block: Optional[FullBlock] = await block_store.get_full_block(block.prev_header_hash)
-            reorg_blocks: Dict[uint32, FullBlock] = {}
-            curr: Optional[FullBlock] = prev_block
+            # Walk back through the blocks in the fork > fork_h, < block.height
+            curr: Optional[BlockRecord] = await blocks.get_block_record_from_db(block.prev_header_hash)
             assert curr is not None
             while curr.height > fork_h:
-                if curr.height == 0:
-                    break
-                curr = await block_store.get_full_block(curr.prev_header_hash)
-                assert curr is not None
-                reorg_blocks[curr.height] = curr
-            if fork_h != -1:
-                assert len(reorg_blocks) == height - fork_h - 1
-
-            curr = prev_block
-            assert curr is not None
-            while curr.height > fork_h:
-                # Coin store doesn't contain coins from fork, we have to run generator for each block in fork
-                if curr.transactions_generator is not None:
-                    # These blocks are in the past and therefore assumed to be valid, so get_block_generator won't raise
-                    curr_block_generator: Optional[BlockGenerator] = await get_block_generator(curr)
-                    assert curr_block_generator is not None and curr.transactions_info is not None
-                    curr_npc_result = get_name_puzzle_conditions(
-                        curr_block_generator,
-                        min(constants.MAX_BLOCK_COST_CLVM, curr.transactions_info.cost),
-                        cost_per_byte=constants.COST_PER_BYTE,
-                        safe_mode=False,
-                    )
-                    removals_in_curr, additions_in_curr = tx_removals_and_additions(curr_npc_result.npc_list)
-                else:
-                    removals_in_curr = []
-                    additions_in_curr = []
-
-                for c_name in removals_in_curr:
-                    assert c_name not in removals_since_fork
-                    removals_since_fork.add(c_name)
-                for c in additions_in_curr:
-                    assert c.name() not in additions_since_fork
-                    assert curr.foliage_transaction_block is not None
-                    additions_since_fork[c.name()] = (c, curr.height, curr.foliage_transaction_block.timestamp)
-
-                for coinbase_coin in curr.get_included_reward_coins():
-                    assert coinbase_coin.name() not in additions_since_fork
-                    assert curr.foliage_transaction_block is not None
-                    additions_since_fork[coinbase_coin.name()] = (
-                        coinbase_coin,
-                        curr.height,
-                        curr.foliage_transaction_block.timestamp,
+                # Coin store doesn't contain coins from fork, we use the coins stored for each block in fork
+                if curr.is_transaction_block:
+                    removals_in_curr, additions_in_curr = await _get_coin_changes(
+                        constants, block_store, curr.header_hash, get_block_generator, npc_result_cache
                     )
+                    assert curr.timestamp is not None and curr.reward_claims_incorporated is not None
+                    for c_name in removals_in_curr:
+                        assert c_name not in removals_since_fork
+                        removals_since_fork.add(c_name)
+                    for c in additions_in_curr:
+                        assert c.name() not in additions_since_fork
+                        additions_since_fork[c.name()] = (c, curr.height, curr.timestamp)
+                    for coinbase_coin in curr.reward_claims_incorporated:
+                        assert coinbase_coin.name() not in additions_since_fork
+                        additions_since_fork[coinbase_coin.name()] = (coinbase_coin, curr.height, curr.timestamp)
                 if curr.height == 0:
                     break
-                curr = reorg_blocks[curr.height - 1]
+                curr = await blocks.get_block_record_from_db(curr.prev_hash)
                 assert curr is not None
 
         removal_coin_records: Dict[bytes32, CoinRecord] = {}
+        # Look up all non-ephemeral removals at once, instead of one query per coin
+        removals_from_db: Dict[bytes32, CoinRecord] = await coin_store.get_coin_records(
+            [rem for rem in removals if rem not in additions_dic]
+        )
         for rem in removals:
             if rem in additions_dic:
                 # Ephemeral coin
@@ -376,7 +354,7 @@ async def validate_block_body(
                 )
                 removal_coin_records[new_unspent.name] = new_unspent
             else:
-                unspent = await coin_store.get_coin_record(rem)
+                unspent = removals_from_db.get(rem)
                 if unspent is not None and unspent.confirmed_block_index <= fork_h:
                     # Spending something in the current chain, confirmed before fork
                     # (We ignore all coins confirmed after fork)
@@ -478,7 +456,46 @@ async def validate_block_body(
             return Err.BAD_AGGREGATE_SIGNATURE, None
 
         # noinspection PyTypeChecker
-        if not AugSchemeMPL.aggregate_verify(pairs_pks, pairs_msgs, block.transactions_info.aggregated_signature):
+        if not cached_bls.aggregate_verify(pairs_pks, pairs_msgs, block.transactions_info.aggregated_signature):
             return Err.BAD_AGGREGATE_SIGNATURE, None
 
         return None, npc_result
+
+
+async def _get_coin_changes(
+    constants: ConsensusConstants,
+    block_store: BlockStore,
+    header_hash: bytes32,
+    get_block_generator: Callable,
+    npc_result_cache: Optional[NPCResultCache],
+) -> Tuple[List[bytes32], List[Coin]]:
+    """
+    Returns the removals and additions of the transactions of a stored block. They are stored with the block, the
+    generator is only run again for blocks that were stored without them.
+    """
+    coin_changes: Optional[BlockCoinChanges] = await block_store.get_coin_changes(header_hash)
+    if coin_changes is not None:
+        return coin_changes.removals, coin_changes.additions
+    curr: Optional[FullBlock] = await block_store.get_full_block(header_hash)
+    assert curr is not None
+    if curr.transactions_generator is None:
+        return [], []
+    # These blocks are in the past and therefore assumed to be valid, so get_block_generator won't raise
+    curr_block_generator: Optional[BlockGenerator] = await get_block_generator(curr)
+    assert curr_block_generator is not None and curr.transactions_info is not None
+    curr_max_cost = min(constants.MAX_BLOCK_COST_CLVM, curr.transactions_info.cost)
+    if npc_result_cache is not None:
+        curr_npc_result = npc_result_cache.get_name_puzzle_conditions(
+            curr_block_generator,
+            curr_max_cost,
+            cost_per_byte=constants.COST_PER_BYTE,
+            safe_mode=False,
+        )
+    else:
+        curr_npc_result = get_name_puzzle_conditions(
+            curr_block_generator,
+            curr_max_cost,
+            cost_per_byte=constants.COST_PER_BYTE,
+            safe_mode=False,
+        )
+    return tx_removals_and_additions(curr_npc_result.npc_list)
@@ -192,12 +192,8 @@ def create_foliage(
         bip158: PyBIP158 = PyBIP158(byte_array_tx)
         encoded = bytes(bip158.GetEncoded())
 
-        removal_merkle_set = MerkleSet()
-        addition_merkle_set = MerkleSet()
-
         # Create removal Merkle set
-        for coin_name in tx_removals:
-            removal_merkle_set.add_already_hashed(coin_name)
+        removal_merkle_set = MerkleSet.from_already_hashed(tx_removals)
 
         # Create addition Merkle set
         puzzlehash_coin_map: Dict[bytes32, List[Coin]] = {}
@@ -209,9 +205,10 @@ def create_foliage(
                 puzzlehash_coin_map[coin.puzzle_hash] = [coin]
 
         # Addition Merkle set contains puzzlehash and hash of all coins with that puzzlehash
-        for puzzle, coins in puzzlehash_coin_map.items():
-            addition_merkle_set.add_already_hashed(puzzle)
-            addition_merkle_set.add_already_hashed(hash_coin_list(coins))
+        addition_merkle_set = MerkleSet.from_already_hashed(
+            [puzzle for puzzle in puzzlehash_coin_map]
+            + [hash_coin_list(coins) for coins in puzzlehash_coin_map.values()]
+        )
 
         additions_root = addition_merkle_set.get_root()
         removals_root = removal_merkle_set.get_root()
@@ -16,12 +16,8 @@ def validate_block_merkle_roots(
         tx_removals = []
     if tx_additions is None:
         tx_additions = []
-    removal_merkle_set = MerkleSet()
-    addition_merkle_set = MerkleSet()
-
     # Create removal Merkle set
-    for coin_name in tx_removals:
-        removal_merkle_set.add_already_hashed(coin_name)
+    removal_merkle_set = MerkleSet.from_already_hashed(tx_removals)
 
     # Create addition Merkle set
     puzzlehash_coins_map: Dict[bytes32, List[Coin]] = {}
@@ -33,9 +29,9 @@ def validate_block_merkle_roots(
             puzzlehash_coins_map[coin.puzzle_hash] = [coin]
 
     # Addition Merkle set contains puzzlehash and hash of all coins with that puzzlehash
-    for puzzle, coins in puzzlehash_coins_map.items():
-        addition_merkle_set.add_already_hashed(puzzle)
-        addition_merkle_set.add_already_hashed(hash_coin_list(coins))
+    addition_merkle_set = MerkleSet.from_already_hashed(
+        [puzzle for puzzle in puzzlehash_coins_map] + [hash_coin_list(coins) for coins in puzzlehash_coins_map.values()]
+    )
 
     additions_root = addition_merkle_set.get_root()
     removals_root = removal_merkle_set.get_root()
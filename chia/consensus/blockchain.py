@@ -4,6 +4,7 @@ import logging
 import multiprocessing
 from concurrent.futures.process import ProcessPoolExecutor
 from enum import Enum
+from pathlib import Path
 from typing import Dict, List, Optional, Set, Tuple, Union
 
 from chia.consensus.block_body_validation import validate_block_body
@@ -15,17 +16,25 @@ from chia.consensus.cost_calculator import NPCResult
 from chia.consensus.difficulty_adjustment import get_next_sub_slot_iters_and_difficulty
 from chia.consensus.find_fork_point import find_fork_point_in_chain
 from chia.consensus.full_block_to_block_record import block_to_block_record
-from chia.consensus.multiprocess_validation import PreValidationResult, pre_validate_blocks_multiprocessing
+from chia.consensus.multiprocess_validation import (
+    PreValidationResult,
+    WorkerBlockRecords,
+    init_validation_worker,
+    pre_validate_blocks_multiprocessing,
+)
+from chia.consensus.npc_result_cache import NPCResultCache
+from chia.full_node.block_height_map import BlockHeightMap
 from chia.full_node.block_store import BlockStore
 from chia.full_node.coin_store import CoinStore
-from chia.full_node.mempool_check_conditions import get_name_puzzle_conditions
+from chia.types.block_coin_changes import BlockCoinChanges
 from chia.types.blockchain_format.coin import Coin
+from chia.types.blockchain_format.program import SerializedProgram
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.blockchain_format.sub_epoch_summary import SubEpochSummary
 from chia.types.blockchain_format.vdf import VDFInfo
 from chia.types.coin_record import CoinRecord
 from chia.types.end_of_slot_bundle import EndOfSubSlotBundle
-from chia.types.full_block import FullBlock
+from chia.types.full_block import FullBlock, FullBlockView
 from chia.types.generator_types import BlockGenerator, GeneratorArg
 from chia.types.header_block import HeaderBlock
 from chia.types.unfinished_block import UnfinishedBlock
@@ -34,10 +43,14 @@ from chia.types.weight_proof import SubEpochChallengeSegment
 from chia.util.errors import Err
 from chia.util.generator_tools import get_block_header, tx_removals_and_additions
 from chia.util.ints import uint16, uint32, uint64, uint128
+from chia.util.lru_cache import LRUCache
 from chia.util.streamable import recurse_jsonify
 
 log = logging.getLogger(__name__)
 
+# Generators referenced by other blocks that are kept in memory, since blocks often reference the same ones
+REF_GENERATOR_CACHE_SIZE = 100
+
 
 class ReceiveBlockResult(Enum):
     """
@@ -63,17 +76,21 @@ class Blockchain(BlockchainInterface):
     __block_records: Dict[bytes32, BlockRecord]
     # all hashes of blocks in block_record by height, used for garbage collection
     __heights_in_cache: Dict[uint32, Set[bytes32]]
-    # Defines the path from genesis to the peak, no orphan blocks
-    __height_to_hash: Dict[uint32, bytes32]
-    # All sub-epoch summaries that have been included in the blockchain from the beginning until and including the peak
-    # (height_included, SubEpochSummary). Note: ONLY for the blocks in the path to the peak
-    __sub_epoch_summaries: Dict[uint32, SubEpochSummary] = {}
+    # Defines the path from genesis to the peak, no orphan blocks. Also holds all sub-epoch summaries that have been
+    # included in the blockchain from the beginning until and including the peak (ONLY for the blocks in the path)
+    __height_map: BlockHeightMap
     # Unspent Store
     coin_store: CoinStore
     # Store
     block_store: BlockStore
     # Used to verify blocks in parallel
     pool: ProcessPoolExecutor
+    # Block records resident in the pool's workers
+    worker_block_records: WorkerBlockRecords
+    # Results of generators that were already run, e.g. for the unfinished version of a block
+    npc_result_cache: NPCResultCache
+    # Height -> (header hash, generator) of referenced generators
+    ref_generator_cache: LRUCache
     # Set holding seen compact proofs, in order to avoid duplicates.
     _seen_compact_proofs: Set[Tuple[VDFInfo, uint32]]
 
@@ -89,11 +106,13 @@ class Blockchain(BlockchainInterface):
         coin_store: CoinStore,
         block_store: BlockStore,
         consensus_constants: ConsensusConstants,
+        height_map_path: Optional[Path] = None,
     ):
         """
         Initializes a blockchain with the BlockRecords from disk, assuming they have all been
         validated. Uses the genesis block given in override_constants, or as a fallback,
-        in the consensus constants config.
+        in the consensus constants config. If height_map_path is given, the height to hash
+        index is persisted next to it, to speed up the next startup.
         """
         self = Blockchain()
         self.lock = asyncio.Lock()  # External lock handled by full node
@@ -102,29 +121,33 @@ class Blockchain(BlockchainInterface):
         if cpu_count > 61:
             cpu_count = 61  # Windows Server 2016 has an issue https://bugs.python.org/issue26903
         num_workers = max(cpu_count - 2, 1)
-        self.pool = ProcessPoolExecutor(max_workers=num_workers)
+        self.constants = consensus_constants
+        self.constants_json = recurse_jsonify(dataclasses.asdict(self.constants))
+        self.pool = ProcessPoolExecutor(
+            max_workers=num_workers, initializer=init_validation_worker, initargs=(self.constants_json,)
+        )
+        self.worker_block_records = WorkerBlockRecords()
+        self.npc_result_cache = NPCResultCache()
+        self.ref_generator_cache = LRUCache(REF_GENERATOR_CACHE_SIZE)
         log.info(f"Started {num_workers} processes for block validation")
 
-        self.constants = consensus_constants
         self.coin_store = coin_store
         self.block_store = block_store
-        self.constants_json = recurse_jsonify(dataclasses.asdict(self.constants))
         self._shut_down = False
-        await self._load_chain_from_store()
+        await self._load_chain_from_store(height_map_path)
         self._seen_compact_proofs = set()
         return self
 
     def shut_down(self):
         self._shut_down = True
         self.pool.shutdown(wait=True)
+        self.__height_map.close()
 
-    async def _load_chain_from_store(self) -> None:
+    async def _load_chain_from_store(self, height_map_path: Optional[Path] = None) -> None:
         """
         Initializes the state of the Blockchain class from the database.
         """
-        height_to_hash, sub_epoch_summaries = await self.block_store.get_peak_height_dicts()
-        self.__height_to_hash = height_to_hash
-        self.__sub_epoch_summaries = sub_epoch_summaries
+        self.__height_map = await BlockHeightMap.create(self.block_store, height_map_path)
         self.__block_records = {}
         self.__heights_in_cache = {}
         block_records, peak = await self.block_store.get_block_records_close_to_peak(self.constants.BLOCKS_CACHE_SIZE)
@@ -138,7 +161,7 @@ class Blockchain(BlockchainInterface):
 
         assert peak is not None
         self._peak_height = self.block_record(peak).height
-        assert len(self.__height_to_hash) == self._peak_height + 1
+        assert self.__height_map.get_hash(self._peak_height) == peak
 
     def get_peak(self) -> Optional[BlockRecord]:
         """
@@ -203,7 +226,7 @@ class Blockchain(BlockchainInterface):
                     except ValueError:
                         return ReceiveBlockResult.INVALID_BLOCK, Err.GENERATOR_REF_HAS_NO_GENERATOR, None
                     assert block_generator is not None and block.transactions_info is not None
-                    npc_result = get_name_puzzle_conditions(
+                    npc_result = self.npc_result_cache.get_name_puzzle_conditions(
                         block_generator,
                         min(self.constants.MAX_BLOCK_COST_CLVM, block.transactions_info.cost),
                         cost_per_byte=self.constants.COST_PER_BYTE,
@@ -244,6 +267,7 @@ class Blockchain(BlockchainInterface):
             npc_result,
             fork_point_with_peak,
             self.get_block_generator,
+            npc_result_cache=self.npc_result_cache,
         )
         if error_code is not None:
             return ReceiveBlockResult.INVALID_BLOCK, error_code, None
@@ -262,21 +286,33 @@ class Blockchain(BlockchainInterface):
                 # Perform the DB operations to update the state, and rollback if something goes wrong
                 await self.block_store.db_wrapper.begin_transaction()
                 await self.block_store.add_full_block(header_hash, block, block_record)
+                if block.is_transaction_block():
+                    # Stored so forks built on this block don't need to run its generator again
+                    if npc_result is not None:
+                        tx_removals, tx_additions = tx_removals_and_additions(npc_result.npc_list)
+                    else:
+                        tx_removals, tx_additions = [], []
+                    await self.block_store.add_coin_changes(
+                        header_hash, block.height, BlockCoinChanges(tx_additions, tx_removals)
+                    )
                 fork_height, peak_height, records = await self._reconsider_peak(
                     block_record, genesis, fork_point_with_peak, npc_result
                 )
+                if peak_height is not None and peak_height > self.constants.BLOCKS_CACHE_SIZE:
+                    await self.block_store.prune_coin_changes(uint32(peak_height - self.constants.BLOCKS_CACHE_SIZE))
                 await self.block_store.db_wrapper.commit_transaction()
 
                 # Then update the memory cache. It is important that this task is not cancelled and does not throw
                 self.add_block_record(block_record)
                 for fetched_block_record in records:
-                    self.__height_to_hash[fetched_block_record.height] = fetched_block_record.header_hash
-                    if fetched_block_record.sub_epoch_summary_included is not None:
-                        self.__sub_epoch_summaries[
-                            fetched_block_record.height
-                        ] = fetched_block_record.sub_epoch_summary_included
+                    self.__height_map.update_height(
+                        fetched_block_record.height,
+                        fetched_block_record.header_hash,
+                        fetched_block_record.sub_epoch_summary_included,
+                    )
                 if peak_height is not None:
                     self._peak_height = peak_height
+                    self.__height_map.flush(peak_height)
             except BaseException:
                 self.block_store.rollback_cache_block(header_hash)
                 await self.block_store.db_wrapper.rollback_transaction()
@@ -328,13 +364,7 @@ class Blockchain(BlockchainInterface):
             if block_record.prev_hash != peak.header_hash:
                 await self.coin_store.rollback_to_block(fork_height)
             # Rollback sub_epoch_summaries
-            heights_to_delete = []
-            for ses_included_height in self.__sub_epoch_summaries.keys():
-                if ses_included_height > fork_height:
-                    heights_to_delete.append(ses_included_height)
-            for height in heights_to_delete:
-                log.info(f"delete ses at height {height}")
-                del self.__sub_epoch_summaries[height]
+            self.__height_map.rollback(fork_height)
 
             # Collect all blocks from fork point to new peak
             blocks_to_add: List[Tuple[FullBlock, BlockRecord]] = []
@@ -371,14 +401,14 @@ class Blockchain(BlockchainInterface):
         return None, None, []
 
     async def get_tx_removals_and_additions(
-        self, block: FullBlock, npc_result: Optional[NPCResult] = None
+        self, block: Union[FullBlock, FullBlockView], npc_result: Optional[NPCResult] = None
     ) -> Tuple[List[bytes32], List[Coin]]:
         if block.is_transaction_block():
             if block.transactions_generator is not None:
                 if npc_result is None:
                     block_generator: Optional[BlockGenerator] = await self.get_block_generator(block)
                     assert block_generator is not None
-                    npc_result = get_name_puzzle_conditions(
+                    npc_result = self.npc_result_cache.get_name_puzzle_conditions(
                         block_generator,
                         self.constants.MAX_BLOCK_COST_CLVM,
                         cost_per_byte=self.constants.COST_PER_BYTE,
@@ -530,12 +560,15 @@ class Blockchain(BlockchainInterface):
                 return PreValidationResult(uint16(Err.GENERATOR_REF_HAS_NO_GENERATOR.value), None, None)
             if block_generator is None:
                 return PreValidationResult(uint16(Err.GENERATOR_REF_HAS_NO_GENERATOR.value), None, None)
-            npc_result = get_name_puzzle_conditions(
-                block_generator,
-                min(self.constants.MAX_BLOCK_COST_CLVM, block.transactions_info.cost),
-                cost_per_byte=self.constants.COST_PER_BYTE,
-                safe_mode=False,
+            max_cost = min(self.constants.MAX_BLOCK_COST_CLVM, block.transactions_info.cost)
+            # Run in safe mode first, like pre-validation does for the finished block, so it reuses the cached result
+            npc_result = self.npc_result_cache.get_name_puzzle_conditions(
+                block_generator, max_cost, cost_per_byte=self.constants.COST_PER_BYTE, safe_mode=True
             )
+            if npc_result.error is not None:
+                npc_result = self.npc_result_cache.get_name_puzzle_conditions(
+                    block_generator, max_cost, cost_per_byte=self.constants.COST_PER_BYTE, safe_mode=False
+                )
         error_code, cost_result = await validate_block_body(
             self.constants,
             self,
@@ -547,6 +580,7 @@ class Blockchain(BlockchainInterface):
             npc_result,
             None,
             self.get_block_generator,
+            npc_result_cache=self.npc_result_cache,
         )
 
         if error_code is not None:
@@ -572,6 +606,8 @@ class Blockchain(BlockchainInterface):
             self.get_block_generator,
             batch_size,
             wp_summaries,
+            worker_block_records=self.worker_block_records,
+            npc_result_cache=self.npc_result_cache,
         )
 
     def contains_block(self, header_hash: bytes32) -> bool:
@@ -589,16 +625,16 @@ class Blockchain(BlockchainInterface):
         return self.block_record(header_hash)
 
     def get_ses_heights(self) -> List[uint32]:
-        return sorted(self.__sub_epoch_summaries.keys())
+        return self.__height_map.get_ses_heights()
 
     def get_ses(self, height: uint32) -> SubEpochSummary:
-        return self.__sub_epoch_summaries[height]
+        return self.__height_map.get_ses(height)
 
     def height_to_hash(self, height: uint32) -> Optional[bytes32]:
-        return self.__height_to_hash[height]
+        return self.__height_map.get_hash(height)
 
     def contains_height(self, height: uint32) -> bool:
-        return height in self.__height_to_hash
+        return self.__height_map.contains_height(height)
 
     def get_peak_height(self) -> Optional[uint32]:
         return self._peak_height
@@ -667,13 +703,14 @@ class Blockchain(BlockchainInterface):
                 header_hash: bytes32 = self.height_to_hash(uint32(height))
                 hashes.append(header_hash)
 
-        blocks: List[FullBlock] = []
+        blocks: List[Union[FullBlock, FullBlockView]] = []
         for hash in hashes.copy():
             block = self.block_store.block_cache.get(hash)
             if block is not None:
                 blocks.append(block)
                 hashes.remove(hash)
-        blocks_on_disk: List[FullBlock] = await self.block_store.get_blocks_by_hash(hashes)
+        # Only the header fields of the blocks on disk are parsed
+        blocks_on_disk: List[FullBlockView] = await self.block_store.get_block_views_by_hash(hashes)
         blocks.extend(blocks_on_disk)
         header_blocks: Dict[bytes32, HeaderBlock] = {}
 
@@ -771,7 +808,7 @@ class Blockchain(BlockchainInterface):
         return False
 
     async def get_block_generator(
-        self, block: Union[FullBlock, UnfinishedBlock], additional_blocks=None
+        self, block: Union[FullBlock, FullBlockView, UnfinishedBlock], additional_blocks=None
     ) -> Optional[BlockGenerator]:
         if additional_blocks is None:
             additional_blocks = {}
@@ -791,57 +828,59 @@ class Blockchain(BlockchainInterface):
             # We are not in a reorg, no need to look up alternate header hashes (we can get them from height_to_hash)
             for ref_height in block.transactions_generator_ref_list:
                 header_hash = self.height_to_hash(ref_height)
-                ref_block = await self.get_full_block(header_hash)
-                assert ref_block is not None
-                if ref_block.transactions_generator is None:
-                    raise ValueError(Err.GENERATOR_REF_HAS_NO_GENERATOR)
-                result.append(GeneratorArg(ref_block.height, ref_block.transactions_generator))
+                result.append(GeneratorArg(ref_height, await self.get_ref_generator(ref_height, header_hash)))
         else:
             # First tries to find the blocks in additional_blocks
-            reorg_chain: Dict[uint32, FullBlock] = {}
-            curr: Union[FullBlock, UnfinishedBlock] = block
+            curr: Union[FullBlock, FullBlockView, UnfinishedBlock] = block
             additional_height_dict = {}
             while curr.prev_header_hash in additional_blocks:
                 prev: FullBlock = additional_blocks[curr.prev_header_hash]
                 additional_height_dict[prev.height] = prev
                 if isinstance(curr, FullBlock):
                     assert curr.height == prev.height + 1
-                reorg_chain[prev.height] = prev
                 curr = prev
 
+            # Header hashes of the stored blocks of the fork, only their generators are loaded
+            reorg_chain: Dict[uint32, bytes32] = {}
             peak: Optional[BlockRecord] = self.get_peak()
             if self.contains_block(curr.prev_header_hash) and peak is not None:
                 # Then we look up blocks up to fork point one at a time, backtracking
-                previous_block_hash = curr.prev_header_hash
-                prev_block_record = await self.block_store.get_block_record(previous_block_hash)
-                prev_block = await self.block_store.get_full_block(previous_block_hash)
-                assert prev_block is not None
+                prev_block_record = await self.block_store.get_block_record(curr.prev_header_hash)
                 assert prev_block_record is not None
                 fork = find_fork_point_in_chain(self, peak, prev_block_record)
-                curr_2: Optional[FullBlock] = prev_block
-                assert curr_2 is not None and isinstance(curr_2, FullBlock)
-                reorg_chain[curr_2.height] = curr_2
-                while curr_2.height > fork and curr_2.height > 0:
-                    curr_2 = await self.block_store.get_full_block(curr_2.prev_header_hash)
-                    assert curr_2 is not None
-                    reorg_chain[curr_2.height] = curr_2
+                curr_record: Optional[BlockRecord] = prev_block_record
+                assert curr_record is not None
+                reorg_chain[curr_record.height] = curr_record.header_hash
+                while curr_record.height > fork and curr_record.height > 0:
+                    curr_record = await self.block_store.get_block_record(curr_record.prev_hash)
+                    assert curr_record is not None
+                    reorg_chain[curr_record.height] = curr_record.header_hash
 
             for ref_height in block.transactions_generator_ref_list:
-                if ref_height in reorg_chain:
-                    ref_block = reorg_chain[ref_height]
-                    assert ref_block is not None
+                if ref_height in additional_height_dict:
+                    ref_block = additional_height_dict[ref_height]
                     if ref_block.transactions_generator is None:
                         raise ValueError(Err.GENERATOR_REF_HAS_NO_GENERATOR)
-                    result.append(GeneratorArg(ref_block.height, ref_block.transactions_generator))
+                    result.append(GeneratorArg(ref_height, ref_block.transactions_generator))
                 else:
-                    if ref_height in additional_height_dict:
-                        ref_block = additional_height_dict[ref_height]
+                    if ref_height in reorg_chain:
+                        header_hash = reorg_chain[ref_height]
                     else:
                         header_hash = self.height_to_hash(ref_height)
-                        ref_block = await self.get_full_block(header_hash)
-                    assert ref_block is not None
-                    if ref_block.transactions_generator is None:
-                        raise ValueError(Err.GENERATOR_REF_HAS_NO_GENERATOR)
-                    result.append(GeneratorArg(ref_block.height, ref_block.transactions_generator))
+                    result.append(GeneratorArg(ref_height, await self.get_ref_generator(ref_height, header_hash)))
         assert len(result) == len(ref_list)
         return BlockGenerator(block.transactions_generator, result)
+
+    async def get_ref_generator(self, height: uint32, header_hash: bytes32) -> SerializedProgram:
+        """
+        Returns the generator of the stored block, for blocks that reference it. Cached entries are keyed by height,
+        and only used if they are for the same header hash, so blocks of other chains never share an entry.
+        """
+        cached: Optional[Tuple[bytes32, SerializedProgram]] = self.ref_generator_cache.get(height)
+        if cached is not None and cached[0] == header_hash:
+            return cached[1]
+        generator = await self.block_store.get_generator(header_hash)
+        if generator is None:
+            raise ValueError(Err.GENERATOR_REF_HAS_NO_GENERATOR)
+        self.ref_generator_cache.put(height, (header_hash, generator))
+        return generator
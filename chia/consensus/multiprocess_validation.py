@@ -1,9 +1,10 @@
 import asyncio
 import logging
+import os
 import traceback
 from concurrent.futures.process import ProcessPoolExecutor
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Sequence, Tuple, Union, Callable
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 from chia.consensus.block_header_validation import validate_finished_header_block
 from chia.consensus.block_record import BlockRecord
@@ -13,22 +14,159 @@ from chia.consensus.cost_calculator import NPCResult
 from chia.consensus.difficulty_adjustment import get_next_sub_slot_iters_and_difficulty
 from chia.consensus.full_block_to_block_record import block_to_block_record
 from chia.consensus.get_block_challenge import get_block_challenge
+from chia.consensus.npc_result_cache import NPCResultCache, npc_result_key
 from chia.consensus.pot_iterations import calculate_iterations_quality, is_overflow_block
 from chia.full_node.mempool_check_conditions import get_name_puzzle_conditions
 from chia.types.blockchain_format.coin import Coin
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.blockchain_format.sub_epoch_summary import SubEpochSummary
-from chia.types.full_block import FullBlock
+from chia.types.full_block import FullBlock, FullBlockView
 from chia.types.generator_types import BlockGenerator
 from chia.types.header_block import HeaderBlock
 from chia.util.block_cache import BlockCache
 from chia.util.errors import Err
 from chia.util.generator_tools import get_block_header, tx_removals_and_additions
 from chia.util.ints import uint16, uint64, uint32
+from chia.util.shared_memory_arena import (
+    BlobRef,
+    SharedMemoryArena,
+    SharedMemoryReader,
+    shared_memory_available,
+)
 from chia.util.streamable import Streamable, dataclass_from_dict, streamable
 
 log = logging.getLogger(__name__)
 
+# Room reserved in shared memory for the result of each block, on top of the size of the block itself. Results that
+# don't fit are returned pickled.
+RESULT_BYTES_PER_BLOCK = 1024
+
+
+# Consensus constants of a validation worker process, built once by init_validation_worker
+_worker_constants: Optional[ConsensusConstants] = None
+# Block records resident in a validation worker process, at version _worker_version of the parent's WorkerBlockRecords.
+# Version 0 is a worker that hasn't received any records yet.
+_worker_block_records: Dict[bytes32, BlockRecord] = {}
+_worker_version: int = 0
+
+
+def init_validation_worker(constants_dict: Dict) -> None:
+    """
+    Initializer of the validation pool processes, so the constants aren't sent and rebuilt with every batch.
+    """
+    global _worker_constants
+    _worker_constants = dataclass_from_dict(ConsensusConstants, constants_dict)
+
+
+@dataclass
+class BlockRecordUpdate:
+    """
+    Brings the block records resident in a validation worker to a version. A worker at base_version or later
+    removes and adds the given records, an older one can't apply the update. A base_version of None replaces all
+    the worker's records with the added ones.
+    """
+
+    base_version: Optional[int]
+    version: int
+    added: List[bytes]
+    removed: List[bytes32]
+
+
+class WorkerBlockRecords:
+    """
+    Keeps track of the block records resident in the workers of a validation pool, so that batches only carry
+    the records added and removed since the oldest version a worker is known to have, instead of all of them.
+    The pool must be created with init_validation_worker as its initializer.
+    """
+
+    def __init__(self) -> None:
+        self.version = 0
+        self._records: Dict[bytes32, BlockRecord] = {}
+        # The version each record was added, or removed, in
+        self._added_in: Dict[bytes32, int] = {}
+        self._removed_in: Dict[bytes32, int] = {}
+        # Removals before this version are forgotten, workers that are older need a snapshot
+        self._oldest_version = 0
+        # The version of each worker process, as of the last batch it validated
+        self._worker_versions: Dict[int, int] = {}
+
+    def update(self, records: Dict[bytes32, BlockRecord]) -> BlockRecordUpdate:
+        """
+        Makes records the block records of the workers, and returns the update that brings them there.
+        """
+        removed = [header_hash for header_hash in self._records.keys() if header_hash not in records]
+        added = [header_hash for header_hash in records.keys() if header_hash not in self._records]
+        if len(removed) > 0 or len(added) > 0:
+            self.version += 1
+        for header_hash in removed:
+            del self._records[header_hash]
+            del self._added_in[header_hash]
+            self._removed_in[header_hash] = self.version
+        for header_hash in added:
+            self._records[header_hash] = records[header_hash]
+            self._added_in[header_hash] = self.version
+            self._removed_in.pop(header_hash, None)
+
+        base_version = max(min(self._worker_versions.values(), default=0), self._oldest_version)
+        if base_version > self._oldest_version:
+            self._removed_in = {h: v for h, v in self._removed_in.items() if v > base_version}
+            self._oldest_version = base_version
+        changed = [header_hash for header_hash, version in self._added_in.items() if version > base_version]
+        if base_version == 0 or len(changed) * 2 > len(self._records):
+            # Cheaper to start over than to catch up, workers that fall behind again will get a snapshot
+            self._removed_in = {}
+            self._oldest_version = self.version
+            return self.snapshot()
+        return BlockRecordUpdate(
+            base_version,
+            self.version,
+            [bytes(self._records[header_hash]) for header_hash in changed],
+            list(self._removed_in.keys()),
+        )
+
+    def snapshot(self) -> BlockRecordUpdate:
+        return BlockRecordUpdate(None, self.version, [bytes(record) for record in self._records.values()], [])
+
+    def worker_updated(self, pid: int) -> None:
+        self._worker_versions[pid] = self.version
+
+
+def _apply_block_record_update(update: BlockRecordUpdate) -> bool:
+    """
+    Applies an update to the block records of this worker process. Returns False if the worker is too old for it.
+    """
+    global _worker_version
+    if update.base_version is None:
+        _worker_block_records.clear()
+    elif _worker_version == 0 or _worker_version < update.base_version:
+        return False
+    elif _worker_version == update.version:
+        return True
+    for header_hash in update.removed:
+        _worker_block_records.pop(header_hash, None)
+    for record_bytes in update.added:
+        block_record = BlockRecord.from_bytes(record_bytes)
+        _worker_block_records[block_record.header_hash] = block_record
+    _worker_version = update.version
+    return True
+
+
+def _get_constants(constants_dict: Optional[Dict]) -> ConsensusConstants:
+    if constants_dict is None:
+        assert _worker_constants is not None
+        return _worker_constants
+    return dataclass_from_dict(ConsensusConstants, constants_dict)
+
+
+@dataclass
+class _BatchInputs:
+    block_record_update: BlockRecordUpdate
+    full_blocks: Optional[List[bytes]]
+    header_blocks: Optional[List[bytes]]
+    previous_generators: List[Optional[bytes]]
+    expected_difficulty: List[uint64]
+    expected_sub_slot_iters: List[uint64]
+
 
 @dataclass(frozen=True)
 @streamable
@@ -39,8 +177,83 @@ class PreValidationResult(Streamable):
 
 
 def batch_pre_validate_blocks(
-    constants_dict: Dict,
-    blocks_pickled: Dict[bytes, bytes],
+    constants_dict: Optional[Dict],
+    block_record_update: BlockRecordUpdate,
+    full_blocks_pickled: Optional[List[bytes]],
+    header_blocks_pickled: Optional[List[bytes]],
+    prev_transaction_generators: List[Optional[bytes]],
+    npc_results: Dict[uint32, bytes],
+    check_filter: bool,
+    expected_difficulty: List[uint64],
+    expected_sub_slot_iters: List[uint64],
+) -> Tuple[int, Optional[List[bytes]]]:
+    """
+    Returns the id of the worker process, and the results, or None if the worker's block records are too old for
+    block_record_update. constants_dict can be None if the worker was initialized with init_validation_worker.
+    """
+    if not _apply_block_record_update(block_record_update):
+        return os.getpid(), None
+    results = _validate_batch(
+        _get_constants(constants_dict),
+        _worker_block_records,
+        full_blocks_pickled,
+        header_blocks_pickled,
+        prev_transaction_generators,
+        npc_results,
+        check_filter,
+        expected_difficulty,
+        expected_sub_slot_iters,
+    )
+    return os.getpid(), [bytes(r) for r in results]
+
+
+def batch_pre_validate_blocks_shared(
+    constants_dict: Optional[Dict],
+    arena_name: str,
+    block_record_update: BlockRecordUpdate,
+    added_block_record_refs: List[BlobRef],
+    full_block_refs: Optional[List[BlobRef]],
+    header_block_refs: Optional[List[BlobRef]],
+    prev_transaction_generator_refs: List[Optional[BlobRef]],
+    npc_result_refs: Dict[uint32, BlobRef],
+    check_filter: bool,
+    expected_difficulty: List[uint64],
+    expected_sub_slot_iters: List[uint64],
+    result_region: BlobRef,
+) -> Tuple[int, Optional[List[int]], Optional[List[bytes]]]:
+    """
+    Same as batch_pre_validate_blocks, but the inputs, and the records added by block_record_update, are read from
+    a shared memory arena. The results are written back into result_region, and their lengths returned. If they
+    don't fit, they are returned as bytes instead. Both are None if the worker's block records are too old.
+    """
+    arena = SharedMemoryReader(arena_name)
+    try:
+        added = [arena.read(ref) for ref in added_block_record_refs]
+        if not _apply_block_record_update(replace(block_record_update, added=added)):
+            return os.getpid(), None, None
+        results = _validate_batch(
+            _get_constants(constants_dict),
+            _worker_block_records,
+            None if full_block_refs is None else [arena.read(ref) for ref in full_block_refs],
+            None if header_block_refs is None else [arena.read(ref) for ref in header_block_refs],
+            [arena.read_optional(ref) for ref in prev_transaction_generator_refs],
+            {height: arena.read(ref) for height, ref in npc_result_refs.items()},
+            check_filter,
+            expected_difficulty,
+            expected_sub_slot_iters,
+        )
+        results_bytes = [bytes(r) for r in results]
+        lengths = arena.write(result_region, results_bytes)
+        if lengths is not None:
+            return os.getpid(), lengths, []
+        return os.getpid(), None, results_bytes
+    finally:
+        arena.close()
+
+
+def _validate_batch(
+    constants: ConsensusConstants,
+    blocks: Dict[bytes32, BlockRecord],
     full_blocks_pickled: Optional[List[bytes]],
     header_blocks_pickled: Optional[List[bytes]],
     prev_transaction_generators: List[Optional[bytes]],
@@ -48,18 +261,15 @@ def batch_pre_validate_blocks(
     check_filter: bool,
     expected_difficulty: List[uint64],
     expected_sub_slot_iters: List[uint64],
-) -> List[bytes]:
-    blocks = {}
-    for k, v in blocks_pickled.items():
-        blocks[k] = BlockRecord.from_bytes(v)
+) -> List[PreValidationResult]:
     results: List[PreValidationResult] = []
-    constants: ConsensusConstants = dataclass_from_dict(ConsensusConstants, constants_dict)
     if full_blocks_pickled is not None and header_blocks_pickled is not None:
         assert ValueError("Only one should be passed here")
     if full_blocks_pickled is not None:
         for i in range(len(full_blocks_pickled)):
             try:
-                block: FullBlock = FullBlock.from_bytes(full_blocks_pickled[i])
+                # Only the header fields are needed, and get_block_header parses them once, into the header block
+                block: FullBlockView = FullBlockView(full_blocks_pickled[i])
                 tx_additions: List[Coin] = []
                 removals: List[bytes32] = []
                 npc_result: Optional[NPCResult] = None
@@ -123,7 +333,7 @@ def batch_pre_validate_blocks(
                 error_stack = traceback.format_exc()
                 log.error(f"Exception: {error_stack}")
                 results.append(PreValidationResult(uint16(Err.UNKNOWN.value), None, None))
-    return [bytes(r) for r in results]
+    return results
 
 
 async def pre_validate_blocks_multiprocessing(
@@ -137,6 +347,9 @@ async def pre_validate_blocks_multiprocessing(
     get_block_generator: Optional[Callable],
     batch_size: int,
     wp_summaries: Optional[List[SubEpochSummary]] = None,
+    shared_memory_transport: bool = True,
+    worker_block_records: Optional[WorkerBlockRecords] = None,
+    npc_result_cache: Optional[NPCResultCache] = None,
 ) -> Optional[List[PreValidationResult]]:
     """
     This method must be called under the blockchain lock
@@ -152,6 +365,12 @@ async def pre_validate_blocks_multiprocessing(
         blocks: list of full blocks to validate (must be connected to current chain)
         npc_results
         get_block_generator
+        shared_memory_transport: pass the blocks to the workers through shared memory when it is available,
+            instead of pickling them
+        worker_block_records: the block records resident in the workers of the pool, which must have been created
+            with init_validation_worker. Without it, every batch carries the block records it needs
+        npc_result_cache: generators with a result cached in safe mode aren't run again. The results of the
+            generators that are run are added to it
     """
     prev_b: Optional[BlockRecord] = None
     # Collects all the recent blocks (up to the previous sub-epoch)
@@ -250,19 +469,35 @@ async def pre_validate_blocks_multiprocessing(
         if not block_record_was_present[i]:
             block_records.remove_block_record(block.header_hash)
 
-    recent_sb_compressed_pickled = {bytes(k): bytes(v) for k, v in recent_blocks_compressed.items()}
+    worker_constants_json: Optional[Dict] = constants_json
+    resident_update: Optional[BlockRecordUpdate] = None
+    if worker_block_records is not None:
+        # Resident records are kept for all the recent blocks, a superset of the compressed ones
+        worker_constants_json = None
+        resident_update = worker_block_records.update(recent_blocks)
+    recent_sb_update: Optional[BlockRecordUpdate] = None
+    recent_sb_compressed_update: Optional[BlockRecordUpdate] = None
     npc_results_pickled = {}
     for k, v in npc_results.items():
         npc_results_pickled[k] = bytes(v)
-    futures = []
-    # Pool of workers to validate blocks concurrently
+    # Keys of the generators that weren't in npc_result_cache, to cache their results
+    npc_result_keys: Dict[uint32, bytes32] = {}
+    batches: List[_BatchInputs] = []
     for i in range(0, len(blocks), batch_size):
         end_i = min(i + batch_size, len(blocks))
         blocks_to_validate = blocks[i:end_i]
-        if any([len(block.finished_sub_slots) > 0 for block in blocks_to_validate]):
-            final_pickled = {bytes(k): bytes(v) for k, v in recent_blocks.items()}
+        if resident_update is not None:
+            block_record_update = resident_update
+        elif any([len(block.finished_sub_slots) > 0 for block in blocks_to_validate]):
+            if recent_sb_update is None:
+                recent_sb_update = BlockRecordUpdate(None, 0, [bytes(v) for v in recent_blocks.values()], [])
+            block_record_update = recent_sb_update
         else:
-            final_pickled = recent_sb_compressed_pickled
+            if recent_sb_compressed_update is None:
+                recent_sb_compressed_update = BlockRecordUpdate(
+                    None, 0, [bytes(v) for v in recent_blocks_compressed.values()], []
+                )
+            block_record_update = recent_sb_compressed_update
         b_pickled: Optional[List[bytes]] = None
         hb_pickled: Optional[List[bytes]] = None
         previous_generators: List[Optional[bytes]] = []
@@ -286,6 +521,18 @@ async def pre_validate_blocks_multiprocessing(
                     block_generator: Optional[BlockGenerator] = await get_block_generator(block, prev_blocks_dict)
                 except ValueError:
                     return None
+                if block_generator is not None and npc_result_cache is not None and block.height not in npc_results:
+                    assert block.transactions_info is not None
+                    key = npc_result_key(
+                        block_generator, min(constants.MAX_BLOCK_COST_CLVM, block.transactions_info.cost)
+                    )
+                    # The workers run the generators in safe mode
+                    cached_npc_result = npc_result_cache.get(key, True)
+                    if cached_npc_result is not None:
+                        npc_results_pickled[block.height] = bytes(cached_npc_result)
+                        block_generator = None
+                    else:
+                        npc_result_keys[block.height] = key
                 if block_generator is not None:
                     previous_generators.append(bytes(block_generator))
                 else:
@@ -295,24 +542,167 @@ async def pre_validate_blocks_multiprocessing(
                     hb_pickled = []
                 hb_pickled.append(bytes(block))
 
-        futures.append(
-            asyncio.get_running_loop().run_in_executor(
-                pool,
-                batch_pre_validate_blocks,
-                constants_json,
-                final_pickled,
+        batches.append(
+            _BatchInputs(
+                block_record_update,
                 b_pickled,
                 hb_pickled,
                 previous_generators,
-                npc_results_pickled,
-                check_filter,
                 [diff_ssis[j][0] for j in range(i, end_i)],
                 [diff_ssis[j][1] for j in range(i, end_i)],
             )
         )
+
+    batch_results: Optional[List[Tuple[int, Optional[List[PreValidationResult]]]]] = None
+    if shared_memory_transport and shared_memory_available():
+        try:
+            batch_results = await _pre_validate_batches_shared(
+                worker_constants_json, batches, npc_results_pickled, pool, check_filter
+            )
+        except OSError as e:
+            # For example when /dev/shm is too small, the pickled transport doesn't need it
+            log.warning(f"Could not use shared memory for pre-validation, falling back to pickling: {e}")
+    if batch_results is None:
+        # Pool of workers to validate blocks concurrently
+        batch_results = list(
+            await asyncio.gather(
+                *[
+                    _pre_validate_batch(
+                        worker_constants_json, batch, batch.block_record_update, npc_results_pickled, pool, check_filter
+                    )
+                    for batch in batches
+                ]
+            )
+        )
+
+    # Workers that started, or fell behind, since they last validated a batch are sent all the records
+    stale = [i for i, (_, batch_result) in enumerate(batch_results) if batch_result is None]
+    if len(stale) > 0:
+        assert worker_block_records is not None
+        snapshot = worker_block_records.snapshot()
+        retried = await asyncio.gather(
+            *[
+                _pre_validate_batch(
+                    worker_constants_json, batches[i], snapshot, npc_results_pickled, pool, check_filter
+                )
+                for i in stale
+            ]
+        )
+        for i, retried_result in zip(stale, retried):
+            batch_results[i] = retried_result
+
     # Collect all results into one flat list
-    return [
-        PreValidationResult.from_bytes(result)
-        for batch_result in (await asyncio.gather(*futures))
-        for result in batch_result
-    ]
+    results: List[PreValidationResult] = []
+    for pid, batch_result in batch_results:
+        assert batch_result is not None
+        if worker_block_records is not None:
+            worker_block_records.worker_updated(pid)
+        results.extend(batch_result)
+    if npc_result_cache is not None:
+        for block, result in zip(blocks, results):
+            if block.height in npc_result_keys and result.error is None and result.npc_result is not None:
+                npc_result_cache.put(npc_result_keys[block.height], result.npc_result, True)
+    return results
+
+
+async def _pre_validate_batch(
+    constants_json: Optional[Dict],
+    batch: _BatchInputs,
+    block_record_update: BlockRecordUpdate,
+    npc_results_pickled: Dict[uint32, bytes],
+    pool: ProcessPoolExecutor,
+    check_filter: bool,
+) -> Tuple[int, Optional[List[PreValidationResult]]]:
+    pid, results = await asyncio.get_running_loop().run_in_executor(
+        pool,
+        batch_pre_validate_blocks,
+        constants_json,
+        block_record_update,
+        batch.full_blocks,
+        batch.header_blocks,
+        batch.previous_generators,
+        npc_results_pickled,
+        check_filter,
+        batch.expected_difficulty,
+        batch.expected_sub_slot_iters,
+    )
+    if results is None:
+        return pid, None
+    return pid, [PreValidationResult.from_bytes(result) for result in results]
+
+
+async def _pre_validate_batches_shared(
+    constants_json: Optional[Dict],
+    batches: List[_BatchInputs],
+    npc_results_pickled: Dict[uint32, bytes],
+    pool: ProcessPoolExecutor,
+    check_filter: bool,
+) -> List[Tuple[int, Optional[List[PreValidationResult]]]]:
+    """
+    Places all the serialized inputs in one shared memory arena, so each blob is copied once instead of being
+    pickled to a worker with every batch that needs it. Workers get offsets into the arena, and write their
+    results into a region reserved for each batch.
+    """
+    # Batches share the same block record updates, whose records are only written once
+    distinct_updates: Dict[int, BlockRecordUpdate] = {id(b.block_record_update): b.block_record_update for b in batches}
+    size = sum(len(v) for update in distinct_updates.values() for v in update.added)
+    size += sum(len(v) for v in npc_results_pickled.values())
+    result_sizes: List[int] = []
+    for batch in batches:
+        block_bytes = (batch.full_blocks or []) + (batch.header_blocks or [])
+        size += sum(len(b) for b in block_bytes)
+        size += sum(len(g) for g in batch.previous_generators if g is not None)
+        result_sizes.append(sum(len(b) for b in block_bytes) + RESULT_BYTES_PER_BLOCK * len(block_bytes))
+    size += sum(result_sizes)
+
+    arena = SharedMemoryArena(size)
+    try:
+        added_refs: Dict[int, List[BlobRef]] = {
+            key: [arena.add(v) for v in update.added] for key, update in distinct_updates.items()
+        }
+        # The added records are read from the arena, so they aren't pickled with the update
+        updates: Dict[int, BlockRecordUpdate] = {
+            key: replace(update, added=[]) for key, update in distinct_updates.items()
+        }
+        npc_result_refs: Dict[uint32, BlobRef] = {k: arena.add(v) for k, v in npc_results_pickled.items()}
+        futures = []
+        result_regions: List[BlobRef] = []
+        for batch, result_size in zip(batches, result_sizes):
+            result_region = arena.reserve(result_size)
+            result_regions.append(result_region)
+            futures.append(
+                asyncio.get_running_loop().run_in_executor(
+                    pool,
+                    batch_pre_validate_blocks_shared,
+                    constants_json,
+                    arena.name,
+                    updates[id(batch.block_record_update)],
+                    added_refs[id(batch.block_record_update)],
+                    None if batch.full_blocks is None else [arena.add(b) for b in batch.full_blocks],
+                    None if batch.header_blocks is None else [arena.add(b) for b in batch.header_blocks],
+                    [None if g is None else arena.add(g) for g in batch.previous_generators],
+                    npc_result_refs,
+                    check_filter,
+                    batch.expected_difficulty,
+                    batch.expected_sub_slot_iters,
+                    result_region,
+                )
+            )
+
+        batch_results: List[Tuple[int, Optional[List[PreValidationResult]]]] = []
+        for (pid, lengths, results_bytes), result_region in zip(await asyncio.gather(*futures), result_regions):
+            if lengths is None and results_bytes is None:
+                batch_results.append((pid, None))
+            elif lengths is None:
+                assert results_bytes is not None
+                batch_results.append((pid, [PreValidationResult.from_bytes(r) for r in results_bytes]))
+            else:
+                results: List[PreValidationResult] = []
+                offset = result_region[0]
+                for length in lengths:
+                    results.append(PreValidationResult.from_bytes(arena.read((offset, length))))
+                    offset += length
+                batch_results.append((pid, results))
+        return batch_results
+    finally:
+        arena.close()
@@ -0,0 +1,65 @@
+from typing import Optional, Tuple
+
+from chia.consensus.cost_calculator import NPCResult
+from chia.full_node.mempool_check_conditions import get_name_puzzle_conditions
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.generator_types import BlockGenerator
+from chia.util.hash import std_hash
+from chia.util.lru_cache import LRUCache
+
+# Number of generators whose results are kept, enough for the unfinished blocks at the tip and a few reorged blocks
+NPC_RESULT_CACHE_SIZE = 100
+
+
+def npc_result_key(generator: BlockGenerator, max_cost: int) -> bytes32:
+    # The result depends on the program, the generators it references, and the cost limit
+    return std_hash(bytes(generator) + max_cost.to_bytes(8, "big"))
+
+
+class NPCResultCache:
+    """
+    Keeps the results of running block generators, so a generator that was already run, for example when its
+    block was pre-validated, isn't run again when it is needed for a fork or an unfinished block. Only results
+    without errors are kept.
+
+    Each result is kept with the mode it was computed in. Safe mode rejects generators that unsafe mode accepts,
+    so a result computed in safe mode is also the result in unsafe mode, but not the other way around: results
+    computed in unsafe mode are only returned to unsafe callers.
+    """
+
+    def __init__(self, capacity: int = NPC_RESULT_CACHE_SIZE):
+        self._cache = LRUCache(capacity)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: bytes32, safe_mode: bool) -> Optional[NPCResult]:
+        entry: Optional[Tuple[bool, NPCResult]] = self._cache.get(key)
+        if entry is None or (safe_mode and not entry[0]):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: bytes32, npc_result: NPCResult, safe_mode: bool) -> None:
+        if npc_result.error is not None:
+            return None
+        entry: Optional[Tuple[bool, NPCResult]] = self._cache.get(key)
+        if entry is not None and entry[0] and not safe_mode:
+            # Keep the result that can be returned to both modes
+            return None
+        self._cache.put(key, (safe_mode, npc_result))
+
+    def get_name_puzzle_conditions(
+        self, generator: BlockGenerator, max_cost: int, *, cost_per_byte: int, safe_mode: bool
+    ) -> NPCResult:
+        """
+        Same as get_name_puzzle_conditions, but returns the cached result if there is one.
+        """
+        key = npc_result_key(generator, max_cost)
+        npc_result = self.get(key, safe_mode)
+        if npc_result is None:
+            npc_result = get_name_puzzle_conditions(
+                generator, max_cost, cost_per_byte=cost_per_byte, safe_mode=safe_mode
+            )
+            self.put(key, npc_result, safe_mode)
+        return npc_result
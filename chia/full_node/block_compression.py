@@ -0,0 +1,97 @@
+import zlib
+from collections import Counter
+from hashlib import sha256
+from typing import Dict, List, Optional, Set
+
+"""
+Formats of the full blocks stored in the block store. Uncompressed blocks start with the length of their
+finished_sub_slots, a uint32 whose first byte is always 0, so the first byte of a stored block doubles as its
+format tag and rows written before compression existed stay readable.
+
+FORMAT_RAW: the serialized FullBlock
+FORMAT_ZLIB: the tag, then the zlib compressed FullBlock
+FORMAT_ZLIB_DICT: the tag, the uint32 id of the preset dictionary, then the FullBlock compressed with it
+"""
+
+FORMAT_RAW = 0
+FORMAT_ZLIB = 1
+FORMAT_ZLIB_DICT = 2
+
+ZLIB_LEVEL = 6
+# zlib only looks back 32KB, so a larger dictionary wouldn't be used
+MAX_DICT_SIZE = 32 * 1024
+# Content defined chunks are cut where the low bits of the rolling hash are 0, which gives chunks of 64 bytes on
+# average. The same content is cut the same way in every block, wherever it is
+CHUNK_MASK = 0x3F
+MIN_CHUNK_SIZE = 16
+MAX_CHUNK_SIZE = 256
+_GEAR = [int.from_bytes(sha256(bytes([i])).digest()[:4], "big") for i in range(256)]
+
+
+def block_format(stored: bytes) -> int:
+    return stored[0]
+
+
+def block_dict_id(stored: bytes) -> int:
+    assert block_format(stored) == FORMAT_ZLIB_DICT
+    return int.from_bytes(stored[1:5], "big")
+
+
+def compress_block(block_bytes: bytes, dict_id: Optional[int] = None, zdict: Optional[bytes] = None) -> bytes:
+    if zdict is None:
+        return bytes([FORMAT_ZLIB]) + zlib.compress(block_bytes, ZLIB_LEVEL)
+    assert dict_id is not None
+    compressor = zlib.compressobj(ZLIB_LEVEL, zdict=zdict)
+    return (
+        bytes([FORMAT_ZLIB_DICT]) + dict_id.to_bytes(4, "big") + compressor.compress(block_bytes) + compressor.flush()
+    )
+
+
+def decompress_block(stored: bytes, zdicts: Dict[int, bytes]) -> bytes:
+    """
+    Returns the serialized FullBlock of a stored block, in any of the formats. zdicts maps the ids of the preset
+    dictionaries to their contents.
+    """
+    tag = stored[0]
+    if tag == FORMAT_RAW:
+        return stored
+    if tag == FORMAT_ZLIB:
+        return zlib.decompress(stored[1:])
+    if tag == FORMAT_ZLIB_DICT:
+        decompressor = zlib.decompressobj(zdict=zdicts[block_dict_id(stored)])
+        return decompressor.decompress(stored[5:]) + decompressor.flush()
+    raise ValueError(f"Unknown block format {tag}")
+
+
+def _chunks(data: bytes) -> Set[bytes]:
+    chunks: Set[bytes] = set()
+    start = 0
+    h = 0
+    for i, b in enumerate(data):
+        h = ((h << 1) + _GEAR[b]) & 0xFFFFFFFF
+        size = i + 1 - start
+        if (size >= MIN_CHUNK_SIZE and h & CHUNK_MASK == 0) or size >= MAX_CHUNK_SIZE:
+            chunks.add(data[start : i + 1])
+            start = i + 1
+    return chunks
+
+
+def train_dictionary(samples: List[bytes], size: int = MAX_DICT_SIZE) -> bytes:
+    """
+    Builds a zlib preset dictionary from content that repeats across the samples, such as standard puzzles in
+    generators and the structure of proofs. The samples are cut into content defined chunks, and the chunks found
+    in the most samples are kept. The most common ones go last, where zlib reaches them with the shortest distances.
+    """
+    counts: Counter = Counter()
+    for sample in samples:
+        counts.update(_chunks(sample))
+    chosen: List[bytes] = []
+    total = 0
+    for chunk, count in counts.most_common():
+        if count < 2:
+            break
+        if total + len(chunk) > size:
+            continue
+        chosen.append(chunk)
+        total += len(chunk)
+    return b"".join(reversed(chosen))
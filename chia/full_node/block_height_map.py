@@ -0,0 +1,279 @@
+import logging
+import mmap
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from chia.full_node.block_store import BlockStore
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.blockchain_format.sub_epoch_summary import SubEpochSummary
+from chia.util.ints import uint32
+from chia.util.streamable import Streamable, streamable
+
+log = logging.getLogger(__name__)
+
+# Number of heights the height-to-hash file grows by when the chain outgrows it (1 MiB of hashes)
+GROWTH_HEIGHTS = 32768
+
+# Number of block records fetched per query when the index is rebuilt from the database
+LOAD_BATCH_SIZE = 1000
+
+
+@dataclass(frozen=True)
+@streamable
+class SesCache(Streamable):
+    content: List[Tuple[uint32, bytes]]
+
+
+class BlockHeightMap:
+    """
+    Maps heights in the current chain (genesis to peak) to header hashes, and keeps the sub epoch summaries
+    included in it. The header hashes are kept in a flat array of 32 byte hashes indexed by height, which is
+    memory mapped from a file next to the database when a path is given. On startup the file is checked
+    against the database by walking back from the peak until they agree, so only the blocks added since the
+    file was last written are read from the database.
+
+    The file is flushed when the peak changes, and then the new peak height is written to a third file as the
+    verified height: every height up to it was flushed while it was in the chain. A reorg below the verified
+    height lowers it before any hash is overwritten. On startup, heights above the verified height are never
+    trusted, since they may not have reached the disk before a crash, and the sub epoch summaries are checked
+    against the database.
+    """
+
+    block_store: BlockStore
+    # Highest height set, or -1 if the map is empty. Heights above the peak are kept after a reorg to a shorter
+    # chain, like the dict this replaces, but are overwritten when the chain grows again.
+    __max_height: int
+    __height_to_hash: mmap.mmap
+    __hash_file: Optional[int]
+    __verified_file: Optional[int]
+    # Highest height up to which the flushed file is known to match the chain, or -1
+    __verified_height: int
+    # Range of heights changed since the last flush, or None
+    __dirty: Optional[Tuple[int, int]]
+    __ses_path: Optional[Path]
+    __sub_epoch_summaries: Dict[uint32, SubEpochSummary]
+
+    @classmethod
+    async def create(cls, block_store: BlockStore, path: Optional[Path] = None) -> "BlockHeightMap":
+        """
+        path is the base name for the index files, <path>.height-to-hash, <path>.height-to-hash-verified and
+        <path>.sub-epoch-summaries. Without it, the map is kept in anonymous memory and rebuilt from the database
+        every time.
+        """
+        self = cls()
+        self.block_store = block_store
+        self.__max_height = -1
+        self.__sub_epoch_summaries = {}
+        self.__hash_file = None
+        self.__verified_file = None
+        self.__verified_height = -1
+        self.__dirty = None
+        self.__ses_path = None
+        ses_loaded = False
+        if path is not None:
+            self.__hash_file = os.open(path.parent / (path.name + ".height-to-hash"), os.O_RDWR | os.O_CREAT, 0o644)
+            self.__verified_file = os.open(
+                path.parent / (path.name + ".height-to-hash-verified"), os.O_RDWR | os.O_CREAT, 0o644
+            )
+            verified_bytes = os.pread(self.__verified_file, 8, 0)
+            if len(verified_bytes) == 8:
+                self.__verified_height = int.from_bytes(verified_bytes, "big", signed=True)
+            self.__ses_path = path.parent / (path.name + ".sub-epoch-summaries")
+            ses_loaded = self.__load_sub_epoch_summaries()
+        self.__height_to_hash = self.__remap(GROWTH_HEIGHTS, None)
+
+        peak = await block_store.get_peak()
+        if peak is None:
+            return self
+
+        peak_hash, peak_height = peak
+        if self.__hash_file is not None:
+            log.info(f"Loading height index with peak {peak_height}")
+        # A map without its sub epoch summaries is rebuilt from scratch
+        if not await self.__load_from_db(peak_hash, peak_height, ses_loaded):
+            log.warning("The height index doesn't match the database, rebuilding it")
+            await self.__load_from_db(peak_hash, peak_height, False)
+        return self
+
+    def __remap(self, num_heights: int, old_map: Optional[mmap.mmap]) -> mmap.mmap:
+        """
+        Maps the height-to-hash array with room for at least num_heights, replacing old_map.
+        """
+        size = num_heights * 32
+        if self.__hash_file is None:
+            new_map = mmap.mmap(-1, size)
+            if old_map is not None:
+                new_map[: len(old_map)] = old_map[:]
+                old_map.close()
+        else:
+            if old_map is not None:
+                # The file can't be resized while it's mapped on all platforms
+                old_map.close()
+            file_size = os.fstat(self.__hash_file).st_size
+            if file_size < size:
+                os.ftruncate(self.__hash_file, size)
+                file_size = size
+            new_map = mmap.mmap(self.__hash_file, file_size - file_size % 32)
+        return new_map
+
+    def __load_sub_epoch_summaries(self) -> bool:
+        assert self.__ses_path is not None
+        try:
+            ses_cache = SesCache.from_bytes(self.__ses_path.read_bytes())
+        except Exception as e:
+            if self.__ses_path.exists():
+                log.warning(f"Failed to load {self.__ses_path}, rebuilding the height index: {e}")
+            return False
+        for height, ses_bytes in ses_cache.content:
+            self.__sub_epoch_summaries[height] = SubEpochSummary.from_bytes(ses_bytes)
+        return True
+
+    def __save_sub_epoch_summaries(self) -> None:
+        if self.__ses_path is None:
+            return None
+        ses_cache = SesCache([(height, bytes(ses)) for height, ses in self.__sub_epoch_summaries.items()])
+        tmp_path = self.__ses_path.parent / (self.__ses_path.name + ".tmp")
+        # Synced before the heights that include it are flushed, so it is never behind the verified height
+        with open(tmp_path, "wb") as f:
+            f.write(bytes(ses_cache))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.__ses_path)
+
+    def __write_verified_height(self, height: int, sync: bool) -> None:
+        self.__verified_height = height
+        if self.__verified_file is None:
+            return None
+        os.pwrite(self.__verified_file, height.to_bytes(8, "big", signed=True), 0)
+        if sync:
+            os.fsync(self.__verified_file)
+
+    async def __load_from_db(self, peak_hash: bytes32, peak_height: uint32, trust_file: bool) -> bool:
+        """
+        Updates the map to the chain ending at the peak. Returns False if the part of the file that was trusted
+        turned out not to match the database.
+        """
+        if peak_height * 32 + 32 > len(self.__height_to_hash):
+            self.__height_to_hash = self.__remap(peak_height + 1 + GROWTH_HEIGHTS, self.__height_to_hash)
+        self.__max_height = peak_height
+        for ses_height in [h for h in self.__sub_epoch_summaries.keys() if h > peak_height]:
+            del self.__sub_epoch_summaries[ses_height]
+
+        # Walk back from the peak, until the file agrees with the database
+        height: int = peak_height
+        curr: bytes32 = peak_hash
+        links: Dict[bytes32, Tuple[bytes32, uint32, Optional[SubEpochSummary]]] = {}
+        rewritten = 0
+        while height >= 0 and not (trust_file and height <= self.__verified_height and self.__get(height) == curr):
+            if curr not in links:
+                links = await self.block_store.get_prev_hashes_in_range(max(height - LOAD_BATCH_SIZE + 1, 0), height)
+            prev_hash, block_height, ses = links[curr]
+            assert block_height == height
+            self.__set(height, curr)
+            if ses is not None:
+                self.__sub_epoch_summaries[uint32(height)] = ses
+            elif height in self.__sub_epoch_summaries:
+                del self.__sub_epoch_summaries[uint32(height)]
+            rewritten += 1
+            curr = prev_hash
+            height -= 1
+
+        # The summaries below the point where the file agrees came from the file, check them against the database
+        trusted_ses_heights = sorted(h for h in self.__sub_epoch_summaries.keys() if h <= height)
+        for i in range(0, len(trusted_ses_heights), LOAD_BATCH_SIZE // 2):
+            batch = trusted_ses_heights[i : i + LOAD_BATCH_SIZE // 2]
+            try:
+                records = await self.block_store.get_block_records_by_hash([bytes32(self.__get(h)) for h in batch])
+            except ValueError:
+                return False
+            for ses_height, record in zip(batch, records):
+                if (
+                    record.height != ses_height
+                    or record.sub_epoch_summary_included != self.__sub_epoch_summaries[ses_height]
+                ):
+                    return False
+
+        if rewritten > 0:
+            log.info(f"Updated {rewritten} heights of the height index from the database")
+            self.__save_sub_epoch_summaries()
+            self.__dirty = (height + 1, peak_height)
+        self.flush(peak_height)
+        return True
+
+    def __get(self, height: int) -> bytes:
+        return self.__height_to_hash[height * 32 : height * 32 + 32]
+
+    def __set(self, height: int, header_hash: bytes32) -> None:
+        self.__height_to_hash[height * 32 : height * 32 + 32] = header_hash
+
+    def update_height(self, height: uint32, header_hash: bytes32, ses: Optional[SubEpochSummary]) -> None:
+        # The sub epoch summary file is written first, so a stale hash makes the next startup reload both
+        if ses is not None:
+            self.__sub_epoch_summaries[height] = ses
+            self.__save_sub_epoch_summaries()
+        elif height in self.__sub_epoch_summaries:
+            del self.__sub_epoch_summaries[height]
+            self.__save_sub_epoch_summaries()
+
+        if height * 32 + 32 > len(self.__height_to_hash):
+            self.__height_to_hash = self.__remap(height + 1 + GROWTH_HEIGHTS, self.__height_to_hash)
+        self.__set(height, header_hash)
+        self.__max_height = max(self.__max_height, height)
+        if self.__dirty is None:
+            self.__dirty = (height, height)
+        else:
+            self.__dirty = (min(self.__dirty[0], height), max(self.__dirty[1], height))
+
+    def flush(self, peak_height: int) -> None:
+        """
+        Writes the heights changed since the last flush to disk, after the chain was updated to a new peak, and
+        marks the heights up to the peak as verified.
+        """
+        if self.__hash_file is not None and self.__dirty is not None:
+            # The offset must be aligned to the allocation granularity
+            start = self.__dirty[0] * 32 - (self.__dirty[0] * 32) % mmap.ALLOCATIONGRANULARITY
+            end = self.__dirty[1] * 32 + 32
+            self.__height_to_hash.flush(start, end - start)
+        self.__dirty = None
+        self.__write_verified_height(peak_height, False)
+
+    def rollback(self, fork_height: int) -> None:
+        """
+        Drops the sub epoch summaries above fork_height. The hashes are overwritten by update_height.
+        """
+        if fork_height < self.__verified_height:
+            # Synced before the hashes above the fork are overwritten, a crash can't leave them trusted
+            self.__write_verified_height(fork_height, True)
+        heights_to_delete = [height for height in self.__sub_epoch_summaries.keys() if height > fork_height]
+        for height in heights_to_delete:
+            log.info(f"delete ses at height {height}")
+            del self.__sub_epoch_summaries[height]
+        if len(heights_to_delete) > 0:
+            self.__save_sub_epoch_summaries()
+
+    def get_hash(self, height: uint32) -> bytes32:
+        if height > self.__max_height:
+            raise KeyError(height)
+        return bytes32(self.__get(height))
+
+    def contains_height(self, height: uint32) -> bool:
+        return height <= self.__max_height
+
+    def get_ses_heights(self) -> List[uint32]:
+        return sorted(self.__sub_epoch_summaries.keys())
+
+    def get_ses(self, height: uint32) -> SubEpochSummary:
+        return self.__sub_epoch_summaries[height]
+
+    def close(self) -> None:
+        if self.__hash_file is not None:
+            self.__height_to_hash.flush()
+        self.__height_to_hash.close()
+        if self.__hash_file is not None:
+            os.close(self.__hash_file)
+            self.__hash_file = None
+        if self.__verified_file is not None:
+            os.close(self.__verified_file)
+            self.__verified_file = None
@@ -1,12 +1,26 @@
+import asyncio
 import logging
-from typing import Dict, List, Optional, Tuple
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 import aiosqlite
 
 from chia.consensus.block_record import BlockRecord
+from chia.full_node.block_compression import (
+    FORMAT_RAW,
+    FORMAT_ZLIB,
+    FORMAT_ZLIB_DICT,
+    block_dict_id,
+    block_format,
+    compress_block,
+    decompress_block,
+    train_dictionary,
+)
+from chia.types.block_coin_changes import BlockCoinChanges
+from chia.types.blockchain_format.program import SerializedProgram
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.blockchain_format.sub_epoch_summary import SubEpochSummary
-from chia.types.full_block import FullBlock
+from chia.types.full_block import FullBlock, FullBlockView
 from chia.types.weight_proof import SubEpochChallengeSegment, SubEpochSegments
 from chia.util.db_wrapper import DBWrapper
 from chia.util.ints import uint32
@@ -20,9 +34,13 @@ class BlockStore:
     block_cache: LRUCache
     db_wrapper: DBWrapper
     ses_challenge_cache: LRUCache
+    # Whether new blocks are stored compressed
+    compress_blocks: bool
+    # Id -> preset dictionary for compressed blocks, the newest one is used for new blocks
+    compression_dicts: Dict[int, bytes]
 
     @classmethod
-    async def create(cls, db_wrapper: DBWrapper):
+    async def create(cls, db_wrapper: DBWrapper, compress_blocks: bool = False):
         self = cls()
 
         # All full blocks which have been added to the blockchain. Header_hash -> block
@@ -30,18 +48,29 @@ class BlockStore:
         self.db = db_wrapper.db
         await self.db.execute("pragma journal_mode=wal")
         await self.db.execute("pragma synchronous=2")
+        # Version 2 databases store header hashes as 32 byte blobs instead of hex text
+        hash_type = "blob" if db_wrapper.db_version == 2 else "text"
         await self.db.execute(
-            "CREATE TABLE IF NOT EXISTS full_blocks(header_hash text PRIMARY KEY, height bigint,"
+            f"CREATE TABLE IF NOT EXISTS full_blocks(header_hash {hash_type} PRIMARY KEY, height bigint,"
             "  is_block tinyint, is_fully_compactified tinyint, block blob)"
         )
 
         # Block records
         await self.db.execute(
             "CREATE TABLE IF NOT EXISTS block_records(header_hash "
-            "text PRIMARY KEY, prev_hash text, height bigint,"
+            f"{hash_type} PRIMARY KEY, prev_hash {hash_type}, height bigint,"
             "block blob, sub_epoch_summary blob, is_peak tinyint, is_block tinyint)"
         )
 
+        # Coins created and spent by the transactions of each transaction block, kept for the recent blocks
+        await self.db.execute(
+            f"CREATE TABLE IF NOT EXISTS block_coin_changes(header_hash {hash_type} PRIMARY KEY, height bigint,"
+            " changes blob)"
+        )
+
+        # Preset dictionaries of compressed full blocks, trained on the chain
+        await self.db.execute("CREATE TABLE IF NOT EXISTS block_compression_dicts(id integer PRIMARY KEY, dict blob)")
+
         # todo remove in v1.2
         await self.db.execute("DROP TABLE IF EXISTS sub_epoch_segments_v2")
 
@@ -56,6 +85,7 @@ class BlockStore:
         await self.db.execute("CREATE INDEX IF NOT EXISTS is_fully_compactified on full_blocks(is_fully_compactified)")
 
         await self.db.execute("CREATE INDEX IF NOT EXISTS height on block_records(height)")
+        await self.db.execute("CREATE INDEX IF NOT EXISTS coin_changes_height on block_coin_changes(height)")
 
         await self.db.execute("CREATE INDEX IF NOT EXISTS hh on block_records(header_hash)")
         await self.db.execute("CREATE INDEX IF NOT EXISTS peak on block_records(is_peak)")
@@ -64,18 +94,33 @@ class BlockStore:
         await self.db.commit()
         self.block_cache = LRUCache(1000)
         self.ses_challenge_cache = LRUCache(50)
+        self.compress_blocks = compress_blocks
+        cursor = await self.db.execute("SELECT id, dict from block_compression_dicts")
+        self.compression_dicts = {row[0]: row[1] for row in await cursor.fetchall()}
+        await cursor.close()
         return self
 
+    def _encode_block(self, block_bytes: bytes) -> bytes:
+        if not self.compress_blocks:
+            return block_bytes
+        if len(self.compression_dicts) == 0:
+            return compress_block(block_bytes)
+        dict_id = max(self.compression_dicts)
+        return compress_block(block_bytes, dict_id, self.compression_dicts[dict_id])
+
+    def _decode_block(self, stored: bytes) -> bytes:
+        return decompress_block(stored, self.compression_dicts)
+
     async def add_full_block(self, header_hash: bytes32, block: FullBlock, block_record: BlockRecord) -> None:
         self.block_cache.put(header_hash, block)
         cursor_1 = await self.db.execute(
             "INSERT OR REPLACE INTO full_blocks VALUES(?, ?, ?, ?, ?)",
             (
-                header_hash.hex(),
+                self.db_wrapper.to_key(header_hash),
                 block.height,
                 int(block.is_transaction_block()),
                 int(block.is_fully_compactified()),
-                bytes(block),
+                self._encode_block(bytes(block)),
             ),
         )
 
@@ -84,8 +129,8 @@ class BlockStore:
         cursor_2 = await self.db.execute(
             "INSERT OR REPLACE INTO block_records VALUES(?, ?, ?, ?,?, ?, ?)",
             (
-                header_hash.hex(),
-                block.prev_header_hash.hex(),
+                self.db_wrapper.to_key(header_hash),
+                self.db_wrapper.to_key(block.prev_header_hash),
                 block.height,
                 bytes(block_record),
                 None
@@ -97,6 +142,35 @@ class BlockStore:
         )
         await cursor_2.close()
 
+    async def add_coin_changes(self, header_hash: bytes32, height: uint32, coin_changes: BlockCoinChanges) -> None:
+        cursor = await self.db.execute(
+            "INSERT OR REPLACE INTO block_coin_changes VALUES(?, ?, ?)",
+            (self.db_wrapper.to_key(header_hash), height, bytes(coin_changes)),
+        )
+        await cursor.close()
+
+    async def prune_coin_changes(self, height: uint32) -> None:
+        """
+        Deletes the coin changes of the blocks below height, of the main chain and of orphans. Forks that deep are
+        not expected, if they happen the generators of their blocks are run again.
+        """
+        cursor = await self.db.execute("DELETE FROM block_coin_changes WHERE height<?", (height,))
+        await cursor.close()
+
+    async def get_coin_changes(self, header_hash: bytes32) -> Optional[BlockCoinChanges]:
+        """
+        Returns the coins created and spent by the transactions of the block, or None if they weren't stored, for
+        example for blocks added before they were, or pruned with prune_coin_changes.
+        """
+        cursor = await self.db.execute(
+            "SELECT changes from block_coin_changes WHERE header_hash=?", (self.db_wrapper.to_key(header_hash),)
+        )
+        row = await cursor.fetchone()
+        await cursor.close()
+        if row is None:
+            return None
+        return BlockCoinChanges.from_bytes(row[0])
+
     async def persist_sub_epoch_challenge_segments(
         self, ses_block_hash: bytes32, segments: List[SubEpochChallengeSegment]
     ) -> None:
@@ -140,11 +214,13 @@ class BlockStore:
             log.debug(f"cache hit for block {header_hash.hex()}")
             return cached
         log.debug(f"cache miss for block {header_hash.hex()}")
-        cursor = await self.db.execute("SELECT block from full_blocks WHERE header_hash=?", (header_hash.hex(),))
+        cursor = await self.db.execute(
+            "SELECT block from full_blocks WHERE header_hash=?", (self.db_wrapper.to_key(header_hash),)
+        )
         row = await cursor.fetchone()
         await cursor.close()
         if row is not None:
-            block = FullBlock.from_bytes(row[0])
+            block = FullBlock.from_bytes(self._decode_block(row[0]))
             self.block_cache.put(header_hash, block)
             return block
         return None
@@ -155,13 +231,41 @@ class BlockStore:
             log.debug(f"cache hit for block {header_hash.hex()}")
             return bytes(cached)
         log.debug(f"cache miss for block {header_hash.hex()}")
-        cursor = await self.db.execute("SELECT block from full_blocks WHERE header_hash=?", (header_hash.hex(),))
+        cursor = await self.db.execute(
+            "SELECT block from full_blocks WHERE header_hash=?", (self.db_wrapper.to_key(header_hash),)
+        )
         row = await cursor.fetchone()
         await cursor.close()
         if row is not None:
-            return row[0]
+            return self._decode_block(row[0])
         return None
 
+    async def get_full_block_view(self, header_hash: bytes32) -> Optional[FullBlockView]:
+        """
+        Returns a lazily parsed view of the block, for callers that only need some of its fields.
+        """
+        block_bytes = await self.get_full_block_bytes(header_hash)
+        if block_bytes is None:
+            return None
+        return FullBlockView(block_bytes)
+
+    async def get_generator(self, header_hash: bytes32) -> Optional[SerializedProgram]:
+        """
+        Returns the transactions generator of the block, only parsing that field of the stored block. Returns None
+        if the block has no generator, or isn't in the store.
+        """
+        cached = self.block_cache.get(header_hash)
+        if cached is not None:
+            return cached.transactions_generator
+        cursor = await self.db.execute(
+            "SELECT block from full_blocks WHERE header_hash=?", (self.db_wrapper.to_key(header_hash),)
+        )
+        row = await cursor.fetchone()
+        await cursor.close()
+        if row is None:
+            return None
+        return FullBlockView(self._decode_block(row[0])).transactions_generator
+
     async def get_full_blocks_at(self, heights: List[uint32]) -> List[FullBlock]:
         if len(heights) == 0:
             return []
@@ -171,7 +275,7 @@ class BlockStore:
         cursor = await self.db.execute(formatted_str, heights_db)
         rows = await cursor.fetchall()
         await cursor.close()
-        return [FullBlock.from_bytes(row[0]) for row in rows]
+        return [FullBlock.from_bytes(self._decode_block(row[0])) for row in rows]
 
     async def get_block_records_by_hash(self, header_hashes: List[bytes32]):
         """
@@ -181,7 +285,7 @@ class BlockStore:
         if len(header_hashes) == 0:
             return []
 
-        header_hashes_db = tuple([hh.hex() for hh in header_hashes])
+        header_hashes_db = tuple([self.db_wrapper.to_key(hh) for hh in header_hashes])
         formatted_str = f'SELECT block from block_records WHERE header_hash in ({"?," * (len(header_hashes_db) - 1)}?)'
         cursor = await self.db.execute(formatted_str, header_hashes_db)
         rows = await cursor.fetchall()
@@ -197,29 +301,27 @@ class BlockStore:
             ret.append(all_blocks[hh])
         return ret
 
-    async def get_blocks_by_hash(self, header_hashes: List[bytes32]) -> List[FullBlock]:
+    async def get_block_views_by_hash(self, header_hashes: List[bytes32]) -> List[FullBlockView]:
         """
-        Returns a list of Full Blocks blocks, ordered by the same order in which header_hashes are passed in.
+        Returns lazily parsed views of the blocks, ordered by the same order in which header_hashes are passed in.
         Throws an exception if the blocks are not present
         """
 
         if len(header_hashes) == 0:
             return []
 
-        header_hashes_db = tuple([hh.hex() for hh in header_hashes])
+        header_hashes_db = tuple([self.db_wrapper.to_key(hh) for hh in header_hashes])
         formatted_str = (
             f'SELECT header_hash, block from full_blocks WHERE header_hash in ({"?," * (len(header_hashes_db) - 1)}?)'
         )
         cursor = await self.db.execute(formatted_str, header_hashes_db)
         rows = await cursor.fetchall()
         await cursor.close()
-        all_blocks: Dict[bytes32, FullBlock] = {}
+        all_blocks: Dict[bytes32, FullBlockView] = {}
         for row in rows:
-            header_hash = bytes.fromhex(row[0])
-            full_block: FullBlock = FullBlock.from_bytes(row[1])
-            all_blocks[header_hash] = full_block
-            self.block_cache.put(header_hash, full_block)
-        ret: List[FullBlock] = []
+            header_hash = self.db_wrapper.from_key(row[0])
+            all_blocks[header_hash] = FullBlockView(self._decode_block(row[1]))
+        ret: List[FullBlockView] = []
         for hh in header_hashes:
             if hh not in all_blocks:
                 raise ValueError(f"Header hash {hh} not in the blockchain")
@@ -229,7 +331,7 @@ class BlockStore:
     async def get_block_record(self, header_hash: bytes32) -> Optional[BlockRecord]:
         cursor = await self.db.execute(
             "SELECT block from block_records WHERE header_hash=?",
-            (header_hash.hex(),),
+            (self.db_wrapper.to_key(header_hash),),
         )
         row = await cursor.fetchone()
         await cursor.close()
@@ -254,7 +356,7 @@ class BlockStore:
         await cursor.close()
         ret: Dict[bytes32, BlockRecord] = {}
         for row in rows:
-            header_hash = bytes.fromhex(row[0])
+            header_hash = self.db_wrapper.from_key(row[0])
             ret[header_hash] = BlockRecord.from_bytes(row[1])
 
         return ret
@@ -279,50 +381,40 @@ class BlockStore:
         await cursor.close()
         ret: Dict[bytes32, BlockRecord] = {}
         for row in rows:
-            header_hash = bytes.fromhex(row[0])
+            header_hash = self.db_wrapper.from_key(row[0])
             ret[header_hash] = BlockRecord.from_bytes(row[1])
-        return ret, bytes.fromhex(peak_row[0])
+        return ret, self.db_wrapper.from_key(peak_row[0])
 
-    async def get_peak_height_dicts(self) -> Tuple[Dict[uint32, bytes32], Dict[uint32, SubEpochSummary]]:
+    async def get_peak(self) -> Optional[Tuple[bytes32, uint32]]:
         """
-        Returns a dictionary with all blocks, as well as the header hash of the peak,
-        if present.
+        Returns the header hash and height of the peak, if present.
         """
-
-        res = await self.db.execute("SELECT * from block_records WHERE is_peak = 1")
+        res = await self.db.execute("SELECT header_hash, height from block_records WHERE is_peak = 1")
         row = await res.fetchone()
         await res.close()
         if row is None:
-            return {}, {}
+            return None
+        return self.db_wrapper.from_key(row[0]), uint32(row[1])
 
-        peak: bytes32 = bytes.fromhex(row[0])
-        cursor = await self.db.execute("SELECT header_hash,prev_hash,height,sub_epoch_summary from block_records")
+    async def get_prev_hashes_in_range(
+        self, start: int, stop: int
+    ) -> Dict[bytes32, Tuple[bytes32, uint32, Optional[SubEpochSummary]]]:
+        """
+        Returns a dictionary from header hash to (prev hash, height, sub epoch summary) for all block records
+        between start and stop heights (inclusive), including orphans.
+        """
+        cursor = await self.db.execute(
+            "SELECT header_hash,prev_hash,height,sub_epoch_summary from block_records "
+            "WHERE height >= ? and height <= ?",
+            (start, stop),
+        )
         rows = await cursor.fetchall()
         await cursor.close()
-        hash_to_prev_hash: Dict[bytes32, bytes32] = {}
-        hash_to_height: Dict[bytes32, uint32] = {}
-        hash_to_summary: Dict[bytes32, SubEpochSummary] = {}
-
+        ret: Dict[bytes32, Tuple[bytes32, uint32, Optional[SubEpochSummary]]] = {}
         for row in rows:
-            hash_to_prev_hash[bytes.fromhex(row[0])] = bytes.fromhex(row[1])
-            hash_to_height[bytes.fromhex(row[0])] = row[2]
-            if row[3] is not None:
-                hash_to_summary[bytes.fromhex(row[0])] = SubEpochSummary.from_bytes(row[3])
-
-        height_to_hash: Dict[uint32, bytes32] = {}
-        sub_epoch_summaries: Dict[uint32, SubEpochSummary] = {}
-
-        curr_header_hash = peak
-        curr_height = hash_to_height[curr_header_hash]
-        while True:
-            height_to_hash[curr_height] = curr_header_hash
-            if curr_header_hash in hash_to_summary:
-                sub_epoch_summaries[curr_height] = hash_to_summary[curr_header_hash]
-            if curr_height == 0:
-                break
-            curr_header_hash = hash_to_prev_hash[curr_header_hash]
-            curr_height = hash_to_height[curr_header_hash]
-        return height_to_hash, sub_epoch_summaries
+            ses = None if row[3] is None else SubEpochSummary.from_bytes(row[3])
+            ret[self.db_wrapper.from_key(row[0])] = (self.db_wrapper.from_key(row[1]), uint32(row[2]), ses)
+        return ret
 
     async def set_peak(self, header_hash: bytes32) -> None:
         # We need to be in a sqlite transaction here.
@@ -331,13 +423,14 @@ class BlockStore:
         await cursor_1.close()
         cursor_2 = await self.db.execute(
             "UPDATE block_records SET is_peak=1 WHERE header_hash=?",
-            (header_hash.hex(),),
+            (self.db_wrapper.to_key(header_hash),),
         )
         await cursor_2.close()
 
     async def is_fully_compactified(self, header_hash: bytes32) -> Optional[bool]:
         cursor = await self.db.execute(
-            "SELECT is_fully_compactified from full_blocks WHERE header_hash=?", (header_hash.hex(),)
+            "SELECT is_fully_compactified from full_blocks WHERE header_hash=?",
+            (self.db_wrapper.to_key(header_hash),),
         )
         row = await cursor.fetchone()
         await cursor.close()
@@ -357,3 +450,135 @@ class BlockStore:
         if row is None:
             return None
         return int(row[0])
+
+    def _is_current_format(self, stored: bytes) -> bool:
+        # Whether the stored block is encoded the way new blocks are. Without compression, rows are left as they are
+        if not self.compress_blocks:
+            return True
+        if len(self.compression_dicts) == 0:
+            return block_format(stored) == FORMAT_ZLIB
+        return block_format(stored) == FORMAT_ZLIB_DICT and block_dict_id(stored) == max(self.compression_dicts)
+
+    async def train_compression_dict(self, sample_size: int = 200, max_sample_bytes: int = 4 * 1024 * 1024) -> int:
+        """
+        Trains a preset dictionary on the most recent blocks, and uses it to compress new blocks. Returns its id.
+        """
+        cursor = await self.db.execute("SELECT block from full_blocks ORDER BY height DESC LIMIT ?", (sample_size,))
+        rows = await cursor.fetchall()
+        await cursor.close()
+
+        def decode_and_train() -> bytes:
+            samples: List[bytes] = []
+            total = 0
+            for row in rows:
+                if total >= max_sample_bytes:
+                    break
+                samples.append(self._decode_block(row[0]))
+                total += len(samples[-1])
+            return train_dictionary(samples)
+
+        zdict = await asyncio.get_running_loop().run_in_executor(None, decode_and_train)
+        async with self.db_wrapper.lock:
+            cursor = await self.db.execute("INSERT INTO block_compression_dicts(dict) VALUES(?)", (zdict,))
+            dict_id = cursor.lastrowid
+            await cursor.close()
+            await self.db.commit()
+        self.compression_dicts[dict_id] = zdict
+        return dict_id
+
+    async def recompress_blocks(self, after_rowid: int, batch_size: int = 100) -> Tuple[int, int]:
+        """
+        Re-encodes the blocks stored with an older format, in the batch_size rows following after_rowid. Returns the
+        last rowid that was looked at, to continue from, and the number of blocks that were re-encoded. The last
+        rowid is after_rowid once all rows have been looked at.
+
+        The blocks are re-encoded outside of the lock, so a row is only updated if it still holds the bytes that were
+        read. A block that was replaced in the meantime, for example with compact proofs, is left for the next pass.
+        """
+        cursor = await self.db.execute(
+            "SELECT rowid, header_hash, block from full_blocks WHERE rowid>? ORDER BY rowid LIMIT ?",
+            (after_rowid, batch_size),
+        )
+        rows = await cursor.fetchall()
+        await cursor.close()
+        if len(rows) == 0:
+            return after_rowid, 0
+
+        def encode_rows() -> List[Tuple[bytes, Any, bytes]]:
+            return [
+                (self._encode_block(self._decode_block(row[2])), row[1], row[2])
+                for row in rows
+                if not self._is_current_format(row[2])
+            ]
+
+        updates = await asyncio.get_running_loop().run_in_executor(None, encode_rows)
+        updated = 0
+        if len(updates) > 0:
+            async with self.db_wrapper.lock:
+                for update in updates:
+                    cursor = await self.db.execute(
+                        "UPDATE full_blocks SET block=? WHERE header_hash=? AND block=?", update
+                    )
+                    updated += cursor.rowcount
+                    await cursor.close()
+                await self.db.commit()
+        return rows[-1][0], updated
+
+    async def get_compression_report(self, sample_size: int = 100) -> Dict[str, Any]:
+        """
+        Reports the number of stored blocks and their size on disk for each format. The compression ratio and the
+        cost of reading blocks are measured on a sample of the most recent blocks, and used to estimate the savings.
+        """
+        cursor = await self.db.execute(
+            "SELECT substr(block, 1, 1), count(*), sum(length(block)) from full_blocks GROUP BY substr(block, 1, 1)"
+        )
+        rows = await cursor.fetchall()
+        await cursor.close()
+        blocks: Dict[int, int] = {}
+        stored_bytes: Dict[int, int] = {}
+        for row in rows:
+            blocks[row[0][0]] = row[1]
+            stored_bytes[row[0][0]] = row[2]
+
+        cursor = await self.db.execute("SELECT block from full_blocks ORDER BY rowid DESC LIMIT ?", (sample_size,))
+        sample = [row[0] for row in await cursor.fetchall()]
+        await cursor.close()
+
+        def measure_sample() -> Tuple[int, int, float, float]:
+            sample_stored = 0
+            sample_raw = 0
+            decode_time = 0.0
+            parse_time = 0.0
+            for stored in sample:
+                start = time.time()
+                block_bytes = self._decode_block(stored)
+                decode_time += time.time() - start
+                start = time.time()
+                FullBlock.from_bytes(block_bytes)
+                parse_time += time.time() - start
+                if block_format(stored) != FORMAT_RAW:
+                    sample_stored += len(stored)
+                    sample_raw += len(block_bytes)
+            if sample_raw == 0:
+                # Nothing compressed in the sample, measure what compressing it would give
+                for stored in sample:
+                    sample_stored += len(self._encode_block(stored) if self.compress_blocks else compress_block(stored))
+                    sample_raw += len(stored)
+            return sample_stored, sample_raw, decode_time, parse_time
+
+        sample_stored, sample_raw, decode_time, parse_time = await asyncio.get_running_loop().run_in_executor(
+            None, measure_sample
+        )
+        ratio = sample_raw / sample_stored if sample_stored > 0 else 1.0
+        compressed_bytes = sum(size for f, size in stored_bytes.items() if f != FORMAT_RAW)
+        raw_bytes = stored_bytes.get(FORMAT_RAW, 0)
+        return {
+            "blocks": blocks,
+            "stored_bytes": stored_bytes,
+            "compression_ratio": ratio,
+            "estimated_saved_bytes": int(compressed_bytes * (ratio - 1)),
+            "estimated_remaining_savings": int(raw_bytes * (1 - 1 / ratio)),
+            "sample_blocks": len(sample),
+            "decode_ms_per_block": 1000 * decode_time / max(len(sample), 1),
+            "parse_ms_per_block": 1000 * parse_time / max(len(sample), 1),
+        }
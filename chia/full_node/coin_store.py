@@ -1,4 +1,5 @@
-from typing import List, Optional
+import logging
+from typing import Dict, List, Optional, Tuple
 
 import aiosqlite
 
@@ -10,6 +11,11 @@ from chia.util.db_wrapper import DBWrapper
 from chia.util.ints import uint32, uint64
 from chia.util.lru_cache import LRUCache
 
+log = logging.getLogger(__name__)
+
+# SQLite limits the number of host parameters in a single statement (999 by default on older versions)
+SQLITE_MAX_VARIABLE_NUMBER = 900
+
 
 class CoinStore:
     """
@@ -31,16 +37,18 @@ class CoinStore:
         self.coin_record_db = db_wrapper.db
         await self.coin_record_db.execute("pragma journal_mode=wal")
         await self.coin_record_db.execute("pragma synchronous=2")
+        # Version 2 databases store coin names, puzzle hashes and parent ids as 32 byte blobs instead of hex text
+        hash_type = "blob" if db_wrapper.db_version == 2 else "text"
         await self.coin_record_db.execute(
             (
                 "CREATE TABLE IF NOT EXISTS coin_record("
-                "coin_name text PRIMARY KEY,"
+                f"coin_name {hash_type} PRIMARY KEY,"
                 " confirmed_index bigint,"
                 " spent_index bigint,"
                 " spent int,"
                 " coinbase int,"
-                " puzzle_hash text,"
-                " coin_parent text,"
+                f" puzzle_hash {hash_type},"
+                f" coin_parent {hash_type},"
                 " amount blob,"
                 " timestamp bigint)"
             )
@@ -61,24 +69,19 @@ class CoinStore:
         self.coin_record_cache = LRUCache(cache_size)
         return self
 
-    async def new_block(self, block: FullBlock, tx_additions: List[Coin], tx_removals: List[bytes32]):
+    async def new_block(self, block: FullBlock, tx_additions: List[Coin], tx_removals: List[bytes32]) -> int:
         """
         Only called for blocks which are blocks (and thus have rewards and transactions)
+        Returns the number of coin_record rows written.
         """
         if block.is_transaction_block() is False:
-            return None
+            return 0
         assert block.foliage_transaction_block is not None
 
+        timestamp = block.foliage_transaction_block.timestamp
+        new_records: List[CoinRecord] = []
         for coin in tx_additions:
-            record: CoinRecord = CoinRecord(
-                coin,
-                block.height,
-                uint32(0),
-                False,
-                False,
-                block.foliage_transaction_block.timestamp,
-            )
-            await self._add_coin_record(record, False)
+            new_records.append(CoinRecord(coin, block.height, uint32(0), False, False, timestamp))
 
         included_reward_coins = block.get_included_reward_coins()
         if block.height == 0:
@@ -87,46 +90,72 @@ class CoinStore:
             assert len(included_reward_coins) >= 2
 
         for coin in included_reward_coins:
-            reward_coin_r: CoinRecord = CoinRecord(
-                coin,
-                block.height,
-                uint32(0),
-                False,
-                True,
-                block.foliage_transaction_block.timestamp,
-            )
-            await self._add_coin_record(reward_coin_r, False)
+            new_records.append(CoinRecord(coin, block.height, uint32(0), False, True, timestamp))
 
-        total_amount_spent: int = 0
-        for coin_name in tx_removals:
-            total_amount_spent += await self._set_spent(coin_name, block.height)
+        await self._add_coin_records(new_records)
+        spent_records = await self._set_spent_many(tx_removals, block.height)
 
         # Sanity check, already checked in block_body_validation
+        total_amount_spent: int = sum([r.coin.amount for r in spent_records])
         assert sum([a.amount for a in tx_additions]) <= total_amount_spent
 
+        rows_written = len(new_records) + len(spent_records)
+        log.debug(
+            f"Coin store block {block.height}: {len(new_records)} coins added, {len(spent_records)} coins spent, "
+            f"{rows_written} rows written"
+        )
+        return rows_written
+
     # Checks DB and DiffStores for CoinRecord with coin_name and returns it
     async def get_coin_record(self, coin_name: bytes32) -> Optional[CoinRecord]:
         cached = self.coin_record_cache.get(coin_name)
         if cached is not None:
             return cached
-        cursor = await self.coin_record_db.execute("SELECT * from coin_record WHERE coin_name=?", (coin_name.hex(),))
+        cursor = await self.coin_record_db.execute(
+            "SELECT * from coin_record WHERE coin_name=?", (self.db_wrapper.to_key(coin_name),)
+        )
         row = await cursor.fetchone()
         await cursor.close()
         if row is not None:
-            coin = Coin(bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), uint64.from_bytes(row[7]))
-            record = CoinRecord(coin, row[1], row[2], row[3], row[4], row[8])
+            record = self._row_to_coin_record(row)
             self.coin_record_cache.put(record.coin.name(), record)
             return record
         return None
 
+    async def get_coin_records(self, coin_names: List[bytes32]) -> Dict[bytes32, CoinRecord]:
+        """
+        Looks up several coin records at once. Cache hits are served from memory, and the rest are fetched with as
+        few queries as possible. Returns a dict from coin name to record, which leaves out coins that don't exist.
+        """
+        records: Dict[bytes32, CoinRecord] = {}
+        missing: List[bytes32] = []
+        for coin_name in coin_names:
+            cached = self.coin_record_cache.get(coin_name)
+            if cached is not None:
+                records[coin_name] = cached
+            else:
+                missing.append(coin_name)
+
+        for i in range(0, len(missing), SQLITE_MAX_VARIABLE_NUMBER):
+            chunk = [self.db_wrapper.to_key(name) for name in missing[i : i + SQLITE_MAX_VARIABLE_NUMBER]]
+            cursor = await self.coin_record_db.execute(
+                f'SELECT * from coin_record WHERE coin_name in ({"?," * (len(chunk) - 1)}?)', chunk
+            )
+            rows = await cursor.fetchall()
+            await cursor.close()
+            for row in rows:
+                record = self._row_to_coin_record(row)
+                records[record.coin.name()] = record
+                self.coin_record_cache.put(record.coin.name(), record)
+        return records
+
     async def get_coins_added_at_height(self, height: uint32) -> List[CoinRecord]:
         cursor = await self.coin_record_db.execute("SELECT * from coin_record WHERE confirmed_index=?", (height,))
         rows = await cursor.fetchall()
         await cursor.close()
         coins = []
         for row in rows:
-            coin = Coin(bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), uint64.from_bytes(row[7]))
-            coins.append(CoinRecord(coin, row[1], row[2], row[3], row[4], row[8]))
+            coins.append(self._row_to_coin_record(row))
         return coins
 
     async def get_coins_removed_at_height(self, height: uint32) -> List[CoinRecord]:
@@ -137,9 +166,7 @@ class CoinStore:
         for row in rows:
             spent: bool = bool(row[3])
             if spent:
-                coin = Coin(bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), uint64.from_bytes(row[7]))
-                coin_record = CoinRecord(coin, row[1], row[2], spent, row[4], row[8])
-                coins.append(coin_record)
+                coins.append(self._row_to_coin_record(row))
         return coins
 
     # Checks DB and DiffStores for CoinRecords with puzzle_hash and returns them
@@ -155,14 +182,13 @@ class CoinStore:
         cursor = await self.coin_record_db.execute(
             f"SELECT * from coin_record WHERE puzzle_hash=? AND confirmed_index>=? AND confirmed_index<? "
             f"{'' if include_spent_coins else 'AND spent=0'}",
-            (puzzle_hash.hex(), start_height, end_height),
+            (self.db_wrapper.to_key(puzzle_hash), start_height, end_height),
         )
         rows = await cursor.fetchall()
 
         await cursor.close()
         for row in rows:
-            coin = Coin(bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), uint64.from_bytes(row[7]))
-            coins.add(CoinRecord(coin, row[1], row[2], row[3], row[4], row[8]))
+            coins.add(self._row_to_coin_record(row))
         return list(coins)
 
     async def get_coin_records_by_puzzle_hashes(
@@ -176,7 +202,7 @@ class CoinStore:
             return []
 
         coins = set()
-        puzzle_hashes_db = tuple([ph.hex() for ph in puzzle_hashes])
+        puzzle_hashes_db = tuple([self.db_wrapper.to_key(ph) for ph in puzzle_hashes])
         cursor = await self.coin_record_db.execute(
             f'SELECT * from coin_record WHERE puzzle_hash in ({"?," * (len(puzzle_hashes_db) - 1)}?) '
             f"AND confirmed_index>=? AND confirmed_index<? "
@@ -188,8 +214,7 @@ class CoinStore:
 
         await cursor.close()
         for row in rows:
-            coin = Coin(bytes32(bytes.fromhex(row[6])), bytes32(bytes.fromhex(row[5])), uint64.from_bytes(row[7]))
-            coins.add(CoinRecord(coin, row[1], row[2], row[3], row[4], row[8]))
+            coins.add(self._row_to_coin_record(row))
         return list(coins)
 
     async def rollback_to_block(self, block_index: int):
@@ -224,41 +249,70 @@ class CoinStore:
         )
         await c2.close()
 
-    # Store CoinRecord in DB and ram cache
-    async def _add_coin_record(self, record: CoinRecord, allow_replace: bool) -> None:
-        if self.coin_record_cache.get(record.coin.name()) is not None:
-            self.coin_record_cache.remove(record.coin.name())
+    def _row_to_coin_record(self, row) -> CoinRecord:
+        coin = Coin(self.db_wrapper.from_key(row[6]), self.db_wrapper.from_key(row[5]), uint64.from_bytes(row[7]))
+        return CoinRecord(coin, row[1], row[2], row[3], row[4], row[8])
+
+    def _coin_record_to_row(self, record: CoinRecord) -> Tuple:
+        return (
+            self.db_wrapper.to_key(record.coin.name()),
+            record.confirmed_block_index,
+            record.spent_block_index,
+            int(record.spent),
+            int(record.coinbase),
+            self.db_wrapper.to_key(record.coin.puzzle_hash),
+            self.db_wrapper.to_key(record.coin.parent_coin_info),
+            bytes(record.coin.amount),
+            record.timestamp,
+        )
 
-        cursor = await self.coin_record_db.execute(
-            f"INSERT {'OR REPLACE ' if allow_replace else ''}INTO coin_record VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)",
-            (
-                record.coin.name().hex(),
-                record.confirmed_block_index,
-                record.spent_block_index,
-                int(record.spent),
-                int(record.coinbase),
-                str(record.coin.puzzle_hash.hex()),
-                str(record.coin.parent_coin_info.hex()),
-                bytes(record.coin.amount),
-                record.timestamp,
-            ),
+    # Store new CoinRecords in DB with a single statement, and drop any stale cache entries
+    async def _add_coin_records(self, records: List[CoinRecord]) -> None:
+        if len(records) == 0:
+            return None
+        cursor = await self.coin_record_db.executemany(
+            "INSERT INTO coin_record VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [self._coin_record_to_row(record) for record in records],
         )
         await cursor.close()
 
-    # Update coin_record to be spent in DB
-    async def _set_spent(self, coin_name: bytes32, index: uint32) -> uint64:
-        current: Optional[CoinRecord] = await self.get_coin_record(coin_name)
-        if current is None:
-            raise ValueError(f"Cannot spend a coin that does not exist in db: {coin_name}")
-
-        assert not current.spent  # Redundant sanity check, already checked in block_body_validation
-        spent: CoinRecord = CoinRecord(
-            current.coin,
-            current.confirmed_block_index,
-            index,
-            True,
-            current.coinbase,
-            current.timestamp,
-        )  # type: ignore # noqa
-        await self._add_coin_record(spent, True)
-        return current.coin.amount
+        for record in records:
+            if self.coin_record_cache.get(record.coin.name()) is not None:
+                self.coin_record_cache.remove(record.coin.name())
+
+    # Update a list of coin_records to be spent in DB, returns the spent records
+    async def _set_spent_many(self, coin_names: List[bytes32], index: uint32) -> List[CoinRecord]:
+        if len(coin_names) == 0:
+            return []
+        # Redundant sanity check, a coin cannot be spent twice in the same block
+        assert len(set(coin_names)) == len(coin_names)
+
+        current: Dict[bytes32, CoinRecord] = await self.get_coin_records(coin_names)
+        spent_records: List[CoinRecord] = []
+        for coin_name in coin_names:
+            if coin_name not in current:
+                raise ValueError(f"Cannot spend a coin that does not exist in db: {coin_name}")
+            record = current[coin_name]
+            assert not record.spent  # Redundant sanity check, already checked in block_body_validation
+            spent_records.append(
+                CoinRecord(
+                    record.coin,
+                    record.confirmed_block_index,
+                    index,
+                    True,
+                    record.coinbase,
+                    record.timestamp,
+                )
+            )  # type: ignore # noqa
+
+        for i in range(0, len(coin_names), SQLITE_MAX_VARIABLE_NUMBER):
+            chunk = [self.db_wrapper.to_key(name) for name in coin_names[i : i + SQLITE_MAX_VARIABLE_NUMBER]]
+            cursor = await self.coin_record_db.execute(
+                f'UPDATE coin_record SET spent_index=?, spent=1 WHERE coin_name in ({"?," * (len(chunk) - 1)}?)',
+                [index] + chunk,
+            )
+            await cursor.close()
+
+        for record in spent_records:
+            self.coin_record_cache.put(record.coin.name(), record)
+        return spent_records
@@ -4,8 +4,9 @@ import logging
 import random
 import time
 import traceback
+from collections import deque
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple, Union
 
 import aiosqlite
 from blspy import AugSchemeMPL
@@ -24,6 +25,7 @@ from chia.full_node.bundle_tools import detect_potential_template_generator
 from chia.full_node.coin_store import CoinStore
 from chia.full_node.full_node_store import FullNodeStore
 from chia.full_node.mempool_manager import MempoolManager
+from chia.full_node.response_cache import ResponseCache
 from chia.full_node.signage_point import SignagePoint
 from chia.full_node.sync_store import SyncStore
 from chia.full_node.weight_proof import WeightProofHandler
@@ -51,6 +53,7 @@ from chia.types.mempool_inclusion_status import MempoolInclusionStatus
 from chia.types.spend_bundle import SpendBundle
 from chia.types.unfinished_block import UnfinishedBlock
 from chia.util.bech32m import encode_puzzle_hash
+from chia.util.db_version import lookup_db_version, set_db_version_async
 from chia.util.db_wrapper import DBWrapper
 from chia.util.errors import ConsensusError, Err
 from chia.util.ints import uint8, uint32, uint64, uint128
@@ -59,6 +62,10 @@ from chia.util.safe_cancel_task import cancel_task_safe
 from chia.util.profiler import profile_task
 
 
+# Blocks needed before a compression dictionary is trained on the most recent ones
+COMPRESSION_DICT_MIN_HEIGHT = 1000
+
+
 class FullNode:
     block_store: BlockStore
     full_node_store: FullNodeStore
@@ -101,7 +108,9 @@ class FullNode:
         self.sync_store = None
         self.signage_point_times = [time.time() for _ in range(self.constants.NUM_SPS_SUB_SLOT)]
         self.full_node_store = FullNodeStore(self.constants)
+        self.response_cache = ResponseCache()
         self.uncompact_task = None
+        self.recompress_task: Optional[asyncio.Task] = None
 
         self.log = logging.getLogger(name if name else __name__)
 
@@ -119,14 +128,25 @@ class FullNode:
         self.compact_vdf_sem = asyncio.Semaphore(4)
         self.new_peak_sem = asyncio.Semaphore(8)
         # create the store (db) and full node instance
+        db_exists = self.db_path.exists()
         self.connection = await aiosqlite.connect(self.db_path)
-        self.db_wrapper = DBWrapper(self.connection)
-        self.block_store = await BlockStore.create(self.db_wrapper)
+        if db_exists:
+            db_version = await lookup_db_version(self.connection)
+        else:
+            # New databases are always created with the current schema version
+            db_version = 2
+            await set_db_version_async(self.connection, db_version)
+        if db_version == 1:
+            self.log.warning(
+                f"Database {self.db_path} uses the version 1 schema, run `chia db upgrade` to convert it to version 2"
+            )
+        self.db_wrapper = DBWrapper(self.connection, db_version)
+        self.block_store = await BlockStore.create(self.db_wrapper, self.config.get("compress_blocks", False))
         self.sync_store = await SyncStore.create()
         self.coin_store = await CoinStore.create(self.db_wrapper)
         self.log.info("Initializing blockchain from disk")
         start_time = time.time()
-        self.blockchain = await Blockchain.create(self.coin_store, self.block_store, self.constants)
+        self.blockchain = await Blockchain.create(self.coin_store, self.block_store, self.constants, self.db_path)
         self.mempool_manager = MempoolManager(self.coin_store, self.constants)
         self.weight_proof_handler = None
         self._init_weight_proof = asyncio.create_task(self.initialize_weight_proof())
@@ -164,12 +184,14 @@ class FullNode:
                     sanitize_weight_proof_only,
                 )
             )
+        if self.block_store.compress_blocks:
+            self.recompress_task = asyncio.create_task(self._recompress_blocks())
         self.initialized = True
         if self.full_node_peers is not None:
             asyncio.create_task(self.full_node_peers.start())
 
     async def initialize_weight_proof(self):
-        self.weight_proof_handler = WeightProofHandler(self.constants, self.blockchain)
+        self.weight_proof_handler = WeightProofHandler(self.constants, self.blockchain, self.blockchain.pool)
         peak = self.blockchain.get_peak()
         if peak is not None:
             await self.weight_proof_handler.create_sub_epoch_segments()
@@ -566,6 +588,8 @@ class FullNode:
             asyncio.create_task(self.full_node_peers.close())
         if self.uncompact_task is not None:
             self.uncompact_task.cancel()
+        if self.recompress_task is not None:
+            self.recompress_task.cancel()
 
     async def _await_closed(self):
         cancel_task_safe(self._sync_task, self.log)
@@ -742,69 +766,118 @@ class FullNode:
                             fork_point_height = our_peak_height
                         break
 
-        for i in range(fork_point_height, target_peak_sb_height, batch_size):
-            start_height = i
-            end_height = min(target_peak_sb_height, start_height + batch_size)
-            request = RequestBlocks(uint32(start_height), uint32(end_height), True)
-            self.log.info(f"Requesting blocks: {start_height} to {end_height}")
-            batch_added = False
-            to_remove = []
-            for peer in peers_with_peak:
-                if peer.closed:
-                    to_remove.append(peer)
-                    continue
-                response = await peer.request_blocks(request, timeout=60)
-                if response is None:
-                    await peer.close()
-                    to_remove.append(peer)
-                    continue
-                if isinstance(response, RejectBlocks):
-                    to_remove.append(peer)
-                    continue
-                elif isinstance(response, RespondBlocks):
+        # Keep up to `window` range requests in flight, spread over all peers with the peak. Batches are validated
+        # strictly in height order as they complete, so downloading overlaps with pre-validation.
+        window = max(1, self.config.get("sync_blocks_window", 8))
+        batches: List[Tuple[int, int]] = [
+            (start_height, min(target_peak_sb_height, start_height + batch_size))
+            for start_height in range(fork_point_height, target_peak_sb_height, batch_size)
+        ]
+        pending: Deque[Tuple[int, int, asyncio.Task]] = deque()
+        next_batch = 0
+        try:
+            while len(pending) > 0 or next_batch < len(batches):
+                while len(pending) < window and next_batch < len(batches):
+                    start_height, end_height = batches[next_batch]
+                    task = asyncio.create_task(
+                        self._fetch_block_range(start_height, end_height, peers_with_peak, next_batch)
+                    )
+                    pending.append((start_height, end_height, task))
+                    next_batch += 1
+
+                start_height, end_height, task = pending.popleft()
+                batch_added = False
+                while True:
+                    fetched: Optional[Tuple[ws.WSChiaConnection, List[FullBlock]]] = await task
+                    if fetched is None:
+                        break
+                    peer, blocks = fetched
                     success, advanced_peak, _ = await self.receive_block_batch(
-                        response.blocks, peer, None if advanced_peak else uint32(fork_point_height), summaries
+                        blocks, peer, None if advanced_peak else uint32(fork_point_height), summaries
                     )
-                    if success is False:
-                        await peer.close(600)
-                        continue
-                    else:
+                    if success is True:
                         batch_added = True
                         break
-
-            peak = self.blockchain.get_peak()
-            assert peak is not None
-            msg = make_msg(
-                ProtocolMessageTypes.new_peak_wallet,
-                wallet_protocol.NewPeakWallet(
-                    peak.header_hash,
-                    peak.height,
-                    peak.weight,
-                    uint32(max(peak.height - 1, uint32(0))),
-                ),
-            )
-            await self.server.send_to_all([msg], NodeType.WALLET)
-
-            for peer in to_remove:
-                peers_with_peak.remove(peer)
-
-            if self.sync_store.peers_changed.is_set():
-                peer_ids = self.sync_store.get_peers_that_have_peak([peak_hash])
-                peers_with_peak = [c for c in self.server.all_connections.values() if c.peer_node_id in peer_ids]
-                self.log.info(f"Number of peers we are syncing from: {len(peers_with_peak)}")
-                self.sync_store.peers_changed.clear()
-
-            if batch_added is False:
-                self.log.info(f"Failed to fetch blocks {start_height} to {end_height} from peers: {peers_with_peak}")
-                break
-            else:
-                self.log.info(f"Added blocks {start_height} to {end_height}")
-                self.blockchain.clean_block_record(
-                    min(
-                        end_height - self.constants.BLOCKS_CACHE_SIZE,
-                        peak.height - self.constants.BLOCKS_CACHE_SIZE,
-                    )
+                    # Invalid batch, ban the peer and retry the same range against the remaining peers
+                    if peer in peers_with_peak:
+                        peers_with_peak.remove(peer)
+                    await peer.close(600)
+                    task = asyncio.create_task(self._fetch_block_range(start_height, end_height, peers_with_peak, 0))
+
+                peak = self.blockchain.get_peak()
+                assert peak is not None
+                msg = make_msg(
+                    ProtocolMessageTypes.new_peak_wallet,
+                    wallet_protocol.NewPeakWallet(
+                        peak.header_hash,
+                        peak.height,
+                        peak.weight,
+                        uint32(max(peak.height - 1, uint32(0))),
+                    ),
                 )
+                await self.server.send_to_all([msg], NodeType.WALLET)
+
+                if self.sync_store.peers_changed.is_set():
+                    peer_ids = self.sync_store.get_peers_that_have_peak([peak_hash])
+                    # Update in place, so that the in flight fetch tasks see the new peers
+                    peers_with_peak[:] = [c for c in self.server.all_connections.values() if c.peer_node_id in peer_ids]
+                    self.log.info(f"Number of peers we are syncing from: {len(peers_with_peak)}")
+                    self.sync_store.peers_changed.clear()
+
+                if batch_added is False:
+                    self.log.info(
+                        f"Failed to fetch blocks {start_height} to {end_height} from peers: {peers_with_peak}"
+                    )
+                    break
+                else:
+                    self.log.info(f"Added blocks {start_height} to {end_height}")
+                    self.blockchain.clean_block_record(
+                        min(
+                            end_height - self.constants.BLOCKS_CACHE_SIZE,
+                            peak.height - self.constants.BLOCKS_CACHE_SIZE,
+                        )
+                    )
+        finally:
+            for _, _, task in pending:
+                cancel_task_safe(task, self.log)
+
+    async def _fetch_block_range(
+        self,
+        start_height: int,
+        end_height: int,
+        peers_with_peak: List[ws.WSChiaConnection],
+        peer_offset: int,
+    ) -> Optional[Tuple[ws.WSChiaConnection, List[FullBlock]]]:
+        """
+        Fetches the blocks in [start_height, end_height] from one of the peers in peers_with_peak. Peers are tried
+        starting at peer_offset (so that concurrent fetches are spread across peers), and peers that time out or
+        reject the request are removed from peers_with_peak. Returns None if no peer returned the blocks.
+        """
+        request = RequestBlocks(uint32(start_height), uint32(end_height), True)
+        tried: Set[bytes32] = set()
+        while True:
+            candidates = [p for p in peers_with_peak if p.peer_node_id not in tried]
+            if len(candidates) == 0:
+                return None
+            peer = candidates[peer_offset % len(candidates)]
+            tried.add(peer.peer_node_id)
+            if peer.closed:
+                if peer in peers_with_peak:
+                    peers_with_peak.remove(peer)
+                continue
+            self.log.info(f"Requesting blocks: {start_height} to {end_height} from {peer.peer_host}")
+            response = await peer.request_blocks(request, timeout=60)
+            if response is None:
+                if peer in peers_with_peak:
+                    peers_with_peak.remove(peer)
+                await peer.close()
+                continue
+            if isinstance(response, RejectBlocks):
+                if peer in peers_with_peak:
+                    peers_with_peak.remove(peer)
+                continue
+            if isinstance(response, RespondBlocks):
+                return peer, response.blocks
 
     async def receive_block_batch(
         self,
@@ -882,7 +955,7 @@ class FullNode:
                 await self.peak_post_processing(peak_fb, peak, max(peak.height - 1, 0), None)
 
         if peak is not None and self.weight_proof_handler is not None:
-            await self.weight_proof_handler.get_proof_of_weight(peak.header_hash)
+            await self.weight_proof_handler.get_proof_of_weight_response(peak.header_hash)
             self._state_changed("block")
 
     def has_valid_pool_sig(self, block: Union[UnfinishedBlock, FullBlock]):
@@ -991,6 +1064,7 @@ class FullNode:
         if fork_height != block.height - 1 and block.height != 0:
             # This is a reorg
             fork_block = self.blockchain.block_record(self.blockchain.height_to_hash(fork_height))
+            self.response_cache.invalidate_from(fork_height + 1)
 
         added_eos, new_sps, new_ips = self.full_node_store.new_peak(
             record,
@@ -1807,6 +1881,9 @@ class FullNode:
                 await self.block_store.add_full_block(new_block.header_hash, new_block, block_record)
                 await self.block_store.db_wrapper.commit_transaction()
                 replaced = True
+        if replaced:
+            # Serve the compact proof from now on
+            self.response_cache.invalidate_height(height)
         return replaced
 
     async def respond_compact_proof_of_time(self, request: timelord_protocol.RespondCompactProofOfTime):
@@ -1909,6 +1986,40 @@ class FullNode:
         if self.server is not None:
             await self.server.send_to_all_except([msg], NodeType.FULL_NODE, peer.peer_node_id)
 
+    async def _recompress_blocks(self) -> None:
+        """
+        Trains a compression dictionary once the chain has enough blocks, then re-encodes the blocks stored in an
+        older format, a batch at a time, and logs the compression report when done.
+        """
+        try:
+            if len(self.block_store.compression_dicts) == 0:
+                while (self.blockchain.get_peak_height() or 0) < COMPRESSION_DICT_MIN_HEIGHT or (
+                    self.sync_store.get_sync_mode()
+                ):
+                    if self._shut_down:
+                        return None
+                    await asyncio.sleep(60)
+                dict_id = await self.block_store.train_compression_dict()
+                self.log.info(f"Trained block compression dictionary {dict_id}")
+            rowid = 0
+            recompressed = 0
+            while not self._shut_down:
+                if self.sync_store.get_sync_mode():
+                    await asyncio.sleep(30)
+                    continue
+                next_rowid, count = await self.block_store.recompress_blocks(rowid)
+                if next_rowid == rowid:
+                    break
+                rowid = next_rowid
+                recompressed += count
+                # Leaves the database to block validation between batches
+                await asyncio.sleep(0.1)
+            self.log.info(f"Recompressed {recompressed} blocks: {await self.block_store.get_compression_report()}")
+        except Exception as e:
+            error_stack = traceback.format_exc()
+            self.log.error(f"Exception in _recompress_blocks: {e}")
+            self.log.error(f"Exception Stack: {error_stack}")
+
     async def broadcast_uncompact_blocks(
         self, uncompact_interval_scan: int, target_uncompact_proofs: int, sanitize_weight_proof_only: bool
     ):
@@ -26,24 +26,34 @@ from chia.types.blockchain_format.program import Program
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.coin_record import CoinRecord
 from chia.types.end_of_slot_bundle import EndOfSubSlotBundle
-from chia.types.full_block import FullBlock
+from chia.types.full_block import FullBlock, FullBlockView
 from chia.types.generator_types import BlockGenerator
 from chia.types.mempool_inclusion_status import MempoolInclusionStatus
 from chia.types.mempool_item import MempoolItem
 from chia.types.peer_info import PeerInfo
 from chia.types.unfinished_block import UnfinishedBlock
 from chia.util.api_decorators import api_request, peer_required, bytes_required, execute_task
-from chia.util.generator_tools import get_block_header
+from chia.util.generator_tools import get_transactions_filter
 from chia.util.hash import std_hash
 from chia.util.ints import uint8, uint32, uint64, uint128
+from chia.util.lru_cache import LRUCache
 from chia.util.merkle_set import MerkleSet
 
 
+# Blocks whose addition and removal Merkle sets are kept, wallets mostly ask about the same recent blocks
+MERKLE_SET_CACHE_SIZE = 50
+
+
 class FullNodeAPI:
     full_node: FullNode
+    # Header hash -> Merkle set of the additions or removals of the block
+    additions_merkle_sets: LRUCache
+    removals_merkle_sets: LRUCache
 
     def __init__(self, full_node) -> None:
         self.full_node = full_node
+        self.additions_merkle_sets = LRUCache(MERKLE_SET_CACHE_SIZE)
+        self.removals_merkle_sets = LRUCache(MERKLE_SET_CACHE_SIZE)
 
     def _set_state_changed_callback(self, callback: Callable):
         self.full_node.state_changed_callback = callback
@@ -239,11 +249,11 @@ class FullNodeAPI:
         if request.tip in self.full_node.pow_creation:
             event = self.full_node.pow_creation[request.tip]
             await event.wait()
-            wp = await self.full_node.weight_proof_handler.get_proof_of_weight(request.tip)
+            response = await self.full_node.weight_proof_handler.get_proof_of_weight_response(request.tip)
         else:
             event = asyncio.Event()
             self.full_node.pow_creation[request.tip] = event
-            wp = await self.full_node.weight_proof_handler.get_proof_of_weight(request.tip)
+            response = await self.full_node.weight_proof_handler.get_proof_of_weight_response(request.tip)
             event.set()
         tips = list(self.full_node.pow_creation.keys())
 
@@ -252,22 +262,12 @@ class FullNodeAPI:
             for i in range(0, 4):
                 self.full_node.pow_creation.pop(tips[i])
 
-        if wp is None:
+        if response is None:
             self.log.error(f"failed creating weight proof for peak {request.tip}")
             return None
 
-        # Serialization of wp is slow
-        if (
-            self.full_node.full_node_store.serialized_wp_message_tip is not None
-            and self.full_node.full_node_store.serialized_wp_message_tip == request.tip
-        ):
-            return self.full_node.full_node_store.serialized_wp_message
-        message = make_msg(
-            ProtocolMessageTypes.respond_proof_of_weight, full_node_protocol.RespondProofOfWeight(wp, request.tip)
-        )
-        self.full_node.full_node_store.serialized_wp_message_tip = request.tip
-        self.full_node.full_node_store.serialized_wp_message = message
-        return message
+        # Serialization of wp is slow, the handler keeps the serialized response with the weight proof
+        return Message(uint8(ProtocolMessageTypes.respond_proof_of_weight.value), None, response)
 
     @api_request
     async def respond_proof_of_weight(self, request: full_node_protocol.RespondProofOfWeight) -> Optional[Message]:
@@ -281,11 +281,12 @@ class FullNodeAPI:
             msg = make_msg(ProtocolMessageTypes.reject_block, reject)
             return msg
         header_hash = self.full_node.blockchain.height_to_hash(request.height)
-        block: Optional[FullBlock] = await self.full_node.block_store.get_full_block(header_hash)
-        if block is not None:
-            if not request.include_transaction_block and block.transactions_generator is not None:
-                block = dataclasses.replace(block, transactions_generator=None)
-            return make_msg(ProtocolMessageTypes.respond_block, full_node_protocol.RespondBlock(block))
+        block_view: Optional[FullBlockView] = await self.full_node.block_store.get_full_block_view(header_hash)
+        if block_view is not None:
+            # RespondBlock is serialized as just the block, so the stored bytes can be sent without parsing them
+            if not request.include_transaction_block:
+                return make_msg(ProtocolMessageTypes.respond_block, block_view.bytes_without_transactions_generator())
+            return make_msg(ProtocolMessageTypes.respond_block, bytes(block_view))
         reject = RejectBlock(request.height)
         msg = make_msg(ProtocolMessageTypes.reject_block, reject)
         return msg
@@ -302,43 +303,45 @@ class FullNodeAPI:
                 msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
                 return msg
 
-        if not request.include_transaction_block:
-            blocks: List[FullBlock] = []
-            for i in range(request.start_height, request.end_height + 1):
-                block: Optional[FullBlock] = await self.full_node.block_store.get_full_block(
-                    self.full_node.blockchain.height_to_hash(uint32(i))
-                )
-                if block is None:
-                    reject = RejectBlocks(request.start_height, request.end_height)
-                    msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
-                    return msg
-                block = dataclasses.replace(block, transactions_generator=None)
-                blocks.append(block)
-            msg = make_msg(
-                ProtocolMessageTypes.respond_blocks,
-                full_node_protocol.RespondBlocks(request.start_height, request.end_height, blocks),
-            )
-        else:
-            blocks_bytes: List[bytes] = []
-            for i in range(request.start_height, request.end_height + 1):
-                block_bytes: Optional[bytes] = await self.full_node.block_store.get_full_block_bytes(
-                    self.full_node.blockchain.height_to_hash(uint32(i))
-                )
-                if block_bytes is None:
-                    reject = RejectBlocks(request.start_height, request.end_height)
-                    msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
-                    return msg
+        end_hash: Optional[bytes32] = self.full_node.blockchain.height_to_hash(request.end_height)
+        assert end_hash is not None
+        key = (
+            ProtocolMessageTypes.respond_blocks,
+            request.start_height,
+            request.end_height,
+            request.include_transaction_block,
+        )
+        cached: Optional[Message] = self.full_node.response_cache.get(key, end_hash)
+        if cached is not None:
+            return cached
+
+        blocks_bytes: List[bytes] = []
+        for i in range(request.start_height, request.end_height + 1):
+            header_hash: Optional[bytes32] = self.full_node.blockchain.height_to_hash(uint32(i))
+            block_bytes: Optional[bytes] = None
+            if header_hash is not None:
+                if request.include_transaction_block:
+                    block_bytes = await self.full_node.block_store.get_full_block_bytes(header_hash)
+                else:
+                    block_view = await self.full_node.block_store.get_full_block_view(header_hash)
+                    if block_view is not None:
+                        block_bytes = block_view.bytes_without_transactions_generator()
+            if block_bytes is None:
+                reject = RejectBlocks(request.start_height, request.end_height)
+                msg = make_msg(ProtocolMessageTypes.reject_blocks, reject)
+                return msg
 
-                blocks_bytes.append(block_bytes)
+            blocks_bytes.append(block_bytes)
 
-            respond_blocks_manually_streamed: bytes = (
-                bytes(uint32(request.start_height))
-                + bytes(uint32(request.end_height))
-                + len(blocks_bytes).to_bytes(4, "big", signed=False)
-            )
-            for block_bytes in blocks_bytes:
-                respond_blocks_manually_streamed += block_bytes
-            msg = make_msg(ProtocolMessageTypes.respond_blocks, respond_blocks_manually_streamed)
+        respond_blocks_manually_streamed: bytes = (
+            bytes(uint32(request.start_height))
+            + bytes(uint32(request.end_height))
+            + len(blocks_bytes).to_bytes(4, "big", signed=False)
+        )
+        for block_bytes in blocks_bytes:
+            respond_blocks_manually_streamed += block_bytes
+        msg = make_msg(ProtocolMessageTypes.respond_blocks, respond_blocks_manually_streamed)
+        self.full_node.response_cache.put(key, end_hash, msg)
 
         return msg
 
@@ -1051,15 +1054,14 @@ class FullNodeAPI:
         if header_hash is None:
             msg = make_msg(ProtocolMessageTypes.reject_header_request, RejectHeaderRequest(request.height))
             return msg
-        block: Optional[FullBlock] = await self.full_node.block_store.get_full_block(header_hash)
-        if block is not None:
-            tx_removals, tx_additions = await self.full_node.blockchain.get_tx_removals_and_additions(block)
-            header_block = get_block_header(block, tx_additions, tx_removals)
-            msg = make_msg(
-                ProtocolMessageTypes.respond_block_header,
-                wallet_protocol.RespondBlockHeader(header_block),
+        block_view: Optional[FullBlockView] = await self.full_node.block_store.get_full_block_view(header_hash)
+        if block_view is not None:
+            tx_removals, tx_additions = await self.full_node.blockchain.get_tx_removals_and_additions(block_view)
+            transactions_filter = get_transactions_filter(block_view, tx_additions, tx_removals)
+            # RespondBlockHeader is serialized as just the header block, which is cut from the stored block
+            return make_msg(
+                ProtocolMessageTypes.respond_block_header, block_view.header_block_bytes(transactions_filter)
             )
-            return msg
         return None
 
     @api_request
@@ -1100,14 +1102,15 @@ class FullNodeAPI:
                 coins_map.append((puzzle_hash, coins))
             response = wallet_protocol.RespondAdditions(block.height, block.header_hash, coins_map, None)
         else:
-            # Create addition Merkle set
-            addition_merkle_set = MerkleSet()
-            # Addition Merkle set contains puzzlehash and hash of all coins with that puzzlehash
-            for puzzle, coins in puzzlehash_coins_map.items():
-                addition_merkle_set.add_already_hashed(puzzle)
-                addition_merkle_set.add_already_hashed(hash_coin_list(coins))
-
-            assert addition_merkle_set.get_root() == block.foliage_transaction_block.additions_root
+            addition_merkle_set: Optional[MerkleSet] = self.additions_merkle_sets.get(block.header_hash)
+            if addition_merkle_set is None:
+                # Addition Merkle set contains puzzlehash and hash of all coins with that puzzlehash
+                addition_merkle_set = MerkleSet.from_already_hashed(
+                    [puzzle for puzzle in puzzlehash_coins_map]
+                    + [hash_coin_list(coins) for coins in puzzlehash_coins_map.values()]
+                )
+                assert addition_merkle_set.get_root() == block.foliage_transaction_block.additions_root
+                self.additions_merkle_sets.put(block.header_hash, addition_merkle_set)
             for puzzle_hash in request.puzzle_hashes:
                 result, proof = addition_merkle_set.is_included_already_hashed(puzzle_hash)
                 if puzzle_hash in puzzlehash_coins_map:
@@ -1170,10 +1173,11 @@ class FullNodeAPI:
             response = wallet_protocol.RespondRemovals(block.height, block.header_hash, coins_map, None)
         else:
             assert block.transactions_generator
-            removal_merkle_set = MerkleSet()
-            for removed_name, removed_coin in all_removals_dict.items():
-                removal_merkle_set.add_already_hashed(removed_name)
-            assert removal_merkle_set.get_root() == block.foliage_transaction_block.removals_root
+            removal_merkle_set: Optional[MerkleSet] = self.removals_merkle_sets.get(block.header_hash)
+            if removal_merkle_set is None:
+                removal_merkle_set = MerkleSet.from_already_hashed(all_removals_dict.keys())
+                assert removal_merkle_set.get_root() == block.foliage_transaction_block.removals_root
+                self.removals_merkle_sets.put(block.header_hash, removal_merkle_set)
             for coin_name in request.coin_names:
                 result, proof = removal_merkle_set.is_included_already_hashed(coin_name)
                 proofs_map.append((coin_name, proof))
@@ -1251,20 +1255,29 @@ class FullNodeAPI:
                 return msg
             header_hashes.append(self.full_node.blockchain.height_to_hash(uint32(i)))
 
-        blocks: List[FullBlock] = await self.full_node.block_store.get_blocks_by_hash(header_hashes)
-        header_blocks = []
-        for block in blocks:
-            added_coins_records = await self.full_node.coin_store.get_coins_added_at_height(block.height)
-            removed_coins_records = await self.full_node.coin_store.get_coins_removed_at_height(block.height)
+        end_hash: Optional[bytes32] = header_hashes[-1]
+        assert end_hash is not None
+        key = (ProtocolMessageTypes.respond_header_blocks, request.start_height, request.end_height, False)
+        cached: Optional[Message] = self.full_node.response_cache.get(key, end_hash)
+        if cached is not None:
+            return cached
+
+        block_views: List[FullBlockView] = await self.full_node.block_store.get_block_views_by_hash(header_hashes)
+        respond_header_blocks_manually_streamed: bytes = (
+            bytes(uint32(request.start_height))
+            + bytes(uint32(request.end_height))
+            + len(block_views).to_bytes(4, "big", signed=False)
+        )
+        for block_view in block_views:
+            added_coins_records = await self.full_node.coin_store.get_coins_added_at_height(block_view.height)
+            removed_coins_records = await self.full_node.coin_store.get_coins_removed_at_height(block_view.height)
             added_coins = [record.coin for record in added_coins_records if not record.coinbase]
             removal_names = [record.coin.name() for record in removed_coins_records]
-            header_block = get_block_header(block, added_coins, removal_names)
-            header_blocks.append(header_block)
+            transactions_filter = get_transactions_filter(block_view, added_coins, removal_names)
+            respond_header_blocks_manually_streamed += block_view.header_block_bytes(transactions_filter)
 
-        msg = make_msg(
-            ProtocolMessageTypes.respond_header_blocks,
-            wallet_protocol.RespondHeaderBlocks(request.start_height, request.end_height, header_blocks),
-        )
+        msg = make_msg(ProtocolMessageTypes.respond_header_blocks, respond_header_blocks_manually_streamed)
+        self.full_node.response_cache.put(key, end_hash, msg)
         return msg
 
     @api_request
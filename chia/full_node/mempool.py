@@ -2,7 +2,6 @@ from typing import Dict, List
 
 from sortedcontainers import SortedDict
 
-from chia.types.blockchain_format.coin import Coin
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.mempool_item import MempoolItem
 
@@ -39,14 +38,13 @@ class Mempool:
 
     def remove_from_pool(self, item: MempoolItem):
         """
-        Removes an item from the mempool.
+        Removes an item from the mempool. This uses the additions and removals stored in the item, and does not
+        run the puzzles of the spend bundle again.
         """
-        removals: List[Coin] = item.spend_bundle.removals()
-        additions: List[Coin] = item.spend_bundle.additions()
-        for rem in removals:
-            del self.removals[rem.name()]
-        for add in additions:
-            del self.additions[add.name()]
+        for name in item.removal_names:
+            del self.removals[name]
+        for name in item.addition_names:
+            del self.additions[name]
         del self.spends[item.name]
         del self.sorted_spends[item.fee_per_cost][item.name]
         dic = self.sorted_spends[item.fee_per_cost]
@@ -55,21 +53,19 @@ class Mempool:
         self.total_mempool_cost -= item.cost
         assert self.total_mempool_cost >= 0
 
-    def add_to_pool(
-        self,
-        item: MempoolItem,
-        additions: List[Coin],
-        removals_dic: Dict[bytes32, Coin],
-    ):
+    def add_to_pool(self, item: MempoolItem) -> List[MempoolItem]:
         """
-        Adds an item to the mempool by kicking out transactions (if it doesn't fit), in order of increasing fee per cost
+        Adds an item to the mempool by kicking out transactions (if it doesn't fit), in order of increasing fee per
+        cost. Returns the items that were kicked out.
         """
 
+        removed: List[MempoolItem] = []
         while self.at_full_capacity(item.cost):
             # Val is Dict[hash, MempoolItem]
             fee_per_cost, val = self.sorted_spends.peekitem(index=0)
             to_remove = list(val.values())[0]
             self.remove_from_pool(to_remove)
+            removed.append(to_remove)
 
         self.spends[item.name] = item
 
@@ -79,11 +75,12 @@ class Mempool:
 
         self.sorted_spends[item.fee_per_cost][item.name] = item
 
-        for add in additions:
-            self.additions[add.name()] = item
-        for key in removals_dic.keys():
-            self.removals[key] = item
+        for name in item.addition_names:
+            self.additions[name] = item
+        for name in item.removal_names:
+            self.removals[name] = item
         self.total_mempool_cost += item.cost
+        return removed
 
     def at_full_capacity(self, cost: int) -> bool:
         """
@@ -5,7 +5,7 @@ import logging
 import time
 from concurrent.futures.process import ProcessPoolExecutor
 from typing import Dict, List, Optional, Set, Tuple
-from blspy import AugSchemeMPL, G1Element
+from blspy import G1Element
 from chiabip158 import PyBIP158
 
 from chia.consensus.block_record import BlockRecord
@@ -23,7 +23,9 @@ from chia.types.condition_opcodes import ConditionOpcode
 from chia.types.condition_with_args import ConditionWithArgs
 from chia.types.mempool_inclusion_status import MempoolInclusionStatus
 from chia.types.mempool_item import MempoolItem
+from chia.types.name_puzzle_condition import NPC
 from chia.types.spend_bundle import SpendBundle
+from chia.util import cached_bls
 from chia.util.clvm import int_from_bytes
 from chia.util.condition_tools import (
     pkm_pairs_for_conditions_dict,
@@ -51,6 +53,8 @@ class MempoolManager:
 
         # Transactions that were unable to enter mempool, used for retry. (they were invalid)
         self.potential_txs: Dict[bytes32, MempoolItem] = {}
+        # Peak height at which the height locks of the potential txs pending on them are satisfied
+        self.potential_lock_heights: Dict[bytes32, int] = {}
         # Keep track of seen spend_bundles
         self.seen_bundle_hashes: Dict[bytes32, bytes32] = {}
 
@@ -297,8 +301,11 @@ class MempoolManager:
         removal_record_dict: Dict[bytes32, CoinRecord] = {}
         removal_coin_dict: Dict[bytes32, Coin] = {}
         removal_amount = uint64(0)
+        removal_records: Dict[bytes32, CoinRecord] = await self.coin_store.get_coin_records(
+            [name for name in removal_names if name not in additions_dict]
+        )
         for name in removal_names:
-            removal_record = await self.coin_store.get_coin_record(name)
+            removal_record = removal_records.get(name)
             if removal_record is None and name not in additions_dict:
                 return None, MempoolInclusionStatus.FAILED, Err.UNKNOWN_UNSPENT
             elif name in additions_dict:
@@ -412,7 +419,7 @@ class MempoolManager:
                     potential = MempoolItem(
                         new_spend, uint64(fees), npc_result, cost, spend_name, additions, removals, program
                     )
-                    self.add_to_potential_tx_set(potential)
+                    self.add_to_potential_tx_set(potential, self._lock_height(npc_list, removal_record_dict))
                     return uint64(cost), MempoolInclusionStatus.PENDING, error
                 break
 
@@ -427,7 +434,8 @@ class MempoolManager:
 
         if validate_signature:
             # Verify aggregated signature
-            if not AugSchemeMPL.aggregate_verify(pks, msgs, new_spend.aggregated_signature):
+            # The pairings are cached, so the block that includes this spend bundle can reuse them
+            if not cached_bls.aggregate_verify(pks, msgs, new_spend.aggregated_signature, force_cache=True):
                 log.warning(f"Aggsig validation error {pks} {msgs} {new_spend}")
                 return None, MempoolInclusionStatus.FAILED, Err.BAD_AGGREGATE_SIGNATURE
         # Remove all conflicting Coins and SpendBundles
@@ -435,9 +443,11 @@ class MempoolManager:
             mempool_item: MempoolItem
             for mempool_item in conflicting_pool_items.values():
                 self.mempool.remove_from_pool(mempool_item)
+                self._evict_pairings(mempool_item)
 
         new_item = MempoolItem(new_spend, uint64(fees), npc_result, cost, spend_name, additions, removals, program)
-        self.mempool.add_to_pool(new_item, additions, removal_coin_dict)
+        for removed_item in self.mempool.add_to_pool(new_item):
+            self._evict_pairings(removed_item)
         log.info(
             f"add_spendbundle took {time.time() - start_time} seconds, cost {cost} "
             f"({round(100.0 * cost/self.constants.MAX_BLOCK_COST_CLVM, 3)}%)"
@@ -468,21 +478,25 @@ class MempoolManager:
         # 5. If coins can be spent return list of unspents as we see them in local storage
         return None, []
 
-    def add_to_potential_tx_set(self, item: MempoolItem):
+    def add_to_potential_tx_set(self, item: MempoolItem, lock_height: Optional[int] = None):
         """
         Adds SpendBundles that have failed to be added to the pool in potential tx set.
-        This is later used to retry to add them.
+        This is later used to retry to add them. lock_height is the peak height at which the height locks of the
+        SpendBundle are satisfied, if it failed on them.
         """
         if item.spend_bundle_name in self.potential_txs:
             return None
 
         self.potential_txs[item.spend_bundle_name] = item
         self.potential_cache_cost += item.cost
+        if lock_height is not None:
+            self.potential_lock_heights[item.spend_bundle_name] = lock_height
 
         while self.potential_cache_cost > self.potential_cache_max_total_cost:
             first_in = list(self.potential_txs.keys())[0]
-            self.potential_cache_max_total_cost -= self.potential_txs[first_in].cost
+            self.potential_cache_cost -= self.potential_txs[first_in].cost
             self.potential_txs.pop(first_in)
+            self.potential_lock_heights.pop(first_in, None)
 
     def get_spendbundle(self, bundle_hash: bytes32) -> Optional[SpendBundle]:
         """Returns a full SpendBundle if it's inside one the mempools"""
@@ -498,7 +512,9 @@ class MempoolManager:
 
     async def new_peak(self, new_peak: Optional[BlockRecord]) -> List[Tuple[SpendBundle, NPCResult, bytes32]]:
         """
-        Called when a new peak is available, we try to recreate a mempool for the new tip.
+        Called when a new peak is available, we try to recreate a mempool for the new tip. If the new peak is the
+        next transaction block after our current peak, the mempool is updated incrementally from the coins spent and
+        created by the new peak. Otherwise (reorgs, startup) the mempool is rebuilt from scratch.
         """
         if new_peak is None:
             return []
@@ -510,37 +526,130 @@ class MempoolManager:
         if new_peak.timestamp <= self.constants.INITIAL_FREEZE_END_TIMESTAMP:
             return []
 
+        prev_peak = self.peak
         self.peak = new_peak
 
-        old_pool = self.mempool
         async with self.lock:
-            self.mempool = Mempool(self.mempool_max_total_cost)
-
-            for item in old_pool.spends.values():
-                _, result, _ = await self.add_spendbundle(
-                    item.spend_bundle, item.npc_result, item.spend_bundle_name, False, item.program
-                )
-                # If the spend bundle was confirmed or conflicting (can no longer be in mempool), it won't be
-                # successfully added to the new mempool. In this case, remove it from seen, so in the case of a reorg,
-                # it can be resubmitted
-                if result != MempoolInclusionStatus.SUCCESS:
-                    self.remove_seen(item.spend_bundle_name)
-
-            potential_txs_copy = self.potential_txs.copy()
-            self.potential_txs = {}
-            txs_added = []
-            for item in potential_txs_copy.values():
-                cost, status, error = await self.add_spendbundle(
-                    item.spend_bundle, item.npc_result, item.spend_bundle_name, program=item.program
-                )
-                if status == MempoolInclusionStatus.SUCCESS:
-                    txs_added.append((item.spend_bundle, item.npc_result, item.spend_bundle_name))
+            if prev_peak is not None and new_peak.prev_transaction_block_hash == prev_peak.header_hash:
+                txs_added = await self._update_mempool(new_peak)
+            else:
+                txs_added = await self._rebuild_mempool()
         log.info(
             f"Size of mempool: {len(self.mempool.spends)} spends, cost: {self.mempool.total_mempool_cost} "
             f"minimum fee to get in: {self.mempool.get_min_fee_rate(100000)}"
         )
         return txs_added
 
+    async def _rebuild_mempool(self) -> List[Tuple[SpendBundle, NPCResult, bytes32]]:
+        """
+        Re-adds every mempool item and potential tx against the current peak. Must be called under self.lock.
+        """
+        old_pool = self.mempool
+        self.mempool = Mempool(self.mempool_max_total_cost)
+
+        for item in old_pool.spends.values():
+            _, result, _ = await self.add_spendbundle(
+                item.spend_bundle, item.npc_result, item.spend_bundle_name, False, item.program
+            )
+            # If the spend bundle was confirmed or conflicting (can no longer be in mempool), it won't be
+            # successfully added to the new mempool. In this case, remove it from seen, so in the case of a reorg,
+            # it can be resubmitted
+            if result != MempoolInclusionStatus.SUCCESS:
+                self.remove_seen(item.spend_bundle_name)
+                self._evict_pairings(item)
+
+        potential_txs_copy = self.potential_txs.copy()
+        self.potential_txs = {}
+        self.potential_lock_heights = {}
+        self.potential_cache_cost = 0
+        txs_added = []
+        for item in potential_txs_copy.values():
+            cost, status, error = await self.add_spendbundle(
+                item.spend_bundle, item.npc_result, item.spend_bundle_name, program=item.program
+            )
+            if status == MempoolInclusionStatus.SUCCESS:
+                txs_added.append((item.spend_bundle, item.npc_result, item.spend_bundle_name))
+        return txs_added
+
+    async def _update_mempool(self, new_peak: BlockRecord) -> List[Tuple[SpendBundle, NPCResult, bytes32]]:
+        """
+        Updates the mempool for a new peak that directly follows the current mempool peak. Only the items that
+        spend coins spent by the new peak are evicted, and only the potential txs that may have become valid are
+        retried. Must be called under self.lock.
+
+        The other items stay valid: their coins are still unspent, and time and height locks only assert that the
+        peak is past some height or time, which stays true as the chain grows.
+        """
+        spent_coins: Set[bytes32] = {r.name for r in await self.coin_store.get_coins_removed_at_height(new_peak.height)}
+
+        # Items that spend a coin spent in the peak were either included, or are now double spends. Items only spend
+        # coins from the coin store or from their own spend bundle, so no other item depends on them.
+        freed_coins: Set[bytes32] = set()
+        for coin_name in spent_coins:
+            item = self.mempool.removals.get(coin_name)
+            if item is None:
+                continue
+            self.mempool.remove_from_pool(item)
+            self.remove_seen(item.spend_bundle_name)
+            self._evict_pairings(item)
+            freed_coins.update(item.removal_names)
+
+        potential_txs_copy = self.potential_txs.copy()
+        lock_heights = self.potential_lock_heights
+        self.potential_txs = {}
+        self.potential_lock_heights = {}
+        self.potential_cache_cost = 0
+        txs_added = []
+        for item in potential_txs_copy.values():
+            removal_names: List[bytes32] = item.removal_names
+            if any(name in spent_coins for name in removal_names):
+                # Can never become valid on top of this peak
+                continue
+            lock_height = lock_heights.get(item.spend_bundle_name)
+            if lock_height is not None:
+                retry = new_peak.height >= lock_height
+            else:
+                retry = any(name in freed_coins for name in removal_names)
+            if not retry:
+                # Nothing that caused this tx to be pending has changed
+                self.add_to_potential_tx_set(item, lock_height)
+                continue
+            cost, status, error = await self.add_spendbundle(
+                item.spend_bundle, item.npc_result, item.spend_bundle_name, program=item.program
+            )
+            if status == MempoolInclusionStatus.SUCCESS:
+                txs_added.append((item.spend_bundle, item.npc_result, item.spend_bundle_name))
+        return txs_added
+
+    def _evict_pairings(self, item: MempoolItem) -> None:
+        """
+        Removes the cached signature pairings of an item that left the mempool, they are only reused by blocks that
+        include it.
+        """
+        pks: List[G1Element] = []
+        msgs: List[bytes] = []
+        for npc in item.npc_result.npc_list:
+            for pk, message in pkm_pairs_for_conditions_dict(
+                npc.condition_dict, npc.coin_name, self.constants.AGG_SIG_ME_ADDITIONAL_DATA
+            ):
+                pks.append(pk)
+                msgs.append(message)
+        cached_bls.evict_pairings(pks, msgs)
+
+    @staticmethod
+    def _lock_height(npc_list: List[NPC], removal_record_dict: Dict[bytes32, CoinRecord]) -> int:
+        """
+        Returns the lowest peak height at which all the height locks of the spends are satisfied.
+        """
+        lock_height = 0
+        for npc in npc_list:
+            for cvp in npc.condition_dict.get(ConditionOpcode.ASSERT_HEIGHT_ABSOLUTE, []):
+                lock_height = max(lock_height, int_from_bytes(cvp.vars[0]))
+            for cvp in npc.condition_dict.get(ConditionOpcode.ASSERT_HEIGHT_RELATIVE, []):
+                confirmed_height = removal_record_dict[npc.coin_name].confirmed_block_index
+                lock_height = max(lock_height, confirmed_height + int_from_bytes(cvp.vars[0]))
+        return lock_height
+
     async def get_items_not_in_filter(self, mempool_filter: PyBIP158, limit: int = 100) -> List[MempoolItem]:
         items: List[MempoolItem] = []
         counter = 0
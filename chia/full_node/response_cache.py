@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.server.outbound_message import Message
+from chia.types.blockchain_format.sized_bytes import bytes32
+
+# Bytes of message data kept, a few hundred ranges of full blocks
+RESPONSE_CACHE_SIZE = 128 * 1024 * 1024
+
+# Message type of the response, start height, end height, and the flag of the request
+ResponseKey = Tuple[ProtocolMessageTypes, int, int, bool]
+
+
+class ResponseCache:
+    """
+    Keeps the encoded responses to requests for ranges of blocks, so peers syncing the same ranges at the same time
+    are served without reading blocks or building the messages again. The least recently used responses are
+    evicted when the data of the cached messages is more than max_bytes.
+
+    Each response is kept with the header hash of the last block of its range. Since every block commits to the
+    blocks before it, the response is still valid as long as that block is in the chain at its height. Responses
+    for heights that were reorged out are also dropped with invalidate_from, to free their memory.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[ResponseKey, Tuple[bytes32, Message]]" = OrderedDict()
+
+    def get(self, key: ResponseKey, end_hash: bytes32) -> Optional[Message]:
+        entry = self._cache.get(key)
+        if entry is None or entry[0] != end_hash:
+            self.misses += 1
+            return None
+        self._cache.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: ResponseKey, end_hash: bytes32, message: Message) -> None:
+        if len(message.data) > self.max_bytes:
+            return None
+        self._remove(key)
+        self._cache[key] = (end_hash, message)
+        self.size += len(message.data)
+        while self.size > self.max_bytes:
+            self._remove(next(iter(self._cache)))
+
+    def _remove(self, key: ResponseKey) -> None:
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1].data)
+
+    def invalidate_height(self, height: int) -> None:
+        """
+        Drops the responses that include the block at height, for example after its proofs were compacted.
+        """
+        for key in [key for key in self._cache if key[1] <= height <= key[2]]:
+            self._remove(key)
+
+    def invalidate_from(self, height: int) -> None:
+        """
+        Drops the responses that include blocks at height or above.
+        """
+        for key in [key for key in self._cache if key[2] >= height]:
+            self._remove(key)
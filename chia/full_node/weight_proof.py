@@ -2,7 +2,9 @@ import asyncio
 import dataclasses
 import logging
 import math
+import multiprocessing
 import random
+import time
 from concurrent.futures.process import ProcessPoolExecutor
 from typing import Dict, List, Optional, Tuple
 
@@ -19,6 +21,7 @@ from chia.consensus.pot_iterations import (
     is_overflow_block,
 )
 from chia.consensus.vdf_info_computation import get_signage_point_vdf_info
+from chia.protocols.full_node_protocol import RespondProofOfWeight
 from chia.types.blockchain_format.classgroup import ClassgroupElement
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.blockchain_format.slots import ChallengeChainSubSlot, RewardChainSubSlot
@@ -37,10 +40,36 @@ from chia.types.weight_proof import (
 from chia.util.block_cache import BlockCache
 from chia.util.hash import std_hash
 from chia.util.ints import uint8, uint32, uint64, uint128
+from chia.util.lru_cache import LRUCache
 from chia.util.streamable import dataclass_from_dict, recurse_jsonify
 
 log = logging.getLogger(__name__)
 
+# Number of tips whose weight proofs, and serialized responses, are kept
+WEIGHT_PROOF_CACHE_SIZE = 2
+
+# Number of sub epochs whose challenge segments are kept in memory
+SEGMENTS_CACHE_SIZE = 100
+
+
+@dataclasses.dataclass
+class _CachedWeightProof:
+    weight_proof: WeightProof
+    response: Optional[bytes]
+
+
+@dataclasses.dataclass
+class _SubEpochPart:
+    """
+    The parts of a weight proof that only change when a sub epoch summary is added to the chain
+    """
+
+    key: Tuple[int, Optional[bytes32]]
+    sub_epoch_data: List[SubEpochData]
+    seed: bytes32
+    genesis: BlockRecord
+    ses_blocks: List[BlockRecord]
+
 
 class WeightProofHandler:
 
@@ -52,15 +81,55 @@ class WeightProofHandler:
         self,
         constants: ConsensusConstants,
         blockchain: BlockchainInterface,
+        executor: Optional[ProcessPoolExecutor] = None,
     ):
-        self.tip: Optional[bytes32] = None
-        self.proof: Optional[WeightProof] = None
+        """
+        executor is the pool weight proofs are validated in. Without it, a pool sized to the machine is started for
+        each validation, and stopped when it ends.
+        """
         self.constants = constants
         self.blockchain = blockchain
         self.lock = asyncio.Lock()
+        self._executor = executor
+        self._weight_proofs = LRUCache(WEIGHT_PROOF_CACHE_SIZE)
+        self._sub_epoch_part: Optional[_SubEpochPart] = None
+        self._recent_chain: Optional[List[HeaderBlock]] = None
+        self._segments = LRUCache(SEGMENTS_CACHE_SIZE)
+        self.stats: Dict[str, float] = {
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "sub_epoch_part_hits": 0,
+            "sub_epoch_part_misses": 0,
+            "recent_chain_blocks_reused": 0,
+            "recent_chain_blocks_loaded": 0,
+            "builds": 0,
+            "last_build_time": 0.0,
+            "total_build_time": 0.0,
+        }
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        cpu_count = multiprocessing.cpu_count()
+        if cpu_count > 61:
+            cpu_count = 61  # Windows Server 2016 has an issue https://bugs.python.org/issue26903
+        return ProcessPoolExecutor(max_workers=max(cpu_count - 2, 1))
 
     async def get_proof_of_weight(self, tip: bytes32) -> Optional[WeightProof]:
+        cached = await self._get_cached_proof_of_weight(tip)
+        return None if cached is None else cached.weight_proof
+
+    async def get_proof_of_weight_response(self, tip: bytes32) -> Optional[bytes]:
+        """
+        Returns the serialized RespondProofOfWeight for tip. It's kept with the weight proof, so peers asking for
+        the same tip don't pay for the serialization again.
+        """
+        cached = await self._get_cached_proof_of_weight(tip)
+        if cached is None:
+            return None
+        if cached.response is None:
+            cached.response = bytes(RespondProofOfWeight(cached.weight_proof, tip))
+        return cached.response
 
+    async def _get_cached_proof_of_weight(self, tip: bytes32) -> Optional[_CachedWeightProof]:
         tip_rec = self.blockchain.try_block_record(tip)
         if tip_rec is None:
             log.error("unknown tip")
@@ -71,15 +140,23 @@ class WeightProofHandler:
             return None
 
         async with self.lock:
-            if self.proof is not None:
-                if self.proof.recent_chain_data[-1].header_hash == tip:
-                    return self.proof
+            cached: Optional[_CachedWeightProof] = self._weight_proofs.get(tip)
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                return cached
+            self.stats["cache_misses"] += 1
+            start = time.time()
             wp = await self._create_proof_of_weight(tip)
             if wp is None:
                 return None
-            self.proof = wp
-            self.tip = tip
-            return wp
+            build_time = time.time() - start
+            self.stats["builds"] += 1
+            self.stats["last_build_time"] = build_time
+            self.stats["total_build_time"] += build_time
+            log.info(f"created weight proof for {tip} in {build_time:0.2f}s")
+            cached = _CachedWeightProof(wp, None)
+            self._weight_proofs.put(tip, cached)
+            return cached
 
     def get_sub_epoch_data(self, tip_height: uint32, summary_heights: List[uint32]) -> List[SubEpochData]:
         sub_epoch_data: List[SubEpochData] = []
@@ -106,51 +183,82 @@ class WeightProofHandler:
         if recent_chain is None:
             return None
 
-        summary_heights = self.blockchain.get_ses_heights()
-        prev_ses_block = await self.blockchain.get_block_record_from_db(self.blockchain.height_to_hash(uint32(0)))
-        if prev_ses_block is None:
+        summary_heights = [height for height in self.blockchain.get_ses_heights() if height <= tip_rec.height]
+        sub_epoch_part = await self._get_sub_epoch_part(summary_heights, tip_rec.height)
+        if sub_epoch_part is None:
             return None
-        sub_epoch_data = self.get_sub_epoch_data(tip_rec.height, summary_heights)
-        # use second to last ses as seed
-        seed = self.get_seed_for_proof(summary_heights, tip_rec.height)
-        rng = random.Random(seed)
+        rng = random.Random(sub_epoch_part.seed)
         weight_to_check = _get_weights_for_sampling(rng, tip_rec.weight, recent_chain)
         sample_n = 0
-        ses_blocks = await self.blockchain.get_block_records_at(summary_heights)
-        if ses_blocks is None:
-            return None
-
-        for sub_epoch_n, ses_height in enumerate(summary_heights):
-            if ses_height > tip_rec.height:
-                break
-
+        prev_ses_block = sub_epoch_part.genesis
+        for sub_epoch_n, ses_block in enumerate(sub_epoch_part.ses_blocks):
             # if we have enough sub_epoch samples, dont sample
             if sample_n >= self.MAX_SAMPLES:
                 log.debug("reached sampled sub epoch cap")
                 break
             # sample sub epoch
-            # next sub block
-            ses_block = ses_blocks[sub_epoch_n]
-            if ses_block is None or ses_block.sub_epoch_summary_included is None:
-                log.error("error while building proof")
-                return None
-
             if _sample_sub_epoch(prev_ses_block.weight, ses_block.weight, weight_to_check):  # type: ignore
                 sample_n += 1
-                segments = await self.blockchain.get_sub_epoch_challenge_segments(ses_block.header_hash)
+                segments = await self._get_sub_epoch_segments(ses_block, prev_ses_block, uint32(sub_epoch_n))
                 if segments is None:
-                    segments = await self.__create_sub_epoch_segments(ses_block, prev_ses_block, uint32(sub_epoch_n))
-                    if segments is None:
-                        log.error(
-                            f"failed while building segments for sub epoch {sub_epoch_n}, ses height {ses_height} "
-                        )
-                        return None
-                    await self.blockchain.persist_sub_epoch_challenge_segments(ses_block.header_hash, segments)
+                    log.error(
+                        f"failed while building segments for sub epoch {sub_epoch_n}, ses height {ses_block.height} "
+                    )
+                    return None
                 log.debug(f"sub epoch {sub_epoch_n} has {len(segments)} segments")
                 sub_epoch_segments.extend(segments)
             prev_ses_block = ses_block
-        log.debug(f"sub_epochs: {len(sub_epoch_data)}")
-        return WeightProof(sub_epoch_data, sub_epoch_segments, recent_chain)
+        log.debug(f"sub_epochs: {len(sub_epoch_part.sub_epoch_data)}")
+        return WeightProof(sub_epoch_part.sub_epoch_data, sub_epoch_segments, recent_chain)
+
+    async def _get_sub_epoch_part(self, summary_heights: List[uint32], tip_height: uint32) -> Optional[_SubEpochPart]:
+        """
+        summary_heights are the heights of the sub epoch summaries up to the tip. The part is reused for all tips
+        after the same sub epoch summary.
+        """
+        key: Tuple[int, Optional[bytes32]] = (len(summary_heights), None)
+        if len(summary_heights) > 0:
+            key = (len(summary_heights), self.blockchain.height_to_hash(summary_heights[-1]))
+        if self._sub_epoch_part is not None and self._sub_epoch_part.key == key:
+            self.stats["sub_epoch_part_hits"] += 1
+            return self._sub_epoch_part
+        self.stats["sub_epoch_part_misses"] += 1
+
+        genesis = await self.blockchain.get_block_record_from_db(self.blockchain.height_to_hash(uint32(0)))
+        if genesis is None:
+            return None
+        ses_blocks = await self.blockchain.get_block_records_at(summary_heights)
+        if ses_blocks is None:
+            return None
+        for ses_block in ses_blocks:
+            if ses_block is None or ses_block.sub_epoch_summary_included is None:
+                log.error("error while building proof")
+                return None
+        sub_epoch_part = _SubEpochPart(
+            key,
+            self.get_sub_epoch_data(tip_height, summary_heights),
+            # use second to last ses as seed
+            self.get_seed_for_proof(summary_heights, tip_height),
+            genesis,
+            ses_blocks,
+        )
+        self._sub_epoch_part = sub_epoch_part
+        return sub_epoch_part
+
+    async def _get_sub_epoch_segments(
+        self, ses_block: BlockRecord, prev_ses_block: BlockRecord, sub_epoch_n: uint32
+    ) -> Optional[List[SubEpochChallengeSegment]]:
+        segments: Optional[List[SubEpochChallengeSegment]] = self._segments.get(ses_block.header_hash)
+        if segments is not None:
+            return segments
+        segments = await self.blockchain.get_sub_epoch_challenge_segments(ses_block.header_hash)
+        if segments is None:
+            segments = await self.__create_sub_epoch_segments(ses_block, prev_ses_block, sub_epoch_n)
+            if segments is None:
+                return None
+            await self.blockchain.persist_sub_epoch_challenge_segments(ses_block.header_hash, segments)
+        self._segments.put(ses_block.header_hash, segments)
+        return segments
 
     def get_seed_for_proof(self, summary_heights: List[uint32], tip_height) -> bytes32:
         count = 0
@@ -177,6 +285,10 @@ class WeightProofHandler:
                 min_height = ses_height - 1
                 break
         log.debug(f"start {min_height} end {tip_height}")
+        recent_chain = await self._extend_recent_chain(min_height, tip_height)
+        if recent_chain is not None:
+            return recent_chain
+
         headers = await self.blockchain.get_header_blocks_in_range(min_height, tip_height, tx_filter=False)
         blocks = await self.blockchain.get_block_records_in_range(min_height, tip_height)
         ses_count = 0
@@ -205,6 +317,32 @@ class WeightProofHandler:
             f"start: {recent_chain[0].reward_chain_block.height} "
             f"end:  {recent_chain[-1].reward_chain_block.height} "
         )
+        self.stats["recent_chain_blocks_loaded"] += len(recent_chain)
+        self._recent_chain = recent_chain
+        return recent_chain
+
+    async def _extend_recent_chain(self, min_height: int, tip_height: uint32) -> Optional[List[HeaderBlock]]:
+        """
+        The recent chain is the main chain from min_height to the tip. If the last one built starts at the same
+        height, the part of it still in the main chain is reused, and only the blocks above it are loaded.
+        Returns None if it can't be reused.
+        """
+        cached = self._recent_chain
+        if cached is None or cached[0].height != min_height:
+            return None
+        reuse_height = min(cached[-1].height, tip_height)
+        reused = cached[: reuse_height - min_height + 1]
+        if reused[-1].header_hash != self.blockchain.height_to_hash(uint32(reuse_height)):
+            return None
+
+        recent_chain = list(reused)
+        if tip_height > reuse_height:
+            headers = await self.blockchain.get_header_blocks_in_range(reuse_height + 1, tip_height, tx_filter=False)
+            for height in range(reuse_height + 1, tip_height + 1):
+                recent_chain.append(headers[self.blockchain.height_to_hash(uint32(height))])
+        self.stats["recent_chain_blocks_reused"] += len(reused)
+        self.stats["recent_chain_blocks_loaded"] += len(recent_chain) - len(reused)
+        self._recent_chain = recent_chain
         return recent_chain
 
     async def create_prev_sub_epoch_segments(self):
@@ -589,27 +727,40 @@ class WeightProofHandler:
             log.error("failed weight proof sub epoch sample validation")
             return False, uint32(0), []
 
-        executor = ProcessPoolExecutor(1)
-        constants, summary_bytes, wp_segment_bytes, wp_recent_chain_bytes = vars_to_bytes(
-            self.constants, summaries, weight_proof
-        )
-        segment_validation_task = asyncio.get_running_loop().run_in_executor(
-            executor, _validate_sub_epoch_segments, constants, rng, wp_segment_bytes, summary_bytes
-        )
-
-        recent_blocks_validation_task = asyncio.get_running_loop().run_in_executor(
-            executor, _validate_recent_blocks, constants, wp_recent_chain_bytes, summary_bytes
-        )
+        constants = recurse_jsonify(dataclasses.asdict(self.constants))
+        summary_bytes = [bytes(summary) for summary in summaries]
+        wp_recent_chain_bytes = bytes(RecentChainData(weight_proof.recent_chain_data))
+        # The recent chain, and each sampled sub epoch, are validated independently
+        executor = self._executor if self._executor is not None else self._new_executor()
+        try:
+            loop = asyncio.get_running_loop()
+            validation_tasks = [
+                loop.run_in_executor(executor, _validate_recent_blocks, constants, wp_recent_chain_bytes, summary_bytes)
+            ]
+            for sub_epoch_n, segments, sampled_seg_index, prev_ssi in _sub_epoch_validation_units(
+                self.constants, rng, weight_proof.sub_epoch_segments, summaries
+            ):
+                validation_tasks.append(
+                    loop.run_in_executor(
+                        executor,
+                        _validate_sub_epoch_segments_unit,
+                        constants,
+                        summary_bytes,
+                        sub_epoch_n,
+                        bytes(SubEpochSegments(segments)),
+                        sampled_seg_index,
+                        prev_ssi,
+                    )
+                )
 
-        valid_segment_task = segment_validation_task
-        valid_recent_blocks_task = recent_blocks_validation_task
-        valid_recent_blocks = await valid_recent_blocks_task
-        if not valid_recent_blocks:
+            failed_task = await _first_failure(validation_tasks)
+        finally:
+            if executor is not self._executor:
+                executor.shutdown(wait=False)
+        if failed_task == 0:
             log.error("failed validating weight proof recent blocks")
             return False, uint32(0), []
-
-        valid_segments = await valid_segment_task
-        if not valid_segments:
+        if failed_task is not None:
             log.error("failed validating weight proof sub epoch segments")
             return False, uint32(0), []
 
@@ -924,38 +1075,76 @@ def _validate_sub_epoch_segments(
 ):
     constants, summaries = bytes_to_vars(constants_dict, summaries_bytes)
     sub_epoch_segments: SubEpochSegments = SubEpochSegments.from_bytes(weight_proof_bytes)
-    rc_sub_slot_hash = constants.GENESIS_CHALLENGE
-    total_blocks, total_ip_iters = 0, 0
-    total_slot_iters, total_slots = 0, 0
-    total_ip_iters = 0
-    prev_ses: Optional[SubEpochSummary] = None
-    segments_by_sub_epoch = map_segments_by_sub_epoch(sub_epoch_segments.challenge_segments)
+    for sub_epoch_n, segments, sampled_seg_index, prev_ssi in _sub_epoch_validation_units(
+        constants, rng, sub_epoch_segments.challenge_segments, summaries
+    ):
+        if not _validate_sub_epoch(constants, summaries, sub_epoch_n, segments, sampled_seg_index, prev_ssi):
+            return False
+    return True
+
+
+def _sub_epoch_validation_units(
+    constants: ConsensusConstants,
+    rng: random.Random,
+    challenge_segments: List[SubEpochChallengeSegment],
+    summaries: List[SubEpochSummary],
+) -> List[Tuple[int, List[SubEpochChallengeSegment], int, uint64]]:
+    """
+    Splits the segments of a weight proof into independent units of work, one per sub epoch. Each unit has the
+    sub epoch number, its segments, the index of the segment sampled for full validation, and the sub slot
+    iterations of the previous sub epoch. The samples are drawn from rng in sub epoch order.
+    """
+    units: List[Tuple[int, List[SubEpochChallengeSegment], int, uint64]] = []
     curr_ssi = constants.SUB_SLOT_ITERS_STARTING
-    for sub_epoch_n, segments in segments_by_sub_epoch.items():
+    for sub_epoch_n, segments in map_segments_by_sub_epoch(challenge_segments).items():
         prev_ssi = curr_ssi
-        curr_difficulty, curr_ssi = _get_curr_diff_ssi(constants, sub_epoch_n, summaries)
-        log.debug(f"validate sub epoch {sub_epoch_n}")
-        # recreate RewardChainSubSlot for next ses rc_hash
+        _, curr_ssi = _get_curr_diff_ssi(constants, sub_epoch_n, summaries)
         sampled_seg_index = rng.choice(range(len(segments)))
-        if sub_epoch_n > 0:
-            rc_sub_slot = __get_rc_sub_slot(constants, segments[0], summaries, curr_ssi)
-            prev_ses = summaries[sub_epoch_n - 1]
-            rc_sub_slot_hash = rc_sub_slot.get_hash()
-        if not summaries[sub_epoch_n].reward_chain_hash == rc_sub_slot_hash:
-            log.error(f"failed reward_chain_hash validation sub_epoch {sub_epoch_n}")
+        units.append((sub_epoch_n, segments, sampled_seg_index, prev_ssi))
+    return units
+
+
+def _validate_sub_epoch_segments_unit(
+    constants_dict: Dict,
+    summaries_bytes: List[bytes],
+    sub_epoch_n: int,
+    segments_bytes: bytes,
+    sampled_seg_index: int,
+    prev_ssi: uint64,
+) -> bool:
+    constants, summaries = bytes_to_vars(constants_dict, summaries_bytes)
+    segments = SubEpochSegments.from_bytes(segments_bytes).challenge_segments
+    return _validate_sub_epoch(constants, summaries, sub_epoch_n, segments, sampled_seg_index, prev_ssi)
+
+
+def _validate_sub_epoch(
+    constants: ConsensusConstants,
+    summaries: List[SubEpochSummary],
+    sub_epoch_n: int,
+    segments: List[SubEpochChallengeSegment],
+    sampled_seg_index: int,
+    prev_ssi: uint64,
+) -> bool:
+    curr_difficulty, curr_ssi = _get_curr_diff_ssi(constants, sub_epoch_n, summaries)
+    log.debug(f"validate sub epoch {sub_epoch_n}")
+    # recreate RewardChainSubSlot for next ses rc_hash
+    rc_sub_slot_hash = constants.GENESIS_CHALLENGE
+    prev_ses: Optional[SubEpochSummary] = None
+    if sub_epoch_n > 0:
+        rc_sub_slot = __get_rc_sub_slot(constants, segments[0], summaries, curr_ssi)
+        prev_ses = summaries[sub_epoch_n - 1]
+        rc_sub_slot_hash = rc_sub_slot.get_hash()
+    if not summaries[sub_epoch_n].reward_chain_hash == rc_sub_slot_hash:
+        log.error(f"failed reward_chain_hash validation sub_epoch {sub_epoch_n}")
+        return False
+    for idx, segment in enumerate(segments):
+        valid_segment, ip_iters, slot_iters, slots = _validate_segment(
+            constants, segment, curr_ssi, prev_ssi, curr_difficulty, prev_ses, idx == 0, sampled_seg_index == idx
+        )
+        if not valid_segment:
+            log.error(f"failed to validate sub_epoch {segment.sub_epoch_n} segment {idx} slots")
             return False
-        for idx, segment in enumerate(segments):
-            valid_segment, ip_iters, slot_iters, slots = _validate_segment(
-                constants, segment, curr_ssi, prev_ssi, curr_difficulty, prev_ses, idx == 0, sampled_seg_index == idx
-            )
-            if not valid_segment:
-                log.error(f"failed to validate sub_epoch {segment.sub_epoch_n} segment {idx} slots")
-                return False
-            prev_ses = None
-            total_blocks += 1
-            total_slot_iters += slot_iters
-            total_slots += slots
-            total_ip_iters += ip_iters
+        prev_ses = None
     return True
 
 
@@ -1453,6 +1642,24 @@ def vars_to_bytes(constants, summaries, weight_proof):
     return constants_dict, summary_bytes, wp_segment_bytes, wp_recent_chain_bytes
 
 
+async def _first_failure(validation_tasks: List["asyncio.Future[bool]"]) -> Optional[int]:
+    """
+    Waits for all the tasks to succeed. Returns the index of the first one to fail, after cancelling the ones that
+    haven't started yet, or None if all succeeded.
+    """
+    pending = set(validation_tasks)
+    while len(pending) > 0:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None or not task.result():
+                for pending_task in pending:
+                    pending_task.cancel()
+                # Raises the task's exception, if any
+                task.result()
+                return validation_tasks.index(task)
+    return None
+
+
 def bytes_to_vars(constants_dict, summaries_bytes):
     summaries = []
     for summary in summaries_bytes:
@@ -39,6 +39,8 @@ class FullNodeRpcApi:
             "/get_initial_freeze_period": self.get_initial_freeze_period,
             "/get_network_info": self.get_network_info,
             "/get_recent_signage_point_or_eos": self.get_recent_signage_point_or_eos,
+            "/get_block_compression_report": self.get_block_compression_report,
+            "/get_weight_proof_stats": self.get_weight_proof_stats,
             # Coins
             "/get_coin_records_by_puzzle_hash": self.get_coin_records_by_puzzle_hash,
             "/get_coin_records_by_puzzle_hashes": self.get_coin_records_by_puzzle_hashes,
@@ -167,6 +169,21 @@ class FullNodeRpcApi:
         address_prefix = self.service.config["network_overrides"]["config"][network_name]["address_prefix"]
         return {"network_name": network_name, "network_prefix": address_prefix}
 
+    async def get_block_compression_report(self, request: Dict):
+        """
+        Returns the size of the stored blocks for each storage format, and the measured savings and read cost.
+        """
+        sample_size = int(request.get("sample_size", 100))
+        return {"report": await self.service.block_store.get_compression_report(sample_size)}
+
+    async def get_weight_proof_stats(self, request: Dict):
+        """
+        Returns the cache hits and misses of the weight proofs served to peers, and the time spent building them.
+        """
+        if self.service.weight_proof_handler is None:
+            raise ValueError("Weight proof handler not initialized")
+        return {"stats": dict(self.service.weight_proof_handler.stats)}
+
     async def get_recent_signage_point_or_eos(self, request: Dict):
         if "sp_hash" not in request:
             challenge_hash: bytes32 = hexstr_to_bytes(request["challenge_hash"])
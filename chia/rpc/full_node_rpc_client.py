@@ -60,6 +60,14 @@ class FullNodeRpcClient(RpcClient):
         response = await self.fetch("get_blocks", {"start": start, "end": end, "exclude_header_hash": True})
         return [FullBlock.from_json_dict(r) for r in response["blocks"]]
 
+    async def get_block_compression_report(self, sample_size: int = 100) -> Dict:
+        response = await self.fetch("get_block_compression_report", {"sample_size": sample_size})
+        return response["report"]
+
+    async def get_weight_proof_stats(self) -> Dict:
+        response = await self.fetch("get_weight_proof_stats", {})
+        return response["stats"]
+
     async def get_network_space(
         self, newer_block_header_hash: bytes32, older_block_header_hash: bytes32
     ) -> Optional[uint64]:
@@ -57,6 +57,9 @@ class RpcClient:
     async def close_connection(self, node_id: bytes32) -> Dict:
         return await self.fetch("close_connection", {"node_id": node_id.hex()})
 
+    async def get_api_task_stats(self) -> Dict:
+        return await self.fetch("get_api_task_stats", {})
+
     async def stop_node(self) -> Dict:
         return await self.fetch("stop_node", {})
 
@@ -172,6 +172,15 @@ class RpcServer:
             await connection.close()
         return {}
 
+    async def get_api_task_stats(self, request: Dict) -> Dict:
+        """
+        Returns the number of incoming messages waiting for and running their handlers, and the time spent waiting
+        and in handlers, for each message type.
+        """
+        if self.rpc_api.service.server is None:
+            raise ValueError("Global connections is not set")
+        return self.rpc_api.service.server.api_scheduler.get_stats()
+
     async def stop_node(self, request):
         """
         Shuts down the node.
@@ -316,6 +325,10 @@ async def start_rpc_server(
             "/close_connection",
             rpc_server._wrap_http_handler(rpc_server.close_connection),
         ),
+        aiohttp.web.post(
+            "/get_api_task_stats",
+            rpc_server._wrap_http_handler(rpc_server.get_api_task_stats),
+        ),
         aiohttp.web.post("/stop_node", rpc_server._wrap_http_handler(rpc_server.stop_node)),
     ]
 
@@ -0,0 +1,198 @@
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.server.outbound_message import Message
+from chia.server.outgoing_queue import Priority, message_priority
+from chia.server.ws_connection import WSChiaConnection
+from chia.types.blockchain_format.sized_bytes import bytes32
+
+# Handlers running at the same time, for all peers and for each peer
+MAX_CONCURRENT_TASKS = 200
+MAX_CONCURRENT_TASKS_PER_PEER = 20
+# Messages waiting for a handler, for each peer. The inbound rate limits normally keep peers far below this
+MAX_QUEUED_PER_PEER = 1000
+# Share of the handlers that each class of messages gets, when messages of all classes are waiting
+CLASS_WEIGHTS = {Priority.HIGH: 8, Priority.NORMAL: 4, Priority.LOW: 1}
+
+
+@dataclass
+class ApiCall:
+    message: Message
+    connection: WSChiaConnection
+    # Handlers with the execute_task decorator run even if their peer disconnects, and are never dropped
+    execute_task: bool
+    priority: Priority
+    queued_time: float
+    # Virtual finish time, calls are started in the order of their tags
+    tag: float = 0.0
+    start_time: float = 0.0
+
+
+@dataclass
+class MessageTypeStats:
+    queued: int = 0
+    running: int = 0
+    handled: int = 0
+    dropped: int = 0
+    total_wait: float = 0.0
+    total_time: float = 0.0
+    max_time: float = 0.0
+
+    def to_json_dict(self) -> Dict[str, Any]:
+        handled = max(self.handled, 1)
+        return {
+            "queued": self.queued,
+            "running": self.running,
+            "handled": self.handled,
+            "dropped": self.dropped,
+            "avg_wait_ms": 1000 * self.total_wait / handled,
+            "avg_handler_ms": 1000 * self.total_time / handled,
+            "max_handler_ms": 1000 * self.max_time,
+        }
+
+
+def message_type_name(message_type: int) -> str:
+    try:
+        return ProtocolMessageTypes(message_type).name
+    except ValueError:
+        return "unknown"
+
+
+class ApiScheduler:
+    """
+    Decides when the handlers of incoming messages start. At most max_tasks handlers run at the same time, and at
+    most max_tasks_per_peer for each peer, so a peer sending many messages can't crowd out the others.
+
+    Waiting messages are started by weighted fair queuing, with a queue for each peer and class of messages. Each
+    message gets a virtual finish time, later by 1 / weight than the previous message of its queue, and the
+    message with the earliest time is started first. Busy queues share the handlers in proportion to the weights
+    of their classes, so peers are served in turn, and signage points and peaks get ahead of transactions.
+    """
+
+    def __init__(
+        self,
+        start_call: Callable[[ApiCall], None],
+        max_tasks: int = MAX_CONCURRENT_TASKS,
+        max_tasks_per_peer: int = MAX_CONCURRENT_TASKS_PER_PEER,
+        max_queued_per_peer: int = MAX_QUEUED_PER_PEER,
+    ):
+        self.start_call = start_call
+        self.max_tasks = max_tasks
+        self.max_tasks_per_peer = max_tasks_per_peer
+        self.max_queued_per_peer = max_queued_per_peer
+        self.running = 0
+        self.running_per_peer: Dict[bytes32, int] = {}
+        self.queued_per_peer: Dict[bytes32, int] = {}
+        self.queues: Dict[Tuple[bytes32, Priority], Deque[ApiCall]] = {}
+        self.virtual_time = 0.0
+        self.stats: Dict[str, MessageTypeStats] = {}
+
+    def _stats(self, message_type: int) -> MessageTypeStats:
+        name = message_type_name(message_type)
+        if name not in self.stats:
+            self.stats[name] = MessageTypeStats()
+        return self.stats[name]
+
+    def add(self, message: Message, connection: WSChiaConnection, execute_task: bool) -> bool:
+        """
+        Queues the message for its handler, and starts handlers if there is room. Returns False if the message was
+        dropped, because its peer already has too many messages waiting.
+        """
+        peer_id = connection.peer_node_id
+        stats = self._stats(message.type)
+        if not execute_task and self.queued_per_peer.get(peer_id, 0) >= self.max_queued_per_peer:
+            stats.dropped += 1
+            return False
+        priority = Priority.HIGH if execute_task else message_priority(message.type)
+        call = ApiCall(message, connection, execute_task, priority, time.monotonic())
+        queue = self.queues.setdefault((peer_id, priority), deque())
+        last_tag = queue[-1].tag if len(queue) > 0 else self.virtual_time
+        call.tag = max(last_tag, self.virtual_time) + 1 / CLASS_WEIGHTS[priority]
+        queue.append(call)
+        self.queued_per_peer[peer_id] = self.queued_per_peer.get(peer_id, 0) + 1
+        stats.queued += 1
+        self._dispatch()
+        return True
+
+    def _next_call(self) -> Optional[ApiCall]:
+        best_key: Optional[Tuple[bytes32, Priority]] = None
+        best_tag = 0.0
+        for key, queue in self.queues.items():
+            if self.running_per_peer.get(key[0], 0) >= self.max_tasks_per_peer:
+                continue
+            if best_key is None or queue[0].tag < best_tag:
+                best_key = key
+                best_tag = queue[0].tag
+        if best_key is None:
+            return None
+        queue = self.queues[best_key]
+        call = queue.popleft()
+        if len(queue) == 0:
+            self.queues.pop(best_key)
+        return call
+
+    def _dispatch(self) -> None:
+        while self.running < self.max_tasks:
+            call = self._next_call()
+            if call is None:
+                return None
+            peer_id = call.connection.peer_node_id
+            self.virtual_time = call.tag
+            self.queued_per_peer[peer_id] -= 1
+            if self.queued_per_peer[peer_id] == 0:
+                self.queued_per_peer.pop(peer_id)
+            self.running += 1
+            self.running_per_peer[peer_id] = self.running_per_peer.get(peer_id, 0) + 1
+            stats = self._stats(call.message.type)
+            stats.queued -= 1
+            stats.running += 1
+            call.start_time = time.monotonic()
+            self.start_call(call)
+
+    def task_done(self, call: ApiCall) -> None:
+        """
+        Called when the handler of a call that was started finishes, to start the next ones.
+        """
+        peer_id = call.connection.peer_node_id
+        self.running -= 1
+        self.running_per_peer[peer_id] -= 1
+        if self.running_per_peer[peer_id] == 0:
+            self.running_per_peer.pop(peer_id)
+        end_time = time.monotonic()
+        stats = self._stats(call.message.type)
+        stats.running -= 1
+        stats.handled += 1
+        stats.total_wait += call.start_time - call.queued_time
+        stats.total_time += end_time - call.start_time
+        stats.max_time = max(stats.max_time, end_time - call.start_time)
+        self._dispatch()
+
+    def remove_peer(self, peer_id: bytes32) -> None:
+        """
+        Drops the waiting messages of a peer that disconnected, except for those with execute_task handlers.
+        """
+        for priority in Priority:
+            queue = self.queues.get((peer_id, priority))
+            if queue is None:
+                continue
+            kept: Deque[ApiCall] = deque(call for call in queue if call.execute_task)
+            for call in queue:
+                if not call.execute_task:
+                    self._stats(call.message.type).queued -= 1
+                    self.queued_per_peer[peer_id] -= 1
+            if len(kept) > 0:
+                self.queues[(peer_id, priority)] = kept
+            else:
+                self.queues.pop((peer_id, priority))
+        if self.queued_per_peer.get(peer_id) == 0:
+            self.queued_per_peer.pop(peer_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "queued": sum(self.queued_per_peer.values()),
+            "message_types": {name: stats.to_json_dict() for name, stats in sorted(self.stats.items())},
+        }
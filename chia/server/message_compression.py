@@ -0,0 +1,67 @@
+import zlib
+
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.server.rate_limits import rate_limits_other
+
+"""
+Compression of large protocol messages, used on connections where both peers advertise
+Capability.MESSAGE_COMPRESSION in their handshake. On such connections, the data of the message types below starts
+with a format byte: FORMAT_RAW for data sent as is, and FORMAT_ZLIB for zlib compressed data.
+"""
+
+FORMAT_RAW = 0
+FORMAT_ZLIB = 1
+
+# Bulk responses, sent to syncing peers and wallets
+COMPRESSED_MESSAGE_TYPES = {
+    ProtocolMessageTypes.respond_blocks,
+    ProtocolMessageTypes.respond_proof_of_weight,
+    ProtocolMessageTypes.respond_header_blocks,
+}
+
+ZLIB_LEVEL = 6
+# Smaller messages are sent uncompressed, since they don't gain enough to pay for the work
+COMPRESSION_THRESHOLD = 16 * 1024
+# Larger payloads are compressed and decompressed in a thread, zlib releases the GIL while it works
+OFFLOAD_THRESHOLD = 1024 * 1024
+
+
+def is_compressed_type(message_type: int) -> bool:
+    try:
+        return ProtocolMessageTypes(message_type) in COMPRESSED_MESSAGE_TYPES
+    except ValueError:
+        return False
+
+
+def compress_data(data: bytes) -> bytes:
+    if len(data) < COMPRESSION_THRESHOLD:
+        return bytes([FORMAT_RAW]) + data
+    compressed = zlib.compress(data, ZLIB_LEVEL)
+    if len(compressed) >= len(data):
+        return bytes([FORMAT_RAW]) + data
+    return bytes([FORMAT_ZLIB]) + compressed
+
+
+def decompress_data(message_type: int, data: bytes) -> bytes:
+    """
+    Returns the data of a message of one of the compressed types, as it was before compressing. Raises ValueError
+    if it is malformed, or larger than the rate limits allow for its type, so small messages can't expand into
+    huge ones.
+    """
+    if len(data) == 0:
+        raise ValueError("Missing compression format")
+    if data[0] == FORMAT_RAW:
+        return data[1:]
+    if data[0] != FORMAT_ZLIB:
+        raise ValueError(f"Unknown compression format {data[0]}")
+    max_size = rate_limits_other[ProtocolMessageTypes(message_type)].max_size
+    decompressor = zlib.decompressobj()
+    try:
+        decompressed = decompressor.decompress(data[1:], max_size + 1)
+    except zlib.error as e:
+        raise ValueError(f"Invalid compressed data: {e}")
+    if len(decompressed) > max_size:
+        raise ValueError(f"Decompressed data larger than {max_size} bytes")
+    if not decompressor.eof or len(decompressor.unused_data) > 0:
+        raise ValueError("Invalid compressed data")
+    return decompressed
@@ -4,7 +4,7 @@ from typing import Any, Optional
 
 from chia.protocols.protocol_message_types import ProtocolMessageTypes
 from chia.util.ints import uint8, uint16
-from chia.util.streamable import Streamable, streamable
+from chia.util.streamable import Streamable, memoize_bytes_and_hash, streamable
 
 
 class NodeType(IntEnum):
@@ -31,6 +31,8 @@ class Delivery(IntEnum):
     SPECIFIC = 6
 
 
+# Memoized so a message broadcast to many peers is serialized once
+@memoize_bytes_and_hash
 @dataclass(frozen=True)
 @streamable
 class Message(Streamable):
@@ -0,0 +1,155 @@
+import asyncio
+import time
+from collections import deque
+from enum import IntEnum
+from typing import Deque, Dict, List, Tuple
+
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.server.outbound_message import Message
+
+
+class Priority(IntEnum):
+    # Lower values are sent first
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+# Messages that affect consensus or farming, and are worthless if they arrive late
+HIGH_PRIORITY = {
+    ProtocolMessageTypes.handshake,
+    ProtocolMessageTypes.harvester_handshake,
+    ProtocolMessageTypes.new_signage_point_harvester,
+    ProtocolMessageTypes.new_proof_of_space,
+    ProtocolMessageTypes.request_signatures,
+    ProtocolMessageTypes.respond_signatures,
+    ProtocolMessageTypes.new_signage_point,
+    ProtocolMessageTypes.declare_proof_of_space,
+    ProtocolMessageTypes.request_signed_values,
+    ProtocolMessageTypes.signed_values,
+    ProtocolMessageTypes.new_peak_timelord,
+    ProtocolMessageTypes.new_unfinished_block_timelord,
+    ProtocolMessageTypes.new_infusion_point_vdf,
+    ProtocolMessageTypes.new_signage_point_vdf,
+    ProtocolMessageTypes.new_end_of_sub_slot_vdf,
+    ProtocolMessageTypes.new_peak,
+    ProtocolMessageTypes.request_block,
+    ProtocolMessageTypes.respond_block,
+    ProtocolMessageTypes.new_unfinished_block,
+    ProtocolMessageTypes.request_unfinished_block,
+    ProtocolMessageTypes.respond_unfinished_block,
+    ProtocolMessageTypes.new_signage_point_or_end_of_sub_slot,
+    ProtocolMessageTypes.request_signage_point_or_end_of_sub_slot,
+    ProtocolMessageTypes.respond_signage_point,
+    ProtocolMessageTypes.respond_end_of_sub_slot,
+    ProtocolMessageTypes.new_peak_wallet,
+}
+
+# Messages that can be dropped when a peer doesn't keep up, since they are gossip, or are sent again later
+LOW_PRIORITY = {
+    ProtocolMessageTypes.new_transaction,
+    ProtocolMessageTypes.request_transaction,
+    ProtocolMessageTypes.respond_transaction,
+    ProtocolMessageTypes.request_mempool_transactions,
+    ProtocolMessageTypes.request_compact_vdf,
+    ProtocolMessageTypes.respond_compact_vdf,
+    ProtocolMessageTypes.new_compact_vdf,
+    ProtocolMessageTypes.request_peers,
+    ProtocolMessageTypes.respond_peers,
+    ProtocolMessageTypes.request_peers_introducer,
+    ProtocolMessageTypes.respond_peers_introducer,
+}
+
+# Bytes of message data queued for a peer. A single larger message is accepted if nothing else is queued
+MAX_QUEUED_BYTES = 64 * 1024 * 1024
+
+
+def message_priority(message_type: int) -> Priority:
+    try:
+        protocol_message_type = ProtocolMessageTypes(message_type)
+    except ValueError:
+        return Priority.NORMAL
+    if protocol_message_type in HIGH_PRIORITY:
+        return Priority.HIGH
+    if protocol_message_type in LOW_PRIORITY:
+        return Priority.LOW
+    return Priority.NORMAL
+
+
+class OutgoingQueue:
+    """
+    The messages waiting to be sent to a peer. Messages are sent by priority, and in order within each priority.
+    The memory used by a peer that doesn't keep up is bounded: when max_bytes are queued, low priority messages
+    are dropped, and queued low priority messages are dropped to make room for the others. If a message still
+    doesn't fit, put returns False, and the connection is closed.
+
+    Messages that were rate limited are put back with put_delayed, and become ready again after a delay. A single
+    timer in get waits for the earliest one.
+    """
+
+    def __init__(self, max_bytes: int = MAX_QUEUED_BYTES):
+        self.max_bytes = max_bytes
+        self.queued_bytes = 0
+        self.dropped = 0
+        self._queues: Dict[Priority, Deque[Message]] = {priority: deque() for priority in Priority}
+        # (time at which the message is ready, message), in the order of these times
+        self._delayed: Deque[Tuple[float, Message]] = deque()
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values()) + len(self._delayed)
+
+    def put(self, message: Message) -> bool:
+        """
+        Queues the message, returns False if it was dropped because too much is queued already.
+        """
+        priority = message_priority(message.type)
+        size = len(message.data)
+        if self.queued_bytes + size > self.max_bytes and len(self) > 0:
+            if priority is Priority.LOW:
+                self.dropped += 1
+                return False
+            low_queue = self._queues[Priority.LOW]
+            while self.queued_bytes + size > self.max_bytes and len(low_queue) > 0:
+                self.queued_bytes -= len(low_queue.popleft().data)
+                self.dropped += 1
+            if self.queued_bytes + size > self.max_bytes and len(self) > 0:
+                self.dropped += 1
+                return False
+        self._queues[priority].append(message)
+        self.queued_bytes += size
+        self._ready.set()
+        return True
+
+    def put_delayed(self, message: Message, delay: float) -> None:
+        """
+        Queues a message that was already accepted by put, to be sent after delay seconds.
+        """
+        self._delayed.append((time.monotonic() + delay, message))
+        self.queued_bytes += len(message.data)
+        self._ready.set()
+
+    def _release_delayed(self) -> None:
+        now = time.monotonic()
+        released: List[Message] = []
+        while len(self._delayed) > 0 and self._delayed[0][0] <= now:
+            released.append(self._delayed.popleft()[1])
+        # They go back to the front of their queues, ahead of the messages queued after them
+        for message in reversed(released):
+            self._queues[message_priority(message.type)].appendleft(message)
+
+    async def get(self) -> Message:
+        while True:
+            self._release_delayed()
+            for priority in Priority:
+                queue = self._queues[priority]
+                if len(queue) > 0:
+                    message = queue.popleft()
+                    self.queued_bytes -= len(message.data)
+                    return message
+            self._ready.clear()
+            timeout = None if len(self._delayed) == 0 else max(0.0, self._delayed[0][0] - time.monotonic())
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -130,9 +130,12 @@ class RateLimiter:
         self.non_tx_message_counts = 0
         self.non_tx_cumulative_size = 0
 
-    def process_msg_and_check(self, message: Message) -> bool:
+    def process_msg_and_check(self, message: Message, wire_size: Optional[int] = None) -> bool:
         """
         Returns True if message can be processed successfully, false if a rate limit is passed.
+        The limits of each message type apply to the size of the message data, while the aggregate limit of non
+        transaction messages applies to wire_size, the size of the data as sent, which is smaller for compressed
+        messages.
         """
 
         current_minute = int(time.time() // self.reset_seconds)
@@ -149,6 +152,8 @@ class RateLimiter:
             return True
 
         new_message_counts: int = self.message_counts[message_type] + 1
+        if wire_size is None:
+            wire_size = len(message.data)
         new_cumulative_size: int = self.message_cumulative_sizes[message_type] + len(message.data)
         new_non_tx_count: int = self.non_tx_message_counts
         new_non_tx_size: int = self.non_tx_cumulative_size
@@ -163,7 +168,7 @@ class RateLimiter:
             elif message_type in rate_limits_other:
                 limits = rate_limits_other[message_type]
                 new_non_tx_count = self.non_tx_message_counts + 1
-                new_non_tx_size = self.non_tx_cumulative_size + len(message.data)
+                new_non_tx_size = self.non_tx_cumulative_size + wire_size
                 if new_non_tx_count > NON_TX_FREQ * proportion_of_limit:
                     return False
                 if new_non_tx_size > NON_TX_MAX_TOTAL_SIZE * proportion_of_limit:
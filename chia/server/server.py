@@ -3,10 +3,11 @@ import logging
 import ssl
 import time
 import traceback
+from dataclasses import dataclass
 from ipaddress import IPv6Address, ip_address, ip_network, IPv4Network, IPv6Network
 from pathlib import Path
 from secrets import token_bytes
-from typing import Any, Callable, Dict, List, Optional, Union, Set, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union, Set, Tuple
 
 from aiohttp import ClientSession, ClientTimeout, ServerDisconnectedError, WSCloseCode, client_exceptions, web
 from aiohttp.web_app import Application
@@ -17,6 +18,7 @@ from cryptography.hazmat.primitives import hashes, serialization
 
 from chia.protocols.protocol_message_types import ProtocolMessageTypes
 from chia.protocols.shared_protocol import protocol_version
+from chia.server.api_scheduler import ApiCall, ApiScheduler
 from chia.server.introducer_peers import IntroducerPeers
 from chia.server.outbound_message import Message, NodeType
 from chia.server.ssl_context import private_ssl_paths, public_ssl_paths
@@ -28,6 +30,32 @@ from chia.util.ints import uint16
 from chia.util.network import is_localhost, is_in_network
 
 
+@dataclass
+class BroadcastStats:
+    # Connections the messages were queued on
+    delivered: int = 0
+    # Matching connections that were closed, or whose outgoing queue was full
+    skipped: int = 0
+    # Serialized size of the messages, sent to each delivered connection
+    message_bytes: int = 0
+
+
+def broadcast(messages: List[Message], connections: Iterable[WSChiaConnection]) -> BroadcastStats:
+    """
+    Queues the messages on each of the connections, without waiting for any of them. Each message is serialized
+    once here, and all the connections send the same bytes.
+    """
+    stats = BroadcastStats()
+    for message in messages:
+        stats.message_bytes += len(bytes(message))
+    for connection in connections:
+        if connection.send_messages_nowait(messages):
+            stats.delivered += 1
+        else:
+            stats.skipped += 1
+    return stats
+
+
 def ssl_context_for_server(
     ca_cert: Path, ca_key: Path, private_cert_path: Path, private_key_path: Path
 ) -> Optional[ssl.SSLContext]:
@@ -139,6 +167,7 @@ class ChiaServer:
         self.execute_tasks: Set[bytes32] = set()
 
         self.tasks_from_peer: Dict[bytes32, Set[bytes32]] = {}
+        self.api_scheduler = ApiScheduler(self._start_api_call)
         self.banned_peers: Dict[str, float] = {}
         self.invalid_protocol_ban_seconds = 10
         self.api_exception_ban_seconds = 10
@@ -464,6 +493,7 @@ class ChiaServer:
         self.cancel_tasks_from_peer(connection.peer_node_id)
 
     def cancel_tasks_from_peer(self, peer_id: bytes32):
+        self.api_scheduler.remove_peer(peer_id)
         if peer_id not in self.tasks_from_peer:
             return None
 
@@ -480,114 +510,138 @@ class ChiaServer:
             payload_inc, connection_inc = await self.incoming_messages.get()
             if payload_inc is None or connection_inc is None:
                 continue
+            if not self.api_scheduler.add(payload_inc, connection_inc, self._is_execute_task(payload_inc)):
+                connection_inc.log.warning(
+                    f"Dropping {ProtocolMessageTypes(payload_inc.type).name} from {connection_inc.peer_host}, "
+                    f"too many messages waiting for their handlers"
+                )
+
+    def _is_execute_task(self, message: Message) -> bool:
+        try:
+            message_type: str = ProtocolMessageTypes(message.type).name
+        except ValueError:
+            return False
+        return hasattr(getattr(self.api, message_type, None), "execute_task")
+
+    def _start_api_call(self, call: ApiCall) -> None:
+        task_id = token_bytes()
+        api_task = asyncio.create_task(self._api_call(call, task_id))
+        # Also runs for tasks cancelled before they start
+        api_task.add_done_callback(lambda _: self.api_scheduler.task_done(call))
+        self.api_tasks[task_id] = api_task
+        peer_id = call.connection.peer_node_id
+        if peer_id not in self.tasks_from_peer:
+            self.tasks_from_peer[peer_id] = set()
+        self.tasks_from_peer[peer_id].add(task_id)
+
+    async def _api_call(self, call: ApiCall, task_id: bytes32) -> None:
+        full_message: Message = call.message
+        connection: WSChiaConnection = call.connection
+        start_time = time.time()
+        try:
+            if self.received_message_callback is not None:
+                await self.received_message_callback(connection)
+            connection.log.debug(
+                f"<- {ProtocolMessageTypes(full_message.type).name} from peer "
+                f"{connection.peer_node_id} {connection.peer_host}"
+            )
+            message_type: str = ProtocolMessageTypes(full_message.type).name
+
+            f = getattr(self.api, message_type, None)
+
+            if f is None:
+                self.log.error(f"Non existing function: {message_type}")
+                raise ProtocolError(Err.INVALID_PROTOCOL_MESSAGE, [message_type])
+
+            if not hasattr(f, "api_function"):
+                self.log.error(f"Peer trying to call non api function {message_type}")
+                raise ProtocolError(Err.INVALID_PROTOCOL_MESSAGE, [message_type])
+
+            # If api is not ready ignore the request
+            if hasattr(self.api, "api_ready"):
+                if self.api.api_ready is False:
+                    return None
+
+            timeout: Optional[int] = 600
+            if hasattr(f, "execute_task"):
+                # Don't timeout on methods with execute_task decorator, these need to run fully
+                self.execute_tasks.add(task_id)
+                timeout = None
 
-            async def api_call(full_message: Message, connection: WSChiaConnection, task_id):
-                start_time = time.time()
+            if hasattr(f, "peer_required"):
+                coroutine = f(full_message.data, connection)
+            else:
+                coroutine = f(full_message.data)
+
+            async def wrapped_coroutine() -> Optional[Message]:
                 try:
-                    if self.received_message_callback is not None:
-                        await self.received_message_callback(connection)
-                    connection.log.debug(
-                        f"<- {ProtocolMessageTypes(full_message.type).name} from peer "
-                        f"{connection.peer_node_id} {connection.peer_host}"
-                    )
-                    message_type: str = ProtocolMessageTypes(full_message.type).name
-
-                    f = getattr(self.api, message_type, None)
-
-                    if f is None:
-                        self.log.error(f"Non existing function: {message_type}")
-                        raise ProtocolError(Err.INVALID_PROTOCOL_MESSAGE, [message_type])
-
-                    if not hasattr(f, "api_function"):
-                        self.log.error(f"Peer trying to call non api function {message_type}")
-                        raise ProtocolError(Err.INVALID_PROTOCOL_MESSAGE, [message_type])
-
-                    # If api is not ready ignore the request
-                    if hasattr(self.api, "api_ready"):
-                        if self.api.api_ready is False:
-                            return None
-
-                    timeout: Optional[int] = 600
-                    if hasattr(f, "execute_task"):
-                        # Don't timeout on methods with execute_task decorator, these need to run fully
-                        self.execute_tasks.add(task_id)
-                        timeout = None
-
-                    if hasattr(f, "peer_required"):
-                        coroutine = f(full_message.data, connection)
-                    else:
-                        coroutine = f(full_message.data)
-
-                    async def wrapped_coroutine() -> Optional[Message]:
-                        try:
-                            result = await coroutine
-                            return result
-                        except asyncio.CancelledError:
-                            pass
-                        except Exception as e:
-                            tb = traceback.format_exc()
-                            connection.log.error(f"Exception: {e}, {connection.get_peer_info()}. {tb}")
-                            raise e
-                        return None
-
-                    response: Optional[Message] = await asyncio.wait_for(wrapped_coroutine(), timeout=timeout)
-                    connection.log.debug(
-                        f"Time taken to process {message_type} from {connection.peer_node_id} is "
-                        f"{time.time() - start_time} seconds"
-                    )
-
-                    if response is not None:
-                        response_message = Message(response.type, full_message.id, response.data)
-                        await connection.reply_to_request(response_message)
+                    result = await coroutine
+                    return result
+                except asyncio.CancelledError:
+                    pass
                 except Exception as e:
-                    if self.connection_close_task is None:
-                        tb = traceback.format_exc()
-                        connection.log.error(
-                            f"Exception: {e} {type(e)}, closing connection {connection.get_peer_info()}. {tb}"
-                        )
-                    else:
-                        connection.log.debug(f"Exception: {e} while closing connection")
-                    # TODO: actually throw one of the errors from errors.py and pass this to close
-                    await connection.close(self.api_exception_ban_seconds, WSCloseCode.PROTOCOL_ERROR, Err.UNKNOWN)
-                finally:
-                    if task_id in self.api_tasks:
-                        self.api_tasks.pop(task_id)
-                    if task_id in self.tasks_from_peer[connection.peer_node_id]:
-                        self.tasks_from_peer[connection.peer_node_id].remove(task_id)
-                    if task_id in self.execute_tasks:
-                        self.execute_tasks.remove(task_id)
-
-            task_id = token_bytes()
-            api_task = asyncio.create_task(api_call(payload_inc, connection_inc, task_id))
-            self.api_tasks[task_id] = api_task
-            if connection_inc.peer_node_id not in self.tasks_from_peer:
-                self.tasks_from_peer[connection_inc.peer_node_id] = set()
-            self.tasks_from_peer[connection_inc.peer_node_id].add(task_id)
+                    tb = traceback.format_exc()
+                    connection.log.error(f"Exception: {e}, {connection.get_peer_info()}. {tb}")
+                    raise e
+                return None
+
+            response: Optional[Message] = await asyncio.wait_for(wrapped_coroutine(), timeout=timeout)
+            connection.log.debug(
+                f"Time taken to process {message_type} from {connection.peer_node_id} is "
+                f"{time.time() - start_time} seconds"
+            )
+
+            if response is not None:
+                response_message = Message(response.type, full_message.id, response.data)
+                await connection.reply_to_request(response_message)
+        except Exception as e:
+            if self.connection_close_task is None:
+                tb = traceback.format_exc()
+                connection.log.error(f"Exception: {e} {type(e)}, closing connection {connection.get_peer_info()}. {tb}")
+            else:
+                connection.log.debug(f"Exception: {e} while closing connection")
+            # TODO: actually throw one of the errors from errors.py and pass this to close
+            await connection.close(self.api_exception_ban_seconds, WSCloseCode.PROTOCOL_ERROR, Err.UNKNOWN)
+        finally:
+            if task_id in self.api_tasks:
+                self.api_tasks.pop(task_id)
+            if task_id in self.tasks_from_peer[connection.peer_node_id]:
+                self.tasks_from_peer[connection.peer_node_id].remove(task_id)
+            if task_id in self.execute_tasks:
+                self.execute_tasks.remove(task_id)
 
     async def send_to_others(
         self,
         messages: List[Message],
         node_type: NodeType,
         origin_peer: WSChiaConnection,
-    ):
-        for node_id, connection in self.all_connections.items():
-            if node_id == origin_peer.peer_node_id:
-                continue
-            if connection.connection_type is node_type:
-                for message in messages:
-                    await connection.send_message(message)
+    ) -> BroadcastStats:
+        return broadcast(
+            messages,
+            [
+                connection
+                for node_id, connection in self.all_connections.items()
+                if node_id != origin_peer.peer_node_id and connection.connection_type is node_type
+            ],
+        )
 
-    async def send_to_all(self, messages: List[Message], node_type: NodeType):
-        for _, connection in self.all_connections.items():
-            if connection.connection_type is node_type:
-                for message in messages:
-                    await connection.send_message(message)
+    async def send_to_all(self, messages: List[Message], node_type: NodeType) -> BroadcastStats:
+        return broadcast(
+            messages,
+            [connection for connection in self.all_connections.values() if connection.connection_type is node_type],
+        )
 
-    async def send_to_all_except(self, messages: List[Message], node_type: NodeType, exclude: bytes32):
-        for _, connection in self.all_connections.items():
-            if connection.connection_type is node_type and connection.peer_node_id != exclude:
-                for message in messages:
-                    await connection.send_message(message)
+    async def send_to_all_except(
+        self, messages: List[Message], node_type: NodeType, exclude: bytes32
+    ) -> BroadcastStats:
+        return broadcast(
+            messages,
+            [
+                connection
+                for connection in self.all_connections.values()
+                if connection.connection_type is node_type and connection.peer_node_id != exclude
+            ],
+        )
 
     async def send_to_specific(self, messages: List[Message], node_id: bytes32):
         if node_id in self.all_connections:
@@ -2,14 +2,16 @@ import asyncio
 import logging
 import time
 import traceback
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from aiohttp import WSCloseCode, WSMessage, WSMsgType
 
 from chia.cmds.init_funcs import chia_full_version_str
 from chia.protocols.protocol_message_types import ProtocolMessageTypes
 from chia.protocols.shared_protocol import Capability, Handshake
+from chia.server.message_compression import OFFLOAD_THRESHOLD, compress_data, decompress_data, is_compressed_type
 from chia.server.outbound_message import Message, NodeType, make_msg
+from chia.server.outgoing_queue import OutgoingQueue, Priority, message_priority
 from chia.server.rate_limits import RateLimiter
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.peer_info import PeerInfo
@@ -22,6 +24,19 @@ from chia.util.network import class_for_type, is_localhost
 # Max size 2^(8*4) which is around 4GiB
 LENGTH_BYTES: int = 4
 
+# Seconds before a message that we rate limited is sent again
+RATE_LIMIT_RETRY_DELAY = 1
+
+# Capabilities advertised in our handshake
+CAPABILITIES: List[Tuple[uint16, str]] = [
+    (uint16(Capability.BASE.value), "1"),
+    (uint16(Capability.MESSAGE_COMPRESSION.value), "1"),
+]
+
+
+def has_capability(capabilities: List[Tuple[uint16, str]], capability: Capability) -> bool:
+    return (uint16(capability.value), "1") in capabilities
+
 
 class WSChiaConnection:
     """
@@ -77,7 +92,7 @@ class WSChiaConnection:
 
         # Messaging
         self.incoming_queue: asyncio.Queue = incoming_queue
-        self.outgoing_queue: asyncio.Queue = asyncio.Queue()
+        self.outgoing_queue = OutgoingQueue()
 
         self.inbound_task: Optional[asyncio.Task] = None
         self.outbound_task: Optional[asyncio.Task] = None
@@ -91,6 +106,10 @@ class WSChiaConnection:
         self.request_results: Dict[bytes32, Message] = {}
         self.closed = False
         self.connection_type: Optional[NodeType] = None
+        # Set during the handshake if both peers support compressing large messages
+        self.compress_messages = False
+        # Compressed data of the messages that were rate limited, so they aren't compressed again when retried
+        self.rate_limited_data: Dict[Message, bytes] = {}
         if is_outbound:
             self.request_nonce: uint16 = uint16(0)
         else:
@@ -113,7 +132,7 @@ class WSChiaConnection:
                     chia_full_version_str(),
                     uint16(server_port),
                     uint8(local_type.value),
-                    [(uint16(Capability.BASE.value), "1")],
+                    CAPABILITIES,
                 ),
             )
             assert outbound_handshake is not None
@@ -137,6 +156,7 @@ class WSChiaConnection:
 
             self.peer_server_port = inbound_handshake.server_port
             self.connection_type = NodeType(inbound_handshake.node_type)
+            self.compress_messages = has_capability(inbound_handshake.capabilities, Capability.MESSAGE_COMPRESSION)
 
         else:
             try:
@@ -167,12 +187,13 @@ class WSChiaConnection:
                     chia_full_version_str(),
                     uint16(server_port),
                     uint8(local_type.value),
-                    [(uint16(Capability.BASE.value), "1")],
+                    CAPABILITIES,
                 ),
             )
             await self._send_message(outbound_handshake)
             self.peer_server_port = inbound_handshake.server_port
             self.connection_type = NodeType(inbound_handshake.node_type)
+            self.compress_messages = has_capability(inbound_handshake.capabilities, Capability.MESSAGE_COMPRESSION)
 
         self.outbound_task = asyncio.create_task(self.outbound_handler())
         self.inbound_task = asyncio.create_task(self.inbound_handler())
@@ -253,11 +274,35 @@ class WSChiaConnection:
             self.log.error(f"Exception: {e}")
             self.log.error(f"Exception Stack: {error_stack}")
 
+    def _queue_message(self, message: Message) -> bool:
+        if self.outgoing_queue.put(message):
+            return True
+        message_type = ProtocolMessageTypes(message.type).name
+        if message_priority(message.type) is Priority.LOW:
+            self.log.debug(f"Outgoing queue to {self.peer_host} is full, dropping {message_type}")
+        else:
+            # The peer doesn't keep up with the messages it needs
+            self.log.warning(f"Outgoing queue to {self.peer_host} is full, closing connection. message: {message_type}")
+            asyncio.create_task(self.close())
+        return False
+
     async def send_message(self, message: Message):
         """Send message sends a message with no tracking / callback."""
         if self.closed:
             return None
-        await self.outgoing_queue.put(message)
+        self._queue_message(message)
+
+    def send_messages_nowait(self, messages: List[Message]) -> bool:
+        """
+        Queues the messages without waiting, for broadcasts. Returns False if the connection is closed, or if the
+        outgoing queue was full.
+        """
+        if self.closed:
+            return False
+        queued = True
+        for message in messages:
+            queued = self._queue_message(message) and queued
+        return queued
 
     def __getattr__(self, attr_name: str):
         # TODO KWARGS
@@ -312,8 +357,10 @@ class WSChiaConnection:
 
         message = Message(message_no_id.type, request_id, message_no_id.data)
 
+        if not self._queue_message(message):
+            # Dropped, or the connection is closing, a response will never come
+            return None
         self.pending_requests[message.id] = event
-        await self.outgoing_queue.put(message)
 
         # If the timeout passes, we set the event
         async def time_out(req_id, req_timeout):
@@ -343,27 +390,30 @@ class WSChiaConnection:
     async def reply_to_request(self, response: Message):
         if self.closed:
             return None
-        await self.outgoing_queue.put(response)
+        self._queue_message(response)
 
     async def send_messages(self, messages: List[Message]):
         if self.closed:
             return None
         for message in messages:
-            await self.outgoing_queue.put(message)
+            self._queue_message(message)
 
-    async def _wait_and_retry(self, msg: Message, queue: asyncio.Queue):
-        try:
-            await asyncio.sleep(1)
-            await queue.put(msg)
-        except Exception as e:
-            self.log.debug(f"Exception {e} while waiting to retry sending rate limited message")
-            return None
+    async def _compress(self, data: bytes) -> bytes:
+        if len(data) < OFFLOAD_THRESHOLD:
+            return compress_data(data)
+        return await asyncio.get_running_loop().run_in_executor(None, compress_data, data)
+
+    async def _decompress(self, message_type: int, data: bytes) -> bytes:
+        if len(data) < OFFLOAD_THRESHOLD:
+            return decompress_data(message_type, data)
+        return await asyncio.get_running_loop().run_in_executor(None, decompress_data, message_type, data)
 
     async def _send_message(self, message: Message):
-        encoded: bytes = bytes(message)
-        size = len(encoded)
-        assert len(encoded) < (2 ** (LENGTH_BYTES * 8))
-        if not self.outbound_rate_limiter.process_msg_and_check(message):
+        wire_data = message.data
+        if self.compress_messages and is_compressed_type(message.type):
+            compressed = self.rate_limited_data.pop(message, None)
+            wire_data = compressed if compressed is not None else await self._compress(message.data)
+        if not self.outbound_rate_limiter.process_msg_and_check(message, len(wire_data)):
             if not is_localhost(self.peer_host):
                 self.log.debug(
                     f"Rate limiting ourselves. message type: {ProtocolMessageTypes(message.type).name}, "
@@ -372,7 +422,9 @@ class WSChiaConnection:
 
                 # TODO: fix this special case. This function has rate limits which are too low.
                 if ProtocolMessageTypes(message.type) != ProtocolMessageTypes.respond_peers:
-                    asyncio.create_task(self._wait_and_retry(message, self.outgoing_queue))
+                    if wire_data is not message.data:
+                        self.rate_limited_data[message] = wire_data
+                    self.outgoing_queue.put_delayed(message, RATE_LIMIT_RETRY_DELAY)
 
                 return None
             else:
@@ -381,6 +433,12 @@ class WSChiaConnection:
                     f"peer: {self.peer_host}"
                 )
 
+        if wire_data is message.data:
+            encoded: bytes = bytes(message)
+        else:
+            encoded = bytes(Message(message.type, message.id, wire_data))
+        size = len(encoded)
+        assert len(encoded) < (2 ** (LENGTH_BYTES * 8))
         await self.ws.send_bytes(encoded)
         self.log.debug(f"-> {ProtocolMessageTypes(message.type).name} to peer {self.peer_host} {self.peer_node_id}")
         self.bytes_written += size
@@ -430,7 +488,17 @@ class WSChiaConnection:
                 message_type = ProtocolMessageTypes(full_message_loaded.type).name
             except Exception:
                 message_type = "Unknown"
-            if not self.inbound_rate_limiter.process_msg_and_check(full_message_loaded):
+            wire_size = len(full_message_loaded.data)
+            if self.compress_messages and is_compressed_type(full_message_loaded.type):
+                try:
+                    data = await self._decompress(full_message_loaded.type, full_message_loaded.data)
+                except ValueError as e:
+                    self.log.error(f"Invalid compressed message from {self.peer_host}, message: {message_type}: {e}")
+                    asyncio.create_task(self.close(300))
+                    await asyncio.sleep(3)
+                    return None
+                full_message_loaded = Message(full_message_loaded.type, full_message_loaded.id, data)
+            if not self.inbound_rate_limiter.process_msg_and_check(full_message_loaded, wire_size):
                 if self.local_type == NodeType.FULL_NODE and not is_localhost(self.peer_host):
                     self.log.error(
                         f"Peer has been rate limited and will be disconnected: {self.peer_host}, "
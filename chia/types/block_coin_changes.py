@@ -0,0 +1,18 @@
+from dataclasses import dataclass
+from typing import List
+
+from chia.types.blockchain_format.coin import Coin
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.streamable import Streamable, streamable
+
+
+@dataclass(frozen=True)
+@streamable
+class BlockCoinChanges(Streamable):
+    """
+    The coins created and spent by the transactions of a block, not including its reward coins. Stored when the
+    block is added, so the coins of a fork can be found without running its generators again.
+    """
+
+    additions: List[Coin]
+    removals: List[bytes32]
@@ -5,9 +5,10 @@ from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.util.clvm import int_to_bytes
 from chia.util.hash import std_hash
 from chia.util.ints import uint64
-from chia.util.streamable import Streamable, streamable
+from chia.util.streamable import Streamable, memoize_bytes_and_hash, streamable
 
 
+@memoize_bytes_and_hash
 @dataclass(frozen=True)
 @streamable
 class Coin(Streamable):
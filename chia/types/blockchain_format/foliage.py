@@ -7,7 +7,7 @@ from chia.types.blockchain_format.coin import Coin
 from chia.types.blockchain_format.pool_target import PoolTarget
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.util.ints import uint64
-from chia.util.streamable import Streamable, streamable
+from chia.util.streamable import Streamable, memoize_bytes_and_hash, streamable
 
 
 @dataclass(frozen=True)
@@ -45,6 +45,7 @@ class FoliageBlockData(Streamable):
     extension_data: bytes32  # Used for future updates. Can be any 32 byte value initially
 
 
+@memoize_bytes_and_hash
 @dataclass(frozen=True)
 @streamable
 class Foliage(Streamable):
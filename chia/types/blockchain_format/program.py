@@ -145,6 +145,59 @@ def _serialize(node) -> bytes:
         return SExp.to(node).as_bin()
 
 
+# Nodes walked in Python by skip_program, about 1ms. Larger programs are measured by clvm_rs, which is much faster
+# per node but needs a copy of the buffer
+SKIP_WALK_MAX_NODES = 1000
+
+
+def skip_program(buf: memoryview, offset: int) -> int:
+    """
+    Returns the offset right after the serialized program that starts at offset. Small programs, like the puzzles
+    and solutions of coin spends, are walked in place by their encoding, without copying or creating them.
+    """
+    end = len(buf)
+    to_skip = 1
+    nodes = 0
+    pos = offset
+    while to_skip > 0:
+        nodes += 1
+        if nodes > SKIP_WALK_MAX_NODES:
+            return offset + serialized_length(bytes(buf[offset:]))
+        if pos >= end:
+            raise ValueError("bad encoding")
+        b = buf[pos]
+        pos += 1
+        if b == 0xFF:
+            # A pair, followed by its two items
+            to_skip += 1
+            continue
+        to_skip -= 1
+        if b <= 0x80:
+            # A single byte atom, or nil
+            continue
+        if b < 0xC0:
+            pos += b & 0x3F
+            continue
+        # The size of the atom is encoded in as many bytes as there are leading 1 bits in b, as in clvm
+        bit_count = 0
+        bit_mask = 0x80
+        while b & bit_mask:
+            bit_count += 1
+            b &= 0xFF ^ bit_mask
+            bit_mask >>= 1
+        if pos + bit_count - 1 > end:
+            raise ValueError("bad encoding")
+        size = b
+        for i in range(bit_count - 1):
+            size = (size << 8) | buf[pos + i]
+        if size >= 0x400000000:
+            raise ValueError("blob too large")
+        pos += bit_count - 1 + size
+    if pos > end:
+        raise ValueError("bad encoding")
+    return pos
+
+
 class SerializedProgram:
     """
     An opaque representation of a clvm program. It has a more limited interface than a full SExp
@@ -154,7 +207,8 @@ class SerializedProgram:
 
     @classmethod
     def parse(cls, f) -> "SerializedProgram":
-        length = serialized_length(f.getvalue()[f.tell() :])
+        with f.getbuffer() as buf:
+            length = skip_program(buf, f.tell()) - f.tell()
         return SerializedProgram.from_bytes(f.read(length))
 
     def stream(self, f):
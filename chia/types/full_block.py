@@ -7,7 +7,7 @@ from chia.types.blockchain_format.reward_chain_block import RewardChainBlock
 from chia.types.blockchain_format.vdf import VDFProof
 from chia.types.end_of_slot_bundle import EndOfSubSlotBundle
 from chia.util.ints import uint32
-from chia.util.streamable import Streamable, streamable
+from chia.util.streamable import Streamable, StreamableView, streamable
 
 
 @dataclass(frozen=True)
@@ -77,3 +77,68 @@ class FullBlock(Streamable):
         if self.challenge_chain_ip_proof.witness_type != 0 or not self.challenge_chain_ip_proof.normalized_to_identity:
             return False
         return True
+
+
+class FullBlockView(StreamableView):
+    """
+    A lazily parsed FullBlock, backed by its serialized bytes (for example, a row of the block store). Only the
+    fields that are accessed get parsed.
+    """
+
+    _streamable_class = FullBlock
+
+    @property
+    def prev_header_hash(self):
+        return self.foliage.prev_block_hash
+
+    @property
+    def height(self):
+        return self.reward_chain_block.height
+
+    @property
+    def weight(self):
+        return self.reward_chain_block.weight
+
+    @property
+    def total_iters(self):
+        return self.reward_chain_block.total_iters
+
+    @property
+    def header_hash(self):
+        return self.foliage.get_hash()
+
+    def is_transaction_block(self) -> bool:
+        return self.field_bytes("foliage_transaction_block")[0] != 0
+
+    def get_included_reward_coins(self) -> Set[Coin]:
+        if not self.is_transaction_block():
+            return set()
+        assert self.transactions_info is not None
+        return set(self.transactions_info.reward_claims_incorporated)
+
+    def to_full_block(self) -> FullBlock:
+        return self.to_streamable()
+
+    def header_block_bytes(self, transactions_filter: bytes) -> bytes:
+        """
+        Returns the serialized HeaderBlock of this block with the given filter. A HeaderBlock has the fields of the
+        FullBlock up to foliage_transaction_block, then the filter and transactions_info, so it is cut from the
+        buffer without parsing the block.
+        """
+        info_start = self.field_offset("transactions_info")
+        info_end = self.field_end("transactions_info")
+        return (
+            bytes(self._buf[:info_start])
+            + len(transactions_filter).to_bytes(4, "big")
+            + transactions_filter
+            + bytes(self._buf[info_start:info_end])
+        )
+
+    def bytes_without_transactions_generator(self) -> bytes:
+        """
+        Returns the serialized block with transactions_generator set to None, the same as
+        bytes(dataclasses.replace(block, transactions_generator=None)), without parsing the block.
+        """
+        generator_start = self.field_offset("transactions_generator")
+        generator_end = self.field_end("transactions_generator")
+        return bytes(self._buf[:generator_start]) + bytes([0]) + bytes(self._buf[generator_end:])
@@ -32,3 +32,22 @@ class MempoolItem(Streamable):
     @property
     def name(self) -> bytes32:
         return self.spend_bundle_name
+
+    # The names are computed on first use and kept on the item, outside of the dataclass fields like the values
+    # cached by memoize_bytes_and_hash, since the mempool looks them up each time it adds or removes the item
+
+    @property
+    def removal_names(self) -> List[bytes32]:
+        names = self.__dict__.get("_removal_names")
+        if names is None:
+            names = [coin.name() for coin in self.removals]
+            object.__setattr__(self, "_removal_names", names)
+        return names
+
+    @property
+    def addition_names(self) -> List[bytes32]:
+        names = self.__dict__.get("_addition_names")
+        if names is None:
+            names = [coin.name() for coin in self.additions]
+            object.__setattr__(self, "_addition_names", names)
+        return names
@@ -5,12 +5,13 @@ from blspy import AugSchemeMPL, G2Element
 
 from chia.types.blockchain_format.coin import Coin
 from chia.types.blockchain_format.sized_bytes import bytes32
-from chia.util.streamable import Streamable, streamable
+from chia.util.streamable import Streamable, memoize_bytes_and_hash, streamable
 from chia.wallet.util.debug_spend_bundle import debug_spend_bundle
 
 from .coin_spend import CoinSpend
 
 
+@memoize_bytes_and_hash
 @dataclass(frozen=True)
 @streamable
 class SpendBundle(Streamable):
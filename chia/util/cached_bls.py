@@ -0,0 +1,76 @@
+import functools
+from typing import List, Optional, Sequence
+
+from blspy import AugSchemeMPL, G1Element, G2Element, GTElement
+
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.util.hash import std_hash
+from chia.util.lru_cache import LRUCache
+
+# Pairings of the (pk, msg) pairs of recent transactions, shared by the mempool and block validation
+PAIRING_CACHE_SIZE = 10000
+LOCAL_CACHE: LRUCache = LRUCache(PAIRING_CACHE_SIZE)
+
+
+def pairing_key(pk: G1Element, msg: bytes) -> bytes32:
+    return std_hash(bytes(pk) + msg)
+
+
+def get_pairings(
+    cache: LRUCache, pks: Sequence[G1Element], msgs: Sequence[bytes], force_cache: bool
+) -> List[GTElement]:
+    """
+    Returns the pairing of each (pk, msg) pair, computing and caching the missing ones. Unless force_cache is set,
+    returns an empty list if more than half of them are missing, since verifying the aggregate signature directly
+    is then faster.
+    """
+    pairings: List[Optional[GTElement]] = []
+    missing_count = 0
+    for pk, msg in zip(pks, msgs):
+        pairing: Optional[GTElement] = cache.get(pairing_key(pk, msg))
+        if pairing is None:
+            missing_count += 1
+            if not force_cache and missing_count > len(pks) // 2:
+                return []
+        pairings.append(pairing)
+
+    result: List[GTElement] = []
+    for pk, msg, pairing in zip(pks, msgs, pairings):
+        if pairing is None:
+            aug_msg = bytes(pk) + msg
+            pairing = pk.pair(AugSchemeMPL.g2_from_message(aug_msg))
+            cache.put(std_hash(aug_msg), pairing)
+        result.append(pairing)
+    return result
+
+
+def aggregate_verify(
+    pks: Sequence[G1Element],
+    msgs: Sequence[bytes],
+    sig: G2Element,
+    force_cache: bool = False,
+    cache: LRUCache = LOCAL_CACHE,
+) -> bool:
+    """
+    Same as AugSchemeMPL.aggregate_verify, but reuses the cached pairings of the (pk, msg) pairs, so signatures
+    that were already checked, for example when their transactions entered the mempool, only cost one pairing.
+    With force_cache, the pairings are always computed and cached.
+    """
+    if len(pks) == 0:
+        return AugSchemeMPL.aggregate_verify(pks, msgs, sig)
+    pairings = get_pairings(cache, pks, msgs, force_cache)
+    if len(pairings) == 0:
+        return AugSchemeMPL.aggregate_verify(pks, msgs, sig)
+    pairings_prod: GTElement = functools.reduce(GTElement.__mul__, pairings)
+    return pairings_prod == sig.pair(G1Element.generator())
+
+
+def evict_pairings(pks: Sequence[G1Element], msgs: Sequence[bytes], cache: LRUCache = LOCAL_CACHE) -> None:
+    """
+    Removes the pairings of the (pk, msg) pairs, for example when their transaction leaves the mempool.
+    """
+    for pk, msg in zip(pks, msgs):
+        try:
+            cache.remove(pairing_key(pk, msg))
+        except KeyError:
+            pass
@@ -0,0 +1,45 @@
+import sqlite3
+
+import aiosqlite
+
+
+async def lookup_db_version(db: aiosqlite.Connection) -> int:
+    """
+    Returns the schema version of a full node database. Databases created before the version table was
+    introduced are version 1.
+    """
+    try:
+        cursor = await db.execute("SELECT * from database_version")
+        row = await cursor.fetchone()
+        await cursor.close()
+        if row is not None and row[0] == 2:
+            return 2
+        return 1
+    except aiosqlite.OperationalError:
+        return 1
+
+
+async def set_db_version_async(db: aiosqlite.Connection, version: int) -> None:
+    await db.execute("CREATE TABLE IF NOT EXISTS database_version(version int)")
+    cursor = await db.execute("DELETE FROM database_version")
+    await cursor.close()
+    cursor = await db.execute("INSERT INTO database_version VALUES (?)", (version,))
+    await cursor.close()
+    await db.commit()
+
+
+def lookup_db_version_sync(db: sqlite3.Connection) -> int:
+    try:
+        row = db.execute("SELECT * from database_version").fetchone()
+        if row is not None and row[0] == 2:
+            return 2
+        return 1
+    except sqlite3.OperationalError:
+        return 1
+
+
+def set_db_version(db: sqlite3.Connection, version: int) -> None:
+    db.execute("CREATE TABLE IF NOT EXISTS database_version(version int)")
+    db.execute("DELETE FROM database_version")
+    db.execute("INSERT INTO database_version VALUES (?)", (version,))
+    db.commit()
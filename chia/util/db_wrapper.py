@@ -1,7 +1,10 @@
 import asyncio
+from typing import Union
 
 import aiosqlite
 
+from chia.types.blockchain_format.sized_bytes import bytes32
+
 
 class DBWrapper:
     """
@@ -10,10 +13,23 @@ class DBWrapper:
 
     db: aiosqlite.Connection
     lock: asyncio.Lock
+    db_version: int
 
-    def __init__(self, connection: aiosqlite.Connection):
+    def __init__(self, connection: aiosqlite.Connection, db_version: int = 1):
         self.db = connection
         self.lock = asyncio.Lock()
+        self.db_version = db_version
+
+    def to_key(self, h: bytes32) -> Union[bytes32, str]:
+        # Version 1 databases store hashes as hex text, version 2 stores them as 32 byte blobs
+        if self.db_version == 2:
+            return h
+        return h.hex()
+
+    def from_key(self, key: Union[bytes, str]) -> bytes32:
+        if self.db_version == 2:
+            return bytes32(key)
+        return bytes32(bytes.fromhex(key))
 
     async def begin_transaction(self):
         cursor = await self.db.execute("BEGIN TRANSACTION")
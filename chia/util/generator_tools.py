@@ -1,16 +1,17 @@
-from typing import List, Tuple
+from typing import List, Tuple, Union
 from chiabip158 import PyBIP158
 
 from chia.types.blockchain_format.coin import Coin
 from chia.types.blockchain_format.sized_bytes import bytes32
-from chia.types.full_block import FullBlock
+from chia.types.full_block import FullBlock, FullBlockView
 from chia.types.header_block import HeaderBlock
 from chia.types.name_puzzle_condition import NPC
 from chia.util.condition_tools import created_outputs_for_conditions_dict
 
 
-def get_block_header(block: FullBlock, tx_addition_coins: List[Coin], removals_names: List[bytes32]) -> HeaderBlock:
-    # Create filter
+def get_transactions_filter(
+    block: Union[FullBlock, FullBlockView], tx_addition_coins: List[Coin], removals_names: List[bytes32]
+) -> bytes:
     byte_array_tx: List[bytes32] = []
     addition_coins = tx_addition_coins + list(block.get_included_reward_coins())
     if block.is_transaction_block():
@@ -20,7 +21,16 @@ def get_block_header(block: FullBlock, tx_addition_coins: List[Coin], removals_n
             byte_array_tx.append(bytearray(name))
 
     bip158: PyBIP158 = PyBIP158(byte_array_tx)
-    encoded_filter: bytes = bytes(bip158.GetEncoded())
+    return bytes(bip158.GetEncoded())
+
+
+def get_block_header(
+    block: Union[FullBlock, FullBlockView], tx_addition_coins: List[Coin], removals_names: List[bytes32]
+) -> HeaderBlock:
+    encoded_filter: bytes = get_transactions_filter(block, tx_addition_coins, removals_names)
+    if isinstance(block, FullBlockView):
+        # The fields are cut from the stored block, and only parsed once, by the HeaderBlock
+        return HeaderBlock.from_bytes(block.header_block_bytes(encoded_filter))
 
     return HeaderBlock(
         block.finished_sub_slots,
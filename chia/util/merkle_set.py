@@ -1,6 +1,6 @@
 from abc import ABCMeta, abstractmethod
 from hashlib import sha256
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, List, Tuple
 
 from chia.types.blockchain_format.sized_bytes import bytes32
 
@@ -125,6 +125,15 @@ class MerkleSet:
         else:
             self.root = root
 
+    @classmethod
+    def from_already_hashed(cls, values: Iterable[bytes]) -> "MerkleSet":
+        """
+        Builds the set from all its values at once, by sorting them and building each node once from its children.
+        The tree only depends on the values, so the root and proofs are the same as when adding them one at a time.
+        """
+        sorted_values = sorted(set(values))
+        return cls(_build(sorted_values, 0, len(sorted_values), 0))
+
     def get_root(self) -> bytes:
         return compress_root(self.root.get_hash())
 
@@ -349,6 +358,22 @@ class SetError(Exception):
     pass
 
 
+def _build(values: List[bytes], start: int, end: int, depth: int) -> Node:
+    # values[start:end] are sorted and share their first depth bits, so the ones with a 0 bit at depth come first
+    if start == end:
+        return _empty
+    if end - start == 1:
+        return TerminalNode(values[start])
+    low, high = start, end
+    while low < high:
+        mid = (low + high) // 2
+        if get_bit(values[mid], depth) == 0:
+            low = mid + 1
+        else:
+            high = mid
+    return MiddleNode([_build(values, start, low, depth + 1), _build(values, low, end, depth + 1)])
+
+
 def confirm_included(root: Node, val: bytes, proof: bytes32) -> bool:
     return confirm_not_included_already_hashed(root, sha256(val).digest(), proof)
 
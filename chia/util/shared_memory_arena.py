@@ -0,0 +1,103 @@
+import sys
+from typing import List, Optional, Tuple
+
+try:
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:  # Python 3.7
+    shared_memory = None  # type: ignore
+
+# (offset, length) of a blob in an arena
+BlobRef = Tuple[int, int]
+
+
+def shared_memory_available() -> bool:
+    return shared_memory is not None
+
+
+class SharedMemoryArena:
+    """
+    A block of shared memory that byte blobs are appended to, and read from by offset. The process that creates
+    the arena writes the inputs, other processes attach to it by name and read them, and may write into regions
+    reserved for them. The creator must call close() once all readers are done, which also frees the memory.
+    """
+
+    def __init__(self, size: int):
+        assert shared_memory is not None
+        # Zero sized segments are not allowed
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self._used = 0
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def add(self, blob: bytes) -> BlobRef:
+        ref = self.reserve(len(blob))
+        self._shm.buf[ref[0] : ref[0] + ref[1]] = blob
+        return ref
+
+    def reserve(self, size: int) -> BlobRef:
+        if self._used + size > self._shm.size:
+            raise ValueError(f"Arena is full, {self._used} of {self._shm.size} bytes used, {size} requested")
+        ref = (self._used, size)
+        self._used += size
+        return ref
+
+    def read(self, ref: BlobRef) -> bytes:
+        return bytes(self._shm.buf[ref[0] : ref[0] + ref[1]])
+
+    def close(self) -> None:
+        self._shm.close()
+        self._shm.unlink()
+
+
+def _attach(name: str) -> "shared_memory.SharedMemory":
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Before 3.13, attaching registers the segment with the resource tracker, which unlinks it when the process that
+    # started the tracker exits. Only the creator owns the segment. Unregistering after attaching doesn't work, since
+    # workers usually share the creator's tracker, and it would drop the creator's registration
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedMemoryReader:
+    """
+    Attaches to an arena created by another process.
+
+    Blobs are read as bytes. The parsers copy their input into a BytesIO either way, a memoryview as well, and views
+    into the segment would have to be released before close(). The copy takes about 0.1ms per MiB, against 2.5ms
+    for pickling the same blob and sending it through the pool's pipe.
+    """
+
+    def __init__(self, name: str):
+        assert shared_memory is not None
+        self._shm = _attach(name)
+
+    def read(self, ref: BlobRef) -> bytes:
+        return bytes(self._shm.buf[ref[0] : ref[0] + ref[1]])
+
+    def read_optional(self, ref: Optional[BlobRef]) -> Optional[bytes]:
+        return None if ref is None else self.read(ref)
+
+    def write(self, region: BlobRef, blobs: List[bytes]) -> Optional[List[int]]:
+        """
+        Writes blobs back to back into a region reserved by the arena's creator, and returns their lengths.
+        Returns None, without writing, if they don't fit.
+        """
+        offset, size = region
+        if sum(len(blob) for blob in blobs) > size:
+            return None
+        lengths: List[int] = []
+        for blob in blobs:
+            self._shm.buf[offset : offset + len(blob)] = blob
+            offset += len(blob)
+            lengths.append(len(blob))
+        return lengths
+
+    def close(self) -> None:
+        self._shm.close()
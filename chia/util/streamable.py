@@ -5,13 +5,14 @@ from __future__ import annotations
 import dataclasses
 import io
 import pprint
+import struct
 import sys
 from enum import Enum
-from typing import Any, BinaryIO, Dict, List, Tuple, Type, Callable, Optional, Iterator
+from typing import Any, BinaryIO, Dict, List, Tuple, Type, Callable, Optional
 
 from blspy import G1Element, G2Element, PrivateKey
 
-from chia.types.blockchain_format.program import Program, SerializedProgram
+from chia.types.blockchain_format.program import Program, SerializedProgram, skip_program
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.util.byte_types import hexstr_to_bytes
 from chia.util.hash import std_hash
@@ -126,6 +127,8 @@ def recurse_jsonify(d):
 
 
 PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS = {}
+STREAM_FUNCTIONS_FOR_STREAMABLE_CLASS = {}
+SKIP_FUNCTIONS_FOR_STREAMABLE_CLASS = {}
 
 
 def streamable(cls: Any):
@@ -143,6 +146,9 @@ def streamable(cls: Any):
     be of fixed size. For example, int cannot be a constituent since it is not a fixed size,
     whereas uint32 can be.
 
+    The functions that parse and stream each field are resolved once here, when the class is defined, instead
+    of inspecting the field types on every call.
+
     Furthermore, a get_hash() member is added, which performs a serialization and a sha256.
 
     This class is used for deterministic serialization and hashing, for consensus critical
@@ -158,18 +164,57 @@ def streamable(cls: Any):
     t = type(cls.__name__, (cls1, Streamable), {})
 
     parse_functions = []
+    stream_functions = []
+    skip_functions = []
     try:
         fields = cls1.__annotations__  # pylint: disable=no-member
     except Exception:
         fields = {}
 
-    for _, f_type in fields.items():
+    for f_name, f_type in fields.items():
         parse_functions.append(cls.function_to_parse_one_item(f_type))
+        stream_functions.append((f_name, cls.function_to_stream_one_item(f_type)))
+        skip_functions.append(cls.function_to_skip_one_item(f_type))
 
     PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS[t] = parse_functions
+    STREAM_FUNCTIONS_FOR_STREAMABLE_CLASS[t] = stream_functions
+    SKIP_FUNCTIONS_FOR_STREAMABLE_CLASS[t] = skip_functions
     return t
 
 
+def memoize_bytes_and_hash(cls: Any):
+    """
+    This is an opt-in decorator for streamable classes, applied above @dataclass(frozen=True). It caches the
+    results of __bytes__ and get_hash on each instance, the first time they are called. The cached values are
+    stored outside of the dataclass fields, so they are not part of equality, serialization or JSON.
+
+    Only use this for classes whose instances are never modified after creation, including the lists they
+    contain, since the cache is not invalidated.
+    """
+    compute_bytes = cls.__bytes__
+    compute_hash = cls.get_hash
+
+    def __bytes__(self: Any) -> bytes:
+        cached = self.__dict__.get("_cached_bytes")
+        if cached is not None:
+            return cached
+        cached = compute_bytes(self)
+        object.__setattr__(self, "_cached_bytes", cached)
+        return cached
+
+    def get_hash(self: Any) -> bytes32:
+        cached = self.__dict__.get("_cached_hash")
+        if cached is not None:
+            return cached
+        cached = compute_hash(self)
+        object.__setattr__(self, "_cached_hash", cached)
+        return cached
+
+    cls.__bytes__ = __bytes__
+    cls.get_hash = get_hash
+    return cls
+
+
 def parse_bool(f: BinaryIO) -> bool:
     bool_byte = f.read(1)
     assert bool_byte is not None and len(bool_byte) == 1  # Checks for EOF
@@ -234,6 +279,115 @@ def parse_str(f: BinaryIO) -> str:
     return bytes.decode(str_read_bytes, "utf-8")
 
 
+def stream_optional(stream_inner_type_func: Callable[[Any, BinaryIO], None], item: Any, f: BinaryIO) -> None:
+    if item is None:
+        f.write(bytes([0]))
+    else:
+        f.write(bytes([1]))
+        stream_inner_type_func(item, f)
+
+
+def stream_bytes(item: Any, f: BinaryIO) -> None:
+    f.write(uint32(len(item)).to_bytes(4, "big"))
+    f.write(item)
+
+
+def stream_streamable(item: Any, f: BinaryIO) -> None:
+    item.stream(f)
+
+
+def stream_byte_convertible(item: Any, f: BinaryIO) -> None:
+    f.write(bytes(item))
+
+
+def stream_list(stream_inner_type_func: Callable[[Any, BinaryIO], None], item: Any, f: BinaryIO) -> None:
+    assert is_type_List(type(item))
+    f.write(uint32(len(item)).to_bytes(4, "big"))
+    for element in item:
+        stream_inner_type_func(element, f)
+
+
+def stream_tuple(stream_inner_type_funcs: List[Callable[[Any, BinaryIO], None]], item: Any, f: BinaryIO) -> None:
+    assert len(item) == len(stream_inner_type_funcs)
+    for i in range(len(item)):
+        stream_inner_type_funcs[i](item[i], f)
+
+
+def stream_str(item: Any, f: BinaryIO) -> None:
+    str_bytes = item.encode("utf-8")
+    f.write(uint32(len(str_bytes)).to_bytes(4, "big"))
+    f.write(str_bytes)
+
+
+def stream_bool(item: Any, f: BinaryIO) -> None:
+    f.write(int(item).to_bytes(1, "big"))
+
+
+def skip_fixed_size(size: int, buf: memoryview, offset: int) -> int:
+    end = offset + size
+    assert end <= len(buf)  # Checks for EOF
+    return end
+
+
+def skip_optional(skip_inner_type_func: Callable[[memoryview, int], int], buf: memoryview, offset: int) -> int:
+    assert offset < len(buf)  # Checks for EOF
+    if buf[offset] == 0:
+        return offset + 1
+    elif buf[offset] == 1:
+        return skip_inner_type_func(buf, offset + 1)
+    else:
+        raise ValueError("Optional must be 0 or 1")
+
+
+def skip_bytes(buf: memoryview, offset: int) -> int:
+    size = int.from_bytes(buf[offset : offset + 4], "big")
+    return skip_fixed_size(4 + size, buf, offset)
+
+
+def skip_list(skip_inner_type_func: Callable[[memoryview, int], int], buf: memoryview, offset: int) -> int:
+    end = skip_fixed_size(4, buf, offset)
+    list_size = int.from_bytes(buf[offset:end], "big")
+    for list_index in range(list_size):
+        end = skip_inner_type_func(buf, end)
+    return end
+
+
+def skip_tuple(skip_inner_type_funcs: List[Callable[[memoryview, int], int]], buf: memoryview, offset: int) -> int:
+    for skip_f in skip_inner_type_funcs:
+        offset = skip_f(buf, offset)
+    return offset
+
+
+def skip_streamable(skip_functions: List[Callable[[memoryview, int], int]], buf: memoryview, offset: int) -> int:
+    for skip_f in skip_functions:
+        offset = skip_f(buf, offset)
+    return offset
+
+
+def skip_by_parsing(f_type: Type, buf: memoryview, offset: int) -> int:
+    # Used for types with a variable size that is only known to their own parser, like SerializedProgram
+    f = io.BytesIO(buf[offset:])
+    f_type.parse(f)
+    return offset + f.tell()
+
+
+def fixed_size_of_type(f_type: Type) -> Optional[int]:
+    """
+    Returns the serialized size of f_type if all of its values have the same size, None otherwise.
+    """
+    if hasattr(f_type, "PACK"):
+        return struct.calcsize(f_type.PACK)
+    if f_type is uint128:
+        return 16
+    if f_type is int512:
+        return 65
+    if issubclass(f_type, bytes) and f_type.__name__[len("bytes") :].isdigit():
+        return int(f_type.__name__[len("bytes") :])
+    if f_type.__name__ in size_hints:
+        return size_hints[f_type.__name__]
+    return None
+
+
 class Streamable:
     @classmethod
     def function_to_parse_one_item(cls: Type[cls.__name__], f_type: Type):  # type: ignore
@@ -267,20 +421,90 @@ class Streamable:
             return parse_str
         raise NotImplementedError(f"Type {f_type} does not have parse")
 
+    @classmethod
+    def function_to_stream_one_item(cls: Type[cls.__name__], f_type: Type):  # type: ignore
+        """
+        This function returns a function taking two arguments `item: Any, f: BinaryIO` that streams
+        a value of the given type. It mirrors the checks done in stream_one_item.
+        """
+        inner_type: Type
+        if is_type_SpecificOptional(f_type):
+            inner_type = get_args(f_type)[0]
+            stream_inner_type_func = cls.function_to_stream_one_item(inner_type)
+            return lambda item, f: stream_optional(stream_inner_type_func, item, f)
+        if f_type == bytes:
+            return stream_bytes
+        if hasattr(f_type, "stream"):
+            return stream_streamable
+        if hasattr(f_type, "__bytes__"):
+            return stream_byte_convertible
+        if is_type_List(f_type):
+            inner_type = get_args(f_type)[0]
+            stream_inner_type_func = cls.function_to_stream_one_item(inner_type)
+            return lambda item, f: stream_list(stream_inner_type_func, item, f)
+        if is_type_Tuple(f_type):
+            inner_types = get_args(f_type)
+            stream_inner_type_funcs = [cls.function_to_stream_one_item(_) for _ in inner_types]
+            return lambda item, f: stream_tuple(stream_inner_type_funcs, item, f)
+        if f_type is str:
+            return stream_str
+        if f_type is bool:
+            return stream_bool
+        raise NotImplementedError(f"can't stream {f_type}")
+
+    @classmethod
+    def function_to_skip_one_item(cls: Type[cls.__name__], f_type: Type):  # type: ignore
+        """
+        This function returns a function taking two arguments `buf: memoryview, offset: int` that returns
+        the offset right after the serialized value of the given type that starts at `offset`, without
+        creating the value. It mirrors the checks done in function_to_parse_one_item.
+        """
+        inner_type: Type
+        if f_type is bool:
+            return lambda buf, offset: skip_fixed_size(1, buf, offset)
+        if is_type_SpecificOptional(f_type):
+            inner_type = get_args(f_type)[0]
+            skip_inner_type_f = cls.function_to_skip_one_item(inner_type)
+            return lambda buf, offset: skip_optional(skip_inner_type_f, buf, offset)
+        if hasattr(f_type, "parse"):
+            if f_type in SKIP_FUNCTIONS_FOR_STREAMABLE_CLASS:
+                skip_functions = SKIP_FUNCTIONS_FOR_STREAMABLE_CLASS[f_type]
+                return lambda buf, offset: skip_streamable(skip_functions, buf, offset)
+            size = fixed_size_of_type(f_type)
+            if size is not None:
+                return lambda buf, offset: skip_fixed_size(size, buf, offset)
+            if f_type is Program or f_type is SerializedProgram:
+                return skip_program
+            return lambda buf, offset: skip_by_parsing(f_type, buf, offset)
+        if f_type == bytes:
+            return skip_bytes
+        if is_type_List(f_type):
+            inner_type = get_args(f_type)[0]
+            skip_inner_type_f = cls.function_to_skip_one_item(inner_type)
+            return lambda buf, offset: skip_list(skip_inner_type_f, buf, offset)
+        if is_type_Tuple(f_type):
+            inner_types = get_args(f_type)
+            skip_inner_type_funcs = [cls.function_to_skip_one_item(_) for _ in inner_types]
+            return lambda buf, offset: skip_tuple(skip_inner_type_funcs, buf, offset)
+        if hasattr(f_type, "from_bytes") and f_type.__name__ in size_hints:
+            bytes_to_skip = size_hints[f_type.__name__]
+            return lambda buf, offset: skip_fixed_size(bytes_to_skip, buf, offset)
+        if f_type is str:
+            return skip_bytes
+        raise NotImplementedError(f"Type {f_type} does not have parse")
+
     @classmethod
     def parse(cls: Type[cls.__name__], f: BinaryIO) -> cls.__name__:  # type: ignore
         # Create the object without calling __init__() to avoid unnecessary post-init checks in strictdataclass
         obj: Streamable = object.__new__(cls)
-        fields: Iterator[str] = iter(getattr(cls, "__annotations__", {}))
-        values: Iterator = (parse_f(f) for parse_f in PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS[cls])
-        for field, value in zip(fields, values):
-            object.__setattr__(obj, field, value)
-
-        # Use -1 as a sentinel value as it's not currently serializable
-        if next(fields, -1) != -1:
+        fields: Dict[str, Any] = getattr(cls, "__annotations__", {})
+        parse_functions = PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS[cls]
+        if len(fields) > len(parse_functions):
             raise ValueError("Failed to parse incomplete Streamable object")
-        if next(values, -1) != -1:
+        if len(fields) < len(parse_functions):
             raise ValueError("Failed to parse unknown data in Streamable object")
+        for field, parse_f in zip(fields, parse_functions):
+            object.__setattr__(obj, field, parse_f(f))
         return obj
 
     def stream_one_item(self, f_type: Type, item, f: BinaryIO) -> None:
@@ -322,6 +546,13 @@ class Streamable:
             raise NotImplementedError(f"can't stream {item}, {f_type}")
 
     def stream(self, f: BinaryIO) -> None:
+        stream_functions = STREAM_FUNCTIONS_FOR_STREAMABLE_CLASS.get(type(self))
+        if stream_functions is not None:
+            for f_name, stream_f in stream_functions:
+                stream_f(getattr(self, f_name), f)
+            return None
+
+        # Not created by the streamable decorator, fall back to inspecting the field types
         try:
             fields = self.__annotations__  # pylint: disable=no-member
         except Exception:
@@ -356,3 +587,55 @@ class Streamable:
     @classmethod
     def from_json_dict(cls: Any, json_dict: Dict) -> Any:
         return dataclass_from_dict(cls, json_dict)
+
+
+class StreamableView:
+    """
+    A read only view of the serialized form of a streamable class. The buffer is not copied, and each field
+    is only located and parsed the first time it is accessed, so callers that need a few fields of a large
+    object do not pay for parsing all of it.
+    """
+
+    _streamable_class: Type[Streamable]
+
+    def __init__(self, blob: bytes):
+        self._blob = blob
+        self._buf = memoryview(blob)
+        self._field_names: List[str] = list(getattr(self._streamable_class, "__annotations__", {}))
+        self._skip_functions = SKIP_FUNCTIONS_FOR_STREAMABLE_CLASS[self._streamable_class]
+        # _offsets[i] is the offset at which field i starts, filled in as fields are located
+        self._offsets: List[int] = [0]
+        self._values: Dict[str, Any] = {}
+
+    def field_offset(self, f_name: str) -> int:
+        index = self._field_names.index(f_name)
+        while len(self._offsets) <= index:
+            prev = len(self._offsets) - 1
+            self._offsets.append(self._skip_functions[prev](self._buf, self._offsets[prev]))
+        return self._offsets[index]
+
+    def field_end(self, f_name: str) -> int:
+        index = self._field_names.index(f_name)
+        if index + 1 < len(self._field_names):
+            return self.field_offset(self._field_names[index + 1])
+        return self._skip_functions[index](self._buf, self.field_offset(f_name))
+
+    def field_bytes(self, f_name: str) -> memoryview:
+        return self._buf[self.field_offset(f_name) : self.field_end(f_name)]
+
+    def __getattr__(self, f_name: str) -> Any:
+        if f_name.startswith("_") or f_name not in self._field_names:
+            raise AttributeError(f_name)
+        if f_name not in self._values:
+            index = self._field_names.index(f_name)
+            f = io.BytesIO(self.field_bytes(f_name))
+            value = PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS[self._streamable_class][index](f)
+            assert f.read() == b""
+            self._values[f_name] = value
+        return self._values[f_name]
+
+    def to_streamable(self) -> Any:
+        return self._streamable_class.from_bytes(self._buf)
+
+    def __bytes__(self) -> bytes:
+        return bytes(self._blob)
@@ -413,8 +413,9 @@ class TradeManager:
                 chia_discrepancy, []
             )
             if chia_spend_bundle is not None:
-                for coinsol in coinsols:
-                    chia_spend_bundle.coin_spends.append(coinsol)
+                chia_spend_bundle = SpendBundle(
+                    chia_spend_bundle.coin_spends + coinsols, chia_spend_bundle.aggregated_signature
+                )
 
         zero_spend_list: List[SpendBundle] = []
         spend_bundle = None
@@ -762,12 +762,10 @@ class WalletNode:
     ):
         if proofs is None:
             # Verify root
-            additions_merkle_set = MerkleSet()
-
             # Addition Merkle set contains puzzlehash and hash of all coins with that puzzlehash
-            for puzzle_hash, coins_l in coins:
-                additions_merkle_set.add_already_hashed(puzzle_hash)
-                additions_merkle_set.add_already_hashed(hash_coin_list(coins_l))
+            additions_merkle_set = MerkleSet.from_already_hashed(
+                [puzzle_hash for puzzle_hash, _ in coins] + [hash_coin_list(coins_l) for _, coins_l in coins]
+            )
 
             additions_root = additions_merkle_set.get_root()
             if root != additions_root:
@@ -819,12 +817,8 @@ class WalletNode:
             # we must find the ones relevant to our wallets.
 
             # Verify removals root
-            removals_merkle_set = MerkleSet()
-            for name_coin in coins:
-                # TODO review all verification
-                name, coin = name_coin
-                if coin is not None:
-                    removals_merkle_set.add_already_hashed(coin.name())
+            # TODO review all verification
+            removals_merkle_set = MerkleSet.from_already_hashed([coin.name() for _, coin in coins if coin is not None])
             removals_root = removals_merkle_set.get_root()
             if root != removals_root:
                 return False
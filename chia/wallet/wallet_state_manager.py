@@ -153,7 +153,7 @@ class WalletStateManager:
             self.reorg_rollback,
             self.lock,
         )
-        self.weight_proof_handler = WeightProofHandler(self.constants, self.blockchain)
+        self.weight_proof_handler = WeightProofHandler(self.constants, self.blockchain, self.blockchain.pool)
 
         self.sync_mode = False
         self.sync_store = await WalletSyncStore.create()
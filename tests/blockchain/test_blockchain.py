@@ -13,6 +13,8 @@ from clvm.casts import int_to_bytes
 from chia.consensus.block_rewards import calculate_base_farmer_reward
 from chia.consensus.blockchain import ReceiveBlockResult
 from chia.consensus.coinbase import create_farmer_coin
+from chia.consensus.multiprocess_validation import pre_validate_blocks_multiprocessing
+from chia.consensus.npc_result_cache import NPCResultCache
 from chia.consensus.pot_iterations import is_overflow_block
 from chia.full_node.bundle_tools import detect_potential_template_generator
 from chia.types.blockchain_format.classgroup import ClassgroupElement
@@ -1595,6 +1597,103 @@ class TestPreValidation:
         log.info(f"Average pv: {sum(times_pv)/(len(blocks)/n_at_a_time)}")
         log.info(f"Average rb: {sum(times_rb)/(len(blocks))}")
 
+    @pytest.mark.asyncio
+    async def test_pre_validation_transports(self, empty_blockchain, default_400_blocks):
+        # Shared memory and pickling give the same results, including for batches with new sub slots
+        blocks = default_400_blocks[:40]
+        results = []
+        for shared_memory_transport in [True, False]:
+            res = await pre_validate_blocks_multiprocessing(
+                empty_blockchain.constants,
+                empty_blockchain.constants_json,
+                empty_blockchain,
+                blocks,
+                empty_blockchain.pool,
+                True,
+                {},
+                empty_blockchain.get_block_generator,
+                4,
+                shared_memory_transport=shared_memory_transport,
+            )
+            assert res is not None
+            assert all(r.error is None for r in res)
+            results.append(res)
+        assert results[0] == results[1]
+
+    @pytest.mark.asyncio
+    async def test_pre_validation_resident_block_records(self, empty_blockchain, default_400_blocks):
+        # Workers that keep the block records between calls give the same results as sending all of them
+        blocks = default_400_blocks[:100]
+        for i in range(0, len(blocks), 10):
+            blocks_to_validate = blocks[i : i + 10]
+            res = await empty_blockchain.pre_validate_blocks_multiprocessing(blocks_to_validate, {}, 2)
+            res_sent = await pre_validate_blocks_multiprocessing(
+                empty_blockchain.constants,
+                empty_blockchain.constants_json,
+                empty_blockchain,
+                blocks_to_validate,
+                empty_blockchain.pool,
+                True,
+                {},
+                empty_blockchain.get_block_generator,
+                2,
+            )
+            assert res is not None and res == res_sent
+            for block, result in zip(blocks_to_validate, res):
+                _, err, _ = await empty_blockchain.receive_block(block, result)
+                assert err is None
+        assert empty_blockchain.worker_block_records.version > 1
+
+    @pytest.mark.asyncio
+    async def test_npc_result_cache_safe_mode(self, empty_blockchain):
+        # The unfinished block runs its generator in safe mode, so pre-validating the finished block reuses the result
+        b = empty_blockchain
+        blocks = bt.get_consecutive_blocks(
+            3,
+            guarantee_transaction_block=True,
+            farmer_reward_puzzle_hash=bt.pool_ph,
+            pool_reward_puzzle_hash=bt.pool_ph,
+        )
+        for block in blocks:
+            assert (await b.receive_block(block))[0] == ReceiveBlockResult.NEW_PEAK
+        wt: WalletTool = bt.get_pool_wallet_tool()
+        tx: SpendBundle = wt.generate_signed_transaction(
+            10, wt.get_new_puzzlehash(), list(blocks[-1].get_included_reward_coins())[0]
+        )
+        blocks = bt.get_consecutive_blocks(
+            1, block_list_input=blocks, guarantee_transaction_block=True, transaction_data=tx
+        )
+        block = blocks[-1]
+        unf = UnfinishedBlock(
+            block.finished_sub_slots,
+            block.reward_chain_block.get_unfinished(),
+            block.challenge_chain_sp_proof,
+            block.reward_chain_sp_proof,
+            block.foliage,
+            block.foliage_transaction_block,
+            block.transactions_info,
+            block.transactions_generator,
+            [],
+        )
+        validate_res = await b.validate_unfinished_block(unf, False)
+        assert validate_res.error is None
+        assert b.npc_result_cache.hits == 0
+
+        res = await b.pre_validate_blocks_multiprocessing([block], {})
+        assert res is not None and res[0].error is None
+        assert b.npc_result_cache.hits == 1
+        assert res[0].npc_result == validate_res.npc_result
+
+        # Results computed in unsafe mode are only returned to unsafe callers
+        cache = NPCResultCache()
+        cache.put(block.header_hash, validate_res.npc_result, False)
+        assert cache.get(block.header_hash, True) is None
+        assert cache.get(block.header_hash, False) == validate_res.npc_result
+        cache.put(block.header_hash, validate_res.npc_result, True)
+        assert cache.get(block.header_hash, True) == validate_res.npc_result
+
+        assert (await b.receive_block(block, res[0]))[0] == ReceiveBlockResult.NEW_PEAK
+
 
 class TestBodyValidation:
     @pytest.mark.asyncio
@@ -0,0 +1,96 @@
+# flake8: noqa: F811, F401
+import asyncio
+from pathlib import Path
+
+import aiosqlite
+import pytest
+
+from chia.consensus.blockchain import Blockchain
+from chia.full_node.block_store import BlockStore
+from chia.full_node.coin_store import CoinStore
+from chia.util.db_wrapper import DBWrapper
+from chia.util.ints import uint32
+from tests.core.fixtures import default_400_blocks
+from tests.setup_nodes import test_constants
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    loop = asyncio.get_event_loop()
+    yield loop
+
+
+async def load_blockchain(db_path: Path, height_map_path):
+    connection = await aiosqlite.connect(db_path)
+    db_wrapper = DBWrapper(connection, 2)
+    coin_store = await CoinStore.create(db_wrapper)
+    block_store = await BlockStore.create(db_wrapper)
+    return connection, await Blockchain.create(coin_store, block_store, test_constants, height_map_path)
+
+
+class TestBlockHeightMap:
+    @pytest.mark.asyncio
+    async def test_height_map_persisted(self, default_400_blocks):
+        db_path = Path("blockchain_height_map_test.db")
+        hash_file = Path(f"{db_path}.height-to-hash")
+        ses_file = Path(f"{db_path}.sub-epoch-summaries")
+        verified_file = Path(f"{db_path}.height-to-hash-verified")
+        for path in [db_path, hash_file, ses_file, verified_file]:
+            if path.exists():
+                path.unlink()
+
+        connection, bc = await load_blockchain(db_path, db_path)
+        for block in default_400_blocks:
+            result, err, _ = await bc.receive_block(block)
+            assert err is None
+        peak_height = bc.get_peak_height()
+        hashes = [bc.height_to_hash(uint32(h)) for h in range(peak_height + 1)]
+        ses_heights = bc.get_ses_heights()
+        assert len(ses_heights) > 0
+        bc.shut_down()
+        await connection.close()
+        assert hash_file.exists() and ses_file.exists()
+        assert int.from_bytes(verified_file.read_bytes(), "big", signed=True) == peak_height
+
+        # Loading from the persisted index, and rebuilding it from the database, give the same chain
+        for height_map_path in [db_path, None]:
+            connection, bc = await load_blockchain(db_path, height_map_path)
+            assert bc.get_peak_height() == peak_height
+            assert [bc.height_to_hash(uint32(h)) for h in range(peak_height + 1)] == hashes
+            assert not bc.contains_height(uint32(peak_height + 1))
+            assert bc.get_ses_heights() == ses_heights
+            for height in ses_heights:
+                block_record = await bc.block_store.get_block_record(bc.height_to_hash(height))
+                assert bc.get_ses(height) == block_record.sub_epoch_summary_included
+            bc.shut_down()
+            await connection.close()
+
+        # A lost sub epoch summary file is rebuilt from the database
+        ses_file.unlink()
+        connection, bc = await load_blockchain(db_path, db_path)
+        assert bc.get_ses_heights() == ses_heights
+        bc.shut_down()
+        await connection.close()
+
+        # Hashes above the verified height aren't trusted, they may not have been flushed before a crash
+        with open(hash_file, "r+b") as f:
+            f.seek((peak_height - 10) * 32)
+            f.write(bytes(32))
+        verified_file.write_bytes((peak_height - 20).to_bytes(8, "big", signed=True))
+        connection, bc = await load_blockchain(db_path, db_path)
+        assert [bc.height_to_hash(uint32(h)) for h in range(peak_height + 1)] == hashes
+        bc.shut_down()
+        await connection.close()
+
+        # A hash below the verified height that doesn't match the sub epoch summaries makes it rebuild
+        with open(hash_file, "r+b") as f:
+            f.seek(ses_heights[0] * 32)
+            f.write(bytes(32))
+        connection, bc = await load_blockchain(db_path, db_path)
+        assert [bc.height_to_hash(uint32(h)) for h in range(peak_height + 1)] == hashes
+        assert bc.get_ses_heights() == ses_heights
+        bc.shut_down()
+        await connection.close()
+
+        for path in [db_path, hash_file, ses_file, verified_file]:
+            path.unlink()
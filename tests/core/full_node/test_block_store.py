@@ -1,4 +1,5 @@
 import asyncio
+import dataclasses
 import logging
 import random
 import sqlite3
@@ -8,9 +9,13 @@ import aiosqlite
 import pytest
 
 from chia.consensus.blockchain import Blockchain
+from chia.full_node.block_compression import FORMAT_RAW, FORMAT_ZLIB, FORMAT_ZLIB_DICT
 from chia.full_node.block_store import BlockStore
 from chia.full_node.coin_store import CoinStore
+from chia.types.block_coin_changes import BlockCoinChanges
 from chia.util.db_wrapper import DBWrapper
+from chia.util.generator_tools import get_block_header
+from chia.util.ints import uint32
 from tests.setup_nodes import bt, test_constants
 
 log = logging.getLogger(__name__)
@@ -23,8 +28,9 @@ def event_loop():
 
 
 class TestBlockStore:
+    @pytest.mark.parametrize("db_version", [1, 2])
     @pytest.mark.asyncio
-    async def test_block_store(self):
+    async def test_block_store(self, db_version):
         assert sqlite3.threadsafety == 1
         blocks = bt.get_consecutive_blocks(10)
 
@@ -38,8 +44,8 @@ class TestBlockStore:
 
         connection = await aiosqlite.connect(db_filename)
         connection_2 = await aiosqlite.connect(db_filename_2)
-        db_wrapper = DBWrapper(connection)
-        db_wrapper_2 = DBWrapper(connection_2)
+        db_wrapper = DBWrapper(connection, db_version)
+        db_wrapper_2 = DBWrapper(connection_2, db_version)
 
         # Use a different file for the blockchain
         coin_store_2 = await CoinStore.create(db_wrapper_2)
@@ -59,6 +65,26 @@ class TestBlockStore:
                 assert block == await store.get_full_block(block.header_hash)
                 assert block == await store.get_full_block(block.header_hash)
                 assert block_record == (await store.get_block_record(block_record_hh))
+                block_view = await store.get_full_block_view(block.header_hash)
+                assert block_view is not None
+                assert block_view.header_hash == block.header_hash
+                assert block_view.height == block.height
+                assert block_view.is_transaction_block() == block.is_transaction_block()
+                assert block_view.to_full_block() == block
+                assert block_view.bytes_without_transactions_generator() == bytes(
+                    dataclasses.replace(block, transactions_generator=None)
+                )
+                assert get_block_header(block_view, [], []) == get_block_header(block, [], [])
+                assert await store.get_generator(block.header_hash) == block.transactions_generator
+                store.rollback_cache_block(block.header_hash)
+                assert await store.get_generator(block.header_hash) == block.transactions_generator
+                # The blockchain stores the coins of each transaction block it adds
+                coin_changes = await store_2.get_coin_changes(block.header_hash)
+                if block.is_transaction_block():
+                    assert coin_changes == BlockCoinChanges([], [])
+                else:
+                    assert coin_changes is None
+                assert await store.get_coin_changes(block.header_hash) is None
                 await store.set_peak(block_record.header_hash)
                 await store.set_peak(block_record.header_hash)
 
@@ -70,6 +96,14 @@ class TestBlockStore:
             block_record_records = await store.get_block_records_in_range(0, 0xFFFFFFFF)
             assert len(block_record_records) == len(blocks)
 
+            # Coin changes of the blocks below the given height are pruned
+            for block in blocks:
+                await store.add_coin_changes(block.header_hash, block.height, BlockCoinChanges([], []))
+            await store.prune_coin_changes(uint32(5))
+            for block in blocks:
+                coin_changes = await store.get_coin_changes(block.header_hash)
+                assert (coin_changes is None) == (block.height < 5)
+
         except Exception:
             await connection.close()
             await connection_2.close()
@@ -82,8 +116,9 @@ class TestBlockStore:
         db_filename.unlink()
         db_filename_2.unlink()
 
+    @pytest.mark.parametrize("db_version", [1, 2])
     @pytest.mark.asyncio
-    async def test_deadlock(self):
+    async def test_deadlock(self, db_version):
         """
         This test was added because the store was deadlocking in certain situations, when fetching and
         adding blocks repeatedly. The issue was patched.
@@ -99,8 +134,8 @@ class TestBlockStore:
 
         connection = await aiosqlite.connect(db_filename)
         connection_2 = await aiosqlite.connect(db_filename_2)
-        wrapper = DBWrapper(connection)
-        wrapper_2 = DBWrapper(connection_2)
+        wrapper = DBWrapper(connection, db_version)
+        wrapper_2 = DBWrapper(connection_2, db_version)
 
         store = await BlockStore.create(wrapper)
         coin_store_2 = await CoinStore.create(wrapper_2)
@@ -127,3 +162,63 @@ class TestBlockStore:
         await connection_2.close()
         db_filename.unlink()
         db_filename_2.unlink()
+
+    @pytest.mark.parametrize("db_version", [1, 2])
+    @pytest.mark.asyncio
+    async def test_compressed_blocks(self, db_version):
+        blocks = bt.get_consecutive_blocks(10)
+        db_filename = Path("blockchain_test.db")
+        db_filename_2 = Path("blockchain_test2.db")
+
+        if db_filename.exists():
+            db_filename.unlink()
+        if db_filename_2.exists():
+            db_filename_2.unlink()
+
+        connection = await aiosqlite.connect(db_filename)
+        connection_2 = await aiosqlite.connect(db_filename_2)
+        wrapper = DBWrapper(connection, db_version)
+        wrapper_2 = DBWrapper(connection_2, db_version)
+        try:
+            coin_store_2 = await CoinStore.create(wrapper_2)
+            store_2 = await BlockStore.create(wrapper_2)
+            bc = await Blockchain.create(coin_store_2, store_2, test_constants)
+
+            # The first half of the blocks is stored uncompressed
+            store = await BlockStore.create(wrapper)
+            for block in blocks[:5]:
+                await bc.receive_block(block)
+                await store.add_full_block(block.header_hash, block, bc.block_record(block.header_hash))
+
+            store = await BlockStore.create(wrapper, compress_blocks=True)
+            for block in blocks[5:]:
+                await bc.receive_block(block)
+                await store.add_full_block(block.header_hash, block, bc.block_record(block.header_hash))
+            report = await store.get_compression_report()
+            assert report["blocks"] == {FORMAT_RAW: 5, FORMAT_ZLIB: 5}
+
+            # Recompressing with a dictionary re-encodes all of them
+            await store.train_compression_dict()
+            rowid, recompressed = await store.recompress_blocks(0, 4)
+            assert recompressed == 4
+            rowid, recompressed = await store.recompress_blocks(rowid, 100)
+            assert recompressed == 6
+            assert await store.recompress_blocks(rowid, 100) == (rowid, 0)
+            report = await store.get_compression_report()
+            assert report["blocks"] == {FORMAT_ZLIB_DICT: 10}
+            assert report["stored_bytes"][FORMAT_ZLIB_DICT] < sum(len(bytes(block)) for block in blocks)
+
+            # Blocks read back the same, also from a store that doesn't compress new blocks
+            store = await BlockStore.create(wrapper)
+            for block in blocks:
+                assert await store.get_full_block(block.header_hash) == block
+                assert await store.get_full_block_bytes(block.header_hash) == bytes(block)
+                assert await store.get_generator(block.header_hash) == block.transactions_generator
+            views = await store.get_block_views_by_hash([block.header_hash for block in blocks])
+            assert [view.to_full_block() for view in views] == blocks
+            assert await store.get_full_blocks_at([uint32(0)]) == [blocks[0]]
+        finally:
+            await connection.close()
+            await connection_2.close()
+            db_filename.unlink()
+            db_filename_2.unlink()
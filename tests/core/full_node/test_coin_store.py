@@ -17,6 +17,7 @@ from chia.types.coin_record import CoinRecord
 from chia.types.full_block import FullBlock
 from chia.types.generator_types import BlockGenerator
 from chia.util.generator_tools import tx_removals_and_additions
+from chia.util.hash import std_hash
 from chia.util.ints import uint64, uint32
 from tests.wallet_tools import WalletTool
 from chia.util.db_wrapper import DBWrapper
@@ -55,8 +56,9 @@ def get_future_reward_coins(block: FullBlock) -> Tuple[Coin, Coin]:
 
 
 class TestCoinStore:
+    @pytest.mark.parametrize("db_version", [1, 2])
     @pytest.mark.asyncio
-    async def test_basic_coin_store(self):
+    async def test_basic_coin_store(self, db_version):
         wallet_a = WALLET_A
         reward_ph = wallet_a.get_new_puzzlehash()
 
@@ -82,7 +84,7 @@ class TestCoinStore:
             if db_path.exists():
                 db_path.unlink()
             connection = await aiosqlite.connect(db_path)
-            db_wrapper = DBWrapper(connection)
+            db_wrapper = DBWrapper(connection, db_version)
             coin_store = await CoinStore.create(db_wrapper, cache_size=uint32(cache_size))
 
             blocks = bt.get_consecutive_blocks(
@@ -115,7 +117,8 @@ class TestCoinStore:
 
                     assert block.get_included_reward_coins() == should_be_included_prev
 
-                    await coin_store.new_block(block, tx_additions, tx_removals)
+                    rows_written = await coin_store.new_block(block, tx_additions, tx_removals)
+                    assert rows_written == len(tx_additions) + len(should_be_included_prev) + len(tx_removals)
 
                     if block.height != 0:
                         with pytest.raises(Exception):
@@ -143,8 +146,9 @@ class TestCoinStore:
             await connection.close()
             Path("fndb_test.db").unlink()
 
+    @pytest.mark.parametrize("db_version", [1, 2])
     @pytest.mark.asyncio
-    async def test_set_spent(self):
+    async def test_set_spent(self, db_version):
         blocks = bt.get_consecutive_blocks(9, [])
 
         for cache_size in [0, 10, 100000]:
@@ -152,7 +156,7 @@ class TestCoinStore:
             if db_path.exists():
                 db_path.unlink()
             connection = await aiosqlite.connect(db_path)
-            db_wrapper = DBWrapper(connection)
+            db_wrapper = DBWrapper(connection, db_version)
             coin_store = await CoinStore.create(db_wrapper, cache_size=uint32(cache_size))
 
             # Save/get block
@@ -164,9 +168,9 @@ class TestCoinStore:
                     records = [await coin_store.get_coin_record(coin.name()) for coin in coins]
 
                     for record in records:
-                        await coin_store._set_spent(record.coin.name(), block.height)
+                        await coin_store._set_spent_many([record.coin.name()], block.height)
                         with pytest.raises(AssertionError):
-                            await coin_store._set_spent(record.coin.name(), block.height)
+                            await coin_store._set_spent_many([record.coin.name()], block.height)
 
                     records = [await coin_store.get_coin_record(coin.name()) for coin in coins]
                     for record in records:
@@ -176,8 +180,9 @@ class TestCoinStore:
             await connection.close()
             Path("fndb_test.db").unlink()
 
+    @pytest.mark.parametrize("db_version", [1, 2])
     @pytest.mark.asyncio
-    async def test_rollback(self):
+    async def test_get_coin_records(self, db_version):
         blocks = bt.get_consecutive_blocks(20)
 
         for cache_size in [0, 10, 100000]:
@@ -185,7 +190,41 @@ class TestCoinStore:
             if db_path.exists():
                 db_path.unlink()
             connection = await aiosqlite.connect(db_path)
-            db_wrapper = DBWrapper(connection)
+            db_wrapper = DBWrapper(connection, db_version)
+            coin_store = await CoinStore.create(db_wrapper, cache_size=uint32(cache_size))
+
+            all_coins: List[Coin] = []
+            for block in blocks:
+                if block.is_transaction_block():
+                    await coin_store.new_block(block, [], [])
+                    all_coins += block.get_included_reward_coins()
+
+            # Mix cached and uncached coins, and include a coin that doesn't exist
+            await coin_store.get_coin_record(all_coins[0].name())
+            unknown_name = std_hash(b"unknown coin")
+            names = [coin.name() for coin in all_coins] + [unknown_name]
+            records = await coin_store.get_coin_records(names)
+            assert unknown_name not in records
+            assert len(records) == len(all_coins)
+            for coin in all_coins:
+                assert records[coin.name()] == await coin_store.get_coin_record(coin.name())
+
+            assert await coin_store.get_coin_records([]) == {}
+
+            await connection.close()
+            Path("fndb_test.db").unlink()
+
+    @pytest.mark.parametrize("db_version", [1, 2])
+    @pytest.mark.asyncio
+    async def test_rollback(self, db_version):
+        blocks = bt.get_consecutive_blocks(20)
+
+        for cache_size in [0, 10, 100000]:
+            db_path = Path("fndb_test.db")
+            if db_path.exists():
+                db_path.unlink()
+            connection = await aiosqlite.connect(db_path)
+            db_wrapper = DBWrapper(connection, db_version)
             coin_store = await CoinStore.create(db_wrapper, cache_size=uint32(cache_size))
 
             for block in blocks:
@@ -198,7 +237,7 @@ class TestCoinStore:
                     ]
 
                     for record in records:
-                        await coin_store._set_spent(record.coin.name(), block.height)
+                        await coin_store._set_spent_many([record.coin.name()], block.height)
 
                     records: List[Optional[CoinRecord]] = [
                         await coin_store.get_coin_record(coin.name()) for coin in coins
@@ -228,8 +267,9 @@ class TestCoinStore:
             await connection.close()
             Path("fndb_test.db").unlink()
 
+    @pytest.mark.parametrize("db_version", [1, 2])
     @pytest.mark.asyncio
-    async def test_basic_reorg(self):
+    async def test_basic_reorg(self, db_version):
         for cache_size in [0, 10, 100000]:
             initial_block_count = 30
             reorg_length = 15
@@ -238,7 +278,7 @@ class TestCoinStore:
             if db_path.exists():
                 db_path.unlink()
             connection = await aiosqlite.connect(db_path)
-            db_wrapper = DBWrapper(connection)
+            db_wrapper = DBWrapper(connection, db_version)
             coin_store = await CoinStore.create(db_wrapper, cache_size=uint32(cache_size))
             store = await BlockStore.create(db_wrapper)
             b: Blockchain = await Blockchain.create(coin_store, store, test_constants)
@@ -293,8 +333,9 @@ class TestCoinStore:
             Path("blockchain_test.db").unlink()
             b.shut_down()
 
+    @pytest.mark.parametrize("db_version", [1, 2])
     @pytest.mark.asyncio
-    async def test_get_puzzle_hash(self):
+    async def test_get_puzzle_hash(self, db_version):
         for cache_size in [0, 10, 100000]:
             num_blocks = 20
             farmer_ph = 32 * b"0"
@@ -309,7 +350,7 @@ class TestCoinStore:
             if db_path.exists():
                 db_path.unlink()
             connection = await aiosqlite.connect(db_path)
-            db_wrapper = DBWrapper(connection)
+            db_wrapper = DBWrapper(connection, db_version)
             coin_store = await CoinStore.create(db_wrapper, cache_size=uint32(cache_size))
             store = await BlockStore.create(db_wrapper)
             b: Blockchain = await Blockchain.create(coin_store, store, test_constants)
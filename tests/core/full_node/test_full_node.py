@@ -1094,6 +1094,12 @@ class TestFullNodeProtocol:
         assert fetched_blocks[-1].transactions_generator is not None
         assert std_hash(fetched_blocks[-1]) == std_hash(blocks_t[-1])
 
+        # The same range is served from the response cache
+        hits = full_node_1.full_node.response_cache.hits
+        res_2 = await full_node_1.request_blocks(fnp.RequestBlocks(uint32(peak_height - 5), uint32(peak_height), True))
+        assert res_2 is res
+        assert full_node_1.full_node.response_cache.hits == hits + 1
+
     @pytest.mark.asyncio
     async def test_new_unfinished_block(self, wallet_nodes):
         full_node_1, full_node_2, server_1, server_2, wallet_a, wallet_receiver = wallet_nodes
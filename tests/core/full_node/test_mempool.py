@@ -296,6 +296,83 @@ class TestMempoolManager:
         self.assert_sb_not_in_pool(full_node_1, sb12)
         self.assert_sb_not_in_pool(full_node_1, sb3)
 
+    @pytest.mark.asyncio
+    async def test_new_peak_updates_mempool_incrementally(self, two_nodes):
+        reward_ph = WALLET_A.get_new_puzzlehash()
+
+        full_node_1, full_node_2, server_1, server_2 = two_nodes
+        blocks = await full_node_1.get_all_full_blocks()
+        start_height = blocks[-1].height
+        # Two transaction blocks in a row, the last one includes the rewards of the one before
+        for num_blocks in [3, 1]:
+            blocks = bt.get_consecutive_blocks(
+                num_blocks,
+                block_list_input=blocks,
+                guarantee_transaction_block=True,
+                farmer_reward_puzzle_hash=reward_ph,
+                pool_reward_puzzle_hash=reward_ph,
+            )
+        peer = await connect_and_get_peer(server_1, server_2)
+
+        for block in blocks:
+            await full_node_1.full_node.respond_block(full_node_protocol.RespondBlock(block))
+        await time_out_assert(60, node_height_at_least, True, full_node_1, start_height + 4)
+
+        coins = iter(blocks[-1].get_included_reward_coins())
+        coin1, coin2 = next(coins), next(coins)
+        coin3 = next(iter(blocks[-2].get_included_reward_coins()))
+        mempool_manager = full_node_1.full_node.mempool_manager
+
+        sb1 = await self.gen_and_send_sb(full_node_1, peer, coin1)
+        sb2 = await self.gen_and_send_sb(full_node_1, peer, coin2)
+        self.assert_sb_in_pool(full_node_1, sb1)
+        self.assert_sb_in_pool(full_node_1, sb2)
+        # sb3 is pending until the peak reaches its height lock
+        cvp = ConditionWithArgs(ConditionOpcode.ASSERT_HEIGHT_ABSOLUTE, [int_to_bytes(start_height + 6)])
+        sb3 = await self.gen_and_send_sb(full_node_1, peer, coin3, {ConditionOpcode.ASSERT_HEIGHT_ABSOLUTE: [cvp]})
+        self.assert_sb_not_in_pool(full_node_1, sb3)
+        assert mempool_manager.potential_lock_heights[sb3.name()] == start_height + 6
+
+        rebuilds = 0
+        rebuild_mempool = mempool_manager._rebuild_mempool
+
+        async def counting_rebuild_mempool():
+            nonlocal rebuilds
+            rebuilds += 1
+            return await rebuild_mempool()
+
+        mempool_manager._rebuild_mempool = counting_rebuild_mempool
+        try:
+            # The next transaction block spends coin1 in a conflicting way, and does not touch coin2
+            conflicting_sb = generate_test_spend_bundle(coin1, new_puzzle_hash=BURN_PUZZLE_HASH_2)
+            blocks = bt.get_consecutive_blocks(
+                1,
+                block_list_input=blocks,
+                guarantee_transaction_block=True,
+                transaction_data=conflicting_sb,
+            )
+            await full_node_1.full_node.respond_block(full_node_protocol.RespondBlock(blocks[-1]))
+            await time_out_assert(60, node_height_at_least, True, full_node_1, start_height + 5)
+
+            self.assert_sb_not_in_pool(full_node_1, sb1)
+            self.assert_sb_in_pool(full_node_1, sb2)
+            self.assert_sb_not_in_pool(full_node_1, sb3)
+            assert not mempool_manager.seen(sb1.name())
+            assert coin1.name() not in mempool_manager.mempool.removals
+            assert sb3.name() in mempool_manager.potential_txs
+
+            # At the height of its lock, sb3 is retried and enters the mempool
+            blocks = bt.get_consecutive_blocks(1, block_list_input=blocks, guarantee_transaction_block=True)
+            await full_node_1.full_node.respond_block(full_node_protocol.RespondBlock(blocks[-1]))
+            await time_out_assert(60, node_height_at_least, True, full_node_1, start_height + 6)
+
+            self.assert_sb_in_pool(full_node_1, sb2)
+            self.assert_sb_in_pool(full_node_1, sb3)
+            assert sb3.name() not in mempool_manager.potential_lock_heights
+            assert rebuilds == 0
+        finally:
+            mempool_manager._rebuild_mempool = rebuild_mempool
+
     async def condition_tester(
         self,
         two_nodes,
@@ -6,9 +6,18 @@ import time
 import pytest
 import logging
 
+from blspy import G2Element
+
+from chia.consensus.cost_calculator import NPCResult
+from chia.full_node.mempool import Mempool
 from chia.protocols import full_node_protocol
+from chia.types.blockchain_format.coin import Coin
+from chia.types.blockchain_format.program import SerializedProgram
+from chia.types.mempool_item import MempoolItem
 from chia.types.peer_info import PeerInfo
-from chia.util.ints import uint16
+from chia.types.spend_bundle import SpendBundle
+from chia.util.hash import std_hash
+from chia.util.ints import uint16, uint64
 from chia.wallet.transaction_record import TransactionRecord
 from tests.connection_utils import connect_and_get_peer
 from tests.setup_nodes import bt, self_hostname, setup_simulators_and_wallets
@@ -28,6 +37,24 @@ def wallet_height_at_least(wallet_node, h):
 log = logging.getLogger(__name__)
 
 
+def make_mempool_item(index: int, coins_per_item: int) -> MempoolItem:
+    removals = [
+        Coin(std_hash(b"parent" + bytes([i]) + index.to_bytes(4, "big")), std_hash(b"ph"), uint64(1000))
+        for i in range(coins_per_item)
+    ]
+    additions = [Coin(coin.name(), std_hash(b"ph"), uint64(999)) for coin in removals]
+    return MempoolItem(
+        SpendBundle([], G2Element()),
+        uint64(coins_per_item),
+        NPCResult(None, [], uint64(0)),
+        uint64(1000 + index),
+        std_hash(b"item" + index.to_bytes(4, "big")),
+        additions,
+        removals,
+        SerializedProgram.from_bytes(b"\x80"),
+    )
+
+
 @pytest.fixture(scope="session")
 def event_loop():
     loop = asyncio.get_event_loop()
@@ -35,6 +62,31 @@ def event_loop():
 
 
 class TestMempoolPerformance:
+    def test_mempool_eviction_performance(self):
+        num_items = 5000
+        coins_per_item = 10
+        items = [make_mempool_item(i, coins_per_item) for i in range(num_items)]
+        mempool = Mempool(10 ** 15)
+        for item in items:
+            mempool.add_to_pool(item)
+        assert len(mempool.removals) == num_items * coins_per_item
+        # The coin names are computed once, and kept on the item
+        assert items[0].removal_names is items[0].removal_names
+        assert items[0].addition_names == [coin.name() for coin in items[0].additions]
+        assert items[0] == make_mempool_item(0, coins_per_item)
+
+        start_t = time.time()
+        for item in items:
+            mempool.remove_from_pool(item)
+        duration = time.time() - start_t
+        log.info(f"Evicted {num_items} items with {coins_per_item} coins each in {duration:.3f}s")
+
+        assert len(mempool.spends) == 0
+        assert len(mempool.removals) == 0
+        assert len(mempool.additions) == 0
+        assert mempool.total_mempool_cost == 0
+        assert duration < 2
+
     @pytest.fixture(scope="module")
     async def wallet_nodes(self):
         key_seed = bt.farmer_master_sk_entropy
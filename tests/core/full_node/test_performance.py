@@ -4,7 +4,8 @@ import dataclasses
 import logging
 import random
 import time
-from typing import Dict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator
 
 import pytest
 import cProfile
@@ -12,13 +13,19 @@ import cProfile
 from chia.consensus.block_record import BlockRecord
 from chia.full_node.full_node_api import FullNodeAPI
 from chia.protocols import full_node_protocol as fnp
+from chia.server.outbound_message import Message
+from chia.types.blockchain_format.coin import Coin
+from chia.types.blockchain_format.foliage import Foliage
 from chia.types.condition_opcodes import ConditionOpcode
 from chia.types.condition_with_args import ConditionWithArgs
+from chia.types.full_block import FullBlock
+from chia.types.spend_bundle import SpendBundle
 from chia.types.unfinished_block import UnfinishedBlock
 from chia.util.clvm import int_to_bytes
 from chia.util.ints import uint64
 from tests.wallet_tools import WalletTool
 from tests.core.fixtures import empty_blockchain  # noqa: F401
+from tests.core.fixtures import default_400_blocks  # noqa: F401
 
 from tests.connection_utils import add_dummy_connection, connect_and_get_peer
 from tests.core.full_node.test_coin_store import get_future_reward_coins
@@ -29,6 +36,36 @@ from tests.time_out_assert import time_out_assert, time_out_assert_custom_interv
 
 log = logging.getLogger(__name__)
 
+# Classes decorated with memoize_bytes_and_hash
+MEMOIZED_CLASSES = [Coin, Foliage, SpendBundle, Message]
+
+
+@contextmanager
+def count_memoization() -> Iterator[Dict[str, int]]:
+    """
+    Counts the calls to the memoized __bytes__ and get_hash of MEMOIZED_CLASSES that returned a cached value (hits),
+    and those that computed it. The counting wrappers are only installed here, so they cost nothing elsewhere.
+    """
+    stats = {"bytes_hits": 0, "bytes_computed": 0, "hash_hits": 0, "hash_computed": 0}
+
+    def counting(method: Callable, cached_attr: str, prefix: str) -> Callable:
+        def wrapper(self: Any) -> Any:
+            stats[prefix + ("_hits" if cached_attr in self.__dict__ else "_computed")] += 1
+            return method(self)
+
+        return wrapper
+
+    originals = [(cls, cls.__bytes__, cls.get_hash) for cls in MEMOIZED_CLASSES]
+    for cls, memoized_bytes, memoized_hash in originals:
+        cls.__bytes__ = counting(memoized_bytes, "_cached_bytes", "bytes")
+        cls.get_hash = counting(memoized_hash, "_cached_hash", "hash")
+    try:
+        yield stats
+    finally:
+        for cls, memoized_bytes, memoized_hash in originals:
+            cls.__bytes__ = memoized_bytes
+            cls.get_hash = memoized_hash
+
 
 async def get_block_path(full_node: FullNodeAPI):
     blocks_list = [await full_node.full_node.blockchain.get_full_peak()]
@@ -213,3 +250,22 @@ class TestPerformance:
 
         pr.create_stats()
         pr.dump_stats("./full-block-benchmark.pstats")
+
+    @pytest.mark.asyncio
+    async def test_sync_memoization(self, empty_blockchain, default_400_blocks):
+        b = empty_blockchain
+        # Copies of the blocks, so no hash was memoized by other tests
+        blocks = [FullBlock.from_bytes(bytes(block)) for block in default_400_blocks]
+
+        with count_memoization() as stats:
+            start = time.time()
+            for block in blocks:
+                result, err, _ = await b.receive_block(block)
+                assert err is None
+            log.warning(f"Time for receiving {len(blocks)} blocks: {time.time() - start}")
+
+        log.warning(
+            f"Hashes: {stats['hash_hits']} reused, {stats['hash_computed']} computed. "
+            f"Bytes: {stats['bytes_hits']} reused, {stats['bytes_computed']} computed"
+        )
+        assert stats["hash_hits"] > 0
@@ -0,0 +1,53 @@
+from chia.full_node.response_cache import ResponseCache
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.server.outbound_message import make_msg
+from chia.types.blockchain_format.sized_bytes import bytes32
+
+
+def blocks_key(start: int, end: int):
+    return (ProtocolMessageTypes.respond_blocks, start, end, True)
+
+
+class TestResponseCache:
+    def test_get_put(self):
+        cache = ResponseCache(max_bytes=1000)
+        hash_1 = bytes32([1] * 32)
+        hash_2 = bytes32([2] * 32)
+        message = make_msg(ProtocolMessageTypes.respond_blocks, bytes(400))
+        cache.put(blocks_key(0, 31), hash_1, message)
+        assert cache.get(blocks_key(0, 31), hash_1) is message
+        assert cache.get((ProtocolMessageTypes.respond_blocks, 0, 31, False), hash_1) is None
+        # The last block of the range was reorged out
+        assert cache.get(blocks_key(0, 31), hash_2) is None
+        assert cache.hits == 1
+        assert cache.misses == 2
+
+        # The least recently used responses are evicted
+        cache.put(blocks_key(32, 63), hash_1, message)
+        assert cache.get(blocks_key(0, 31), hash_1) is message
+        cache.put(blocks_key(64, 95), hash_1, message)
+        assert cache.size == 800
+        assert cache.get(blocks_key(32, 63), hash_1) is None
+        assert cache.get(blocks_key(0, 31), hash_1) is message
+
+        # Responses larger than the cache are not kept
+        cache.put(blocks_key(96, 127), hash_1, make_msg(ProtocolMessageTypes.respond_blocks, bytes(1001)))
+        assert cache.get(blocks_key(96, 127), hash_1) is None
+        assert cache.size == 800
+
+    def test_invalidate(self):
+        cache = ResponseCache()
+        hash_1 = bytes32([1] * 32)
+        message = make_msg(ProtocolMessageTypes.respond_blocks, bytes(10))
+        for start in range(0, 128, 32):
+            cache.put(blocks_key(start, start + 31), hash_1, message)
+
+        cache.invalidate_height(40)
+        assert cache.get(blocks_key(32, 63), hash_1) is None
+        assert cache.get(blocks_key(64, 95), hash_1) is message
+
+        cache.invalidate_from(70)
+        assert cache.get(blocks_key(64, 95), hash_1) is None
+        assert cache.get(blocks_key(96, 127), hash_1) is None
+        assert cache.get(blocks_key(0, 31), hash_1) is message
+        assert cache.size == 10
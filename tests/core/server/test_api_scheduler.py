@@ -0,0 +1,73 @@
+from typing import List
+
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.server.api_scheduler import ApiCall, ApiScheduler
+from chia.server.outbound_message import make_msg
+from chia.types.blockchain_format.sized_bytes import bytes32
+
+
+class FakeConnection:
+    def __init__(self, peer_node_id: bytes32):
+        self.peer_node_id = peer_node_id
+
+
+class TestApiScheduler:
+    def test_limits(self):
+        started: List[ApiCall] = []
+        scheduler = ApiScheduler(started.append, max_tasks=4, max_tasks_per_peer=2, max_queued_per_peer=3)
+        peer_1 = FakeConnection(bytes32([1] * 32))
+        peer_2 = FakeConnection(bytes32([2] * 32))
+        message = make_msg(ProtocolMessageTypes.request_blocks, bytes(10))
+
+        # A peer can only run max_tasks_per_peer handlers, and queue max_queued_per_peer messages
+        for _ in range(5):
+            assert scheduler.add(message, peer_1, False)
+        assert not scheduler.add(message, peer_1, False)
+        assert scheduler.add(message, peer_1, True)
+        assert len(started) == 2
+        stats = scheduler.get_stats()
+        assert stats["running"] == 2
+        assert stats["queued"] == 4
+        assert stats["message_types"]["request_blocks"]["dropped"] == 1
+
+        # Other peers still get handlers, up to max_tasks
+        for _ in range(3):
+            assert scheduler.add(message, peer_2, False)
+        assert [call.connection for call in started] == [peer_1, peer_1, peer_2, peer_2]
+
+        # The execute_task message is in a higher class, and goes first
+        scheduler.task_done(started[0])
+        assert len(started) == 5
+        assert started[-1].connection is peer_1 and started[-1].execute_task
+
+        # When a peer disconnects, its waiting messages are dropped
+        scheduler.remove_peer(peer_1.peer_node_id)
+        assert scheduler.get_stats()["queued"] == 1
+        for call in started[1:5]:
+            scheduler.task_done(call)
+        assert len(started) == 6
+        scheduler.task_done(started[5])
+        stats = scheduler.get_stats()
+        assert stats["running"] == 0
+        assert stats["queued"] == 0
+        assert stats["message_types"]["request_blocks"]["handled"] == 6
+        assert stats["message_types"]["request_blocks"]["queued"] == 0
+
+    def test_fair_queuing(self):
+        started: List[ApiCall] = []
+        scheduler = ApiScheduler(started.append, max_tasks=1, max_tasks_per_peer=1)
+        flooder = FakeConnection(bytes32([1] * 32))
+        farmer = FakeConnection(bytes32([2] * 32))
+        transaction = make_msg(ProtocolMessageTypes.respond_transaction, bytes(10))
+        signage_point = make_msg(ProtocolMessageTypes.new_signage_point, bytes(10))
+
+        for _ in range(20):
+            scheduler.add(transaction, flooder, False)
+        scheduler.add(signage_point, farmer, False)
+        scheduler.add(signage_point, farmer, False)
+        while len(started) < 21:
+            scheduler.task_done(started[-1])
+
+        # The signage points don't wait behind the transactions queued before them
+        order = [call.connection for call in started]
+        assert order[:4] == [flooder, farmer, farmer, flooder]
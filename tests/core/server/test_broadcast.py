@@ -0,0 +1,38 @@
+from typing import List
+
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.server.outbound_message import Message, make_msg
+from chia.server.server import broadcast
+
+
+class FakeConnection:
+    def __init__(self, closed: bool):
+        self.closed = closed
+        self.queued: List[Message] = []
+
+    def send_messages_nowait(self, messages: List[Message]) -> bool:
+        if self.closed:
+            return False
+        self.queued.extend(messages)
+        return True
+
+
+class TestBroadcast:
+    def test_broadcast(self):
+        messages = [
+            make_msg(ProtocolMessageTypes.new_peak, bytes([1] * 100)),
+            make_msg(ProtocolMessageTypes.new_transaction, bytes([2] * 50)),
+        ]
+        connections = [FakeConnection(closed=i % 5 == 0) for i in range(20)]
+
+        stats = broadcast(messages, connections)
+        assert stats.delivered == 16
+        assert stats.skipped == 4
+
+        # The connections send the bytes serialized by the broadcast
+        serialized = [message.__dict__["_cached_bytes"] for message in messages]
+        assert stats.message_bytes == sum(len(data) for data in serialized)
+        for connection in connections:
+            assert connection.queued == ([] if connection.closed else messages)
+            for message, data in zip(connection.queued, serialized):
+                assert bytes(message) is data
@@ -45,7 +45,7 @@ async def setup_two_nodes():
 
 
 class FakeRateLimiter:
-    def process_msg_and_check(self, msg):
+    def process_msg_and_check(self, msg, wire_size=None):
         return True
 
 
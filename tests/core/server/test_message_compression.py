@@ -0,0 +1,64 @@
+import zlib
+
+import pytest
+
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.protocols.shared_protocol import Capability
+from chia.server.message_compression import (
+    COMPRESSION_THRESHOLD,
+    FORMAT_RAW,
+    FORMAT_ZLIB,
+    compress_data,
+    decompress_data,
+    is_compressed_type,
+)
+from chia.server.rate_limits import rate_limits_other
+from chia.server.ws_connection import CAPABILITIES, has_capability
+from chia.util.ints import uint16
+
+
+class TestMessageCompression:
+    def test_capability(self):
+        assert has_capability(CAPABILITIES, Capability.MESSAGE_COMPRESSION)
+        assert not has_capability([(uint16(Capability.BASE.value), "1")], Capability.MESSAGE_COMPRESSION)
+
+    def test_compressed_types(self):
+        assert is_compressed_type(ProtocolMessageTypes.respond_blocks.value)
+        assert not is_compressed_type(ProtocolMessageTypes.new_peak.value)
+        assert not is_compressed_type(255)
+
+    def test_round_trip(self):
+        message_type = ProtocolMessageTypes.respond_blocks.value
+        small = bytes([1] * 100)
+        assert compress_data(small)[0] == FORMAT_RAW
+        assert decompress_data(message_type, compress_data(small)) == small
+
+        large = bytes([1, 2, 3, 4] * COMPRESSION_THRESHOLD)
+        compressed = compress_data(large)
+        assert compressed[0] == FORMAT_ZLIB
+        assert len(compressed) < len(large) // 10
+        assert decompress_data(message_type, compressed) == large
+
+        # Data that doesn't compress is sent as is
+        incompressible = zlib.compress(large, 9) * 2
+        assert compress_data(incompressible)[0] == FORMAT_RAW
+
+    def test_invalid_data(self):
+        message_type = ProtocolMessageTypes.respond_header_blocks
+        with pytest.raises(ValueError):
+            decompress_data(message_type.value, b"")
+        with pytest.raises(ValueError):
+            decompress_data(message_type.value, bytes([7]) + bytes(100))
+        with pytest.raises(ValueError):
+            decompress_data(message_type.value, bytes([FORMAT_ZLIB]) + bytes(100))
+        with pytest.raises(ValueError):
+            decompress_data(message_type.value, compress_data(bytes(COMPRESSION_THRESHOLD))[:-4])
+
+        # Data can't expand past the size the rate limits allow for its type
+        max_size = rate_limits_other[message_type].max_size
+        bomb = bytes([FORMAT_ZLIB]) + zlib.compress(bytes(max_size + 1))
+        with pytest.raises(ValueError):
+            decompress_data(message_type.value, bomb)
+        assert (
+            len(decompress_data(message_type.value, bytes([FORMAT_ZLIB]) + zlib.compress(bytes(max_size)))) == max_size
+        )
@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+
+from chia.protocols.protocol_message_types import ProtocolMessageTypes
+from chia.server.outbound_message import make_msg
+from chia.server.outgoing_queue import OutgoingQueue, Priority, message_priority
+
+
+@pytest.fixture(scope="module")
+def event_loop():
+    loop = asyncio.get_event_loop()
+    yield loop
+
+
+class TestOutgoingQueue:
+    def test_priorities(self):
+        assert message_priority(ProtocolMessageTypes.new_peak.value) is Priority.HIGH
+        assert message_priority(ProtocolMessageTypes.respond_blocks.value) is Priority.NORMAL
+        assert message_priority(ProtocolMessageTypes.new_transaction.value) is Priority.LOW
+        assert message_priority(255) is Priority.NORMAL
+
+    @pytest.mark.asyncio
+    async def test_order(self):
+        queue = OutgoingQueue()
+        transactions = [make_msg(ProtocolMessageTypes.new_transaction, bytes([i])) for i in range(3)]
+        blocks = [make_msg(ProtocolMessageTypes.request_blocks, bytes([i])) for i in range(2)]
+        peak = make_msg(ProtocolMessageTypes.new_peak, bytes(10))
+        for message in transactions + blocks + [peak]:
+            assert queue.put(message)
+        assert len(queue) == 6
+        assert [await queue.get() for _ in range(6)] == [peak] + blocks + transactions
+        assert queue.queued_bytes == 0
+
+    @pytest.mark.asyncio
+    async def test_bounded(self):
+        queue = OutgoingQueue(max_bytes=1000)
+        transactions = [make_msg(ProtocolMessageTypes.new_transaction, bytes(400)) for _ in range(2)]
+        for message in transactions:
+            assert queue.put(message)
+        assert not queue.put(make_msg(ProtocolMessageTypes.new_transaction, bytes(400)))
+        assert queue.dropped == 1
+
+        # Queued transactions make room for more important messages
+        peak = make_msg(ProtocolMessageTypes.new_peak, bytes(500))
+        assert queue.put(peak)
+        assert queue.dropped == 2
+        assert queue.queued_bytes == 900
+
+        # Nothing else can make room
+        assert not queue.put(make_msg(ProtocolMessageTypes.respond_block, bytes(600)))
+        assert queue.dropped == 4
+        assert await queue.get() == peak
+        assert len(queue) == 0
+
+        # A large message is accepted when nothing else is queued
+        assert queue.put(make_msg(ProtocolMessageTypes.respond_blocks, bytes(2000)))
+
+    @pytest.mark.asyncio
+    async def test_delayed(self):
+        queue = OutgoingQueue()
+        delayed = make_msg(ProtocolMessageTypes.respond_blocks, bytes(10))
+        message = make_msg(ProtocolMessageTypes.respond_blocks, bytes(20))
+        queue.put_delayed(delayed, 0.5)
+        assert queue.put(message)
+        start = time.monotonic()
+        assert await queue.get() == message
+        assert await queue.get() == delayed
+        assert time.monotonic() - start >= 0.5
+
+        # The delayed message goes ahead of messages of the same priority queued after it
+        queue.put_delayed(delayed, 0.1)
+        await asyncio.sleep(0.2)
+        assert queue.put(message)
+        assert await queue.get() == delayed
+        assert await queue.get() == message
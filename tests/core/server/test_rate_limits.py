@@ -126,6 +126,15 @@ class TestRateLimits:
                 saw_disconnect = True
         assert saw_disconnect
 
+        # The aggregate size limit counts the size on the wire of compressed messages
+        r = RateLimiter(incoming=True)
+        for i in range(4):
+            assert r.process_msg_and_check(message_5, 1024 * 1024)
+        r = RateLimiter(incoming=True)
+        for i in range(2):
+            assert r.process_msg_and_check(message_5)
+        assert not r.process_msg_and_check(message_5)
+
     @pytest.mark.asyncio
     async def test_periodic_reset(self):
         r = RateLimiter(True, 5)
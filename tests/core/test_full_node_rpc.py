@@ -189,6 +189,14 @@ class TestRpc:
 
             await client.close_connection(connections[0]["node_id"])
             await time_out_assert(10, num_connections, 0)
+
+            api_task_stats = await client.get_api_task_stats()
+            assert api_task_stats["queued"] == 0
+            for message_type_stats in api_task_stats["message_types"].values():
+                assert message_type_stats["queued"] == 0
+
+            weight_proof_stats = await client.get_weight_proof_stats()
+            assert weight_proof_stats == full_node_api_1.full_node.weight_proof_handler.stats
         finally:
             # Checks that the RPC manages to stop the node
             client.close()
@@ -44,3 +44,20 @@ class TestMerkleSet:
 
         # Test if the order of adding items changes the outcome
         assert merkle_set.get_root() == merkle_set_reverse.get_root()
+
+    @pytest.mark.asyncio
+    async def test_from_already_hashed(self):
+        blocks = bt.get_consecutive_blocks(20)
+        coins = list(itertools.chain.from_iterable(map(lambda block: block.get_included_reward_coins(), blocks)))
+        excl_coin = coins.pop()
+
+        merkle_set = MerkleSet()
+        for coin in coins:
+            merkle_set.add_already_hashed(coin.name())
+        # Duplicates are ignored, like when adding one at a time
+        batch_merkle_set = MerkleSet.from_already_hashed([coin.name() for coin in coins + coins[:3]])
+
+        assert batch_merkle_set.get_root() == merkle_set.get_root()
+        for name in [coin.name() for coin in coins] + [excl_coin.name()]:
+            assert batch_merkle_set.is_included_already_hashed(name) == merkle_set.is_included_already_hashed(name)
+        assert MerkleSet.from_already_hashed([]).get_root() == MerkleSet().get_root()
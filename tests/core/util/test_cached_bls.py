@@ -0,0 +1,39 @@
+import unittest
+
+from blspy import AugSchemeMPL, G1Element
+
+from chia.util import cached_bls
+from chia.util.lru_cache import LRUCache
+
+
+class TestCachedBLS(unittest.TestCase):
+    def test_cached_bls(self):
+        n_keys = 10
+        seed = b"a" * 31
+        sks = [AugSchemeMPL.key_gen(seed + bytes([i])) for i in range(n_keys)]
+        pks = [sk.get_g1() for sk in sks]
+        msgs = [("msg-%d" % (i,)).encode() for i in range(n_keys)]
+        sigs = [AugSchemeMPL.sign(sk, msg) for sk, msg in zip(sks, msgs)]
+        agg_sig = AugSchemeMPL.aggregate(sigs)
+
+        cache = LRUCache(n_keys)
+        # Nothing is cached, so the signature is verified directly
+        assert cached_bls.aggregate_verify(pks, msgs, agg_sig, cache=cache)
+        assert len(cache.cache) == 0
+
+        # Verifying half of the signatures with force_cache caches their pairings
+        assert cached_bls.aggregate_verify(
+            pks[: n_keys // 2], msgs[: n_keys // 2], AugSchemeMPL.aggregate(sigs[: n_keys // 2]), True, cache
+        )
+        assert len(cache.cache) == n_keys // 2
+
+        # Now half of the pairings are cached, and the rest are computed and cached
+        assert cached_bls.aggregate_verify(pks, msgs, agg_sig, cache=cache)
+        assert len(cache.cache) == n_keys
+        assert not cached_bls.aggregate_verify(pks, msgs, AugSchemeMPL.aggregate(sigs[1:]), cache=cache)
+        assert not cached_bls.aggregate_verify(pks[1:] + [G1Element.generator()], msgs, agg_sig, cache=cache)
+
+        cached_bls.evict_pairings(pks[:2], msgs[:2], cache)
+        assert len(cache.cache) == n_keys - 2
+        cached_bls.evict_pairings(pks[:2], msgs[:2], cache)
+        assert len(cache.cache) == n_keys - 2
@@ -15,6 +15,7 @@ from chia.types.weight_proof import SubEpochChallengeSegment
 from chia.util.ints import uint8, uint32
 from chia.util.streamable import (
     Streamable,
+    memoize_bytes_and_hash,
     streamable,
     parse_bool,
     parse_optional,
@@ -66,6 +67,36 @@ class TestStreamable(unittest.TestCase):
         except NotImplementedError:
             pass
 
+    def test_compiled_stream_matches_generic_stream(self):
+        @dataclass(frozen=True)
+        @streamable
+        class TestClassInner(Streamable):
+            a: Optional[bytes32]
+            b: bool
+
+        @dataclass(frozen=True)
+        @streamable
+        class TestClassOuter(Streamable):
+            a: uint32
+            b: List[Optional[TestClassInner]]
+            c: Tuple[uint8, str, bytes]
+            d: Optional[List[uint32]]
+
+        inner = TestClassInner(bytes32([3] * 32), True)
+        outer = TestClassOuter(uint32(5), [inner, None, TestClassInner(None, False)], (uint8(1), "hi", b"x"), None)
+
+        def generic_bytes(obj: Streamable) -> bytes:
+            f = io.BytesIO()
+            for f_name, f_type in obj.__annotations__.items():
+                obj.stream_one_item(f_type, getattr(obj, f_name), f)
+            return f.getvalue()
+
+        assert bytes(outer) == generic_bytes(outer)
+        assert TestClassOuter.from_bytes(bytes(outer)) == outer
+
+        block = bt.create_genesis_block(test_constants, bytes([0] * 32), b"0")
+        assert bytes(block) == generic_bytes(block)
+
     def test_json(self):
         block = bt.create_genesis_block(test_constants, bytes([0] * 32), b"0")
 
@@ -343,6 +374,39 @@ class TestStreamable(unittest.TestCase):
         with raises(AssertionError):
             parse_str(io.BytesIO(b"\x00\x00\x02\x01" + b"a" * 512))
 
+    def test_memoize_bytes_and_hash(self):
+        calls = {"bytes": 0, "hash": 0}
+
+        @memoize_bytes_and_hash
+        @dataclass(frozen=True)
+        @streamable
+        class TestClassMemoized(Streamable):
+            a: uint32
+            b: List[uint32]
+
+            def __bytes__(self):
+                calls["bytes"] += 1
+                return super().__bytes__()
+
+            def get_hash(self):
+                calls["hash"] += 1
+                return super().get_hash()
+
+        a = TestClassMemoized(uint32(1), [uint32(2)])
+        serialized = bytes(a)
+        assert bytes(a) is serialized
+        assert calls["bytes"] == 1
+        h = a.get_hash()
+        assert a.get_hash() is h
+        assert calls == {"bytes": 1, "hash": 1}
+
+        # The cached values are not part of equality or serialization
+        b = TestClassMemoized(uint32(1), [uint32(2)])
+        assert a == b
+        assert TestClassMemoized.from_bytes(serialized) == a
+        assert b.get_hash() == h
+        assert calls == {"bytes": 2, "hash": 2}
+
 
 if __name__ == "__main__":
     unittest.main()
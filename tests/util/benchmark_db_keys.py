@@ -0,0 +1,90 @@
+import asyncio
+import os
+import random
+import time
+from pathlib import Path
+from typing import List
+
+import aiosqlite
+
+from chia.cmds.db_upgrade_func import convert_v1_to_v2
+from chia.full_node.block_store import BlockStore
+from chia.full_node.coin_store import CoinStore
+from chia.types.blockchain_format.coin import Coin
+from chia.types.blockchain_format.sized_bytes import bytes32
+from chia.types.coin_record import CoinRecord
+from chia.util.db_wrapper import DBWrapper
+from chia.util.ints import uint32, uint64
+
+NUM_COINS = 200000
+NUM_LOOKUPS = 20000
+BLOCK_SIZE = 1000
+
+
+def rand_hash() -> bytes32:
+    return bytes32(random.getrandbits(256).to_bytes(32, "big"))
+
+
+async def make_v1_db(db_path: Path) -> List[bytes32]:
+    connection = await aiosqlite.connect(db_path)
+    db_wrapper = DBWrapper(connection, 1)
+    coin_store = await CoinStore.create(db_wrapper, cache_size=uint32(0))
+    # The block tables are empty, but the upgrade expects a complete full node database
+    await BlockStore.create(db_wrapper)
+    names: List[bytes32] = []
+    for height in range(NUM_COINS // BLOCK_SIZE):
+        records: List[CoinRecord] = []
+        for _ in range(BLOCK_SIZE):
+            coin = Coin(rand_hash(), rand_hash(), uint64(random.randint(1, 1000000)))
+            records.append(CoinRecord(coin, uint32(height), uint32(0), False, False, uint64(height)))
+            names.append(coin.name())
+        await coin_store._add_coin_records(records)
+        await connection.commit()
+    await connection.close()
+    return names
+
+
+async def time_lookups(db_path: Path, db_version: int, names: List[bytes32]) -> float:
+    connection = await aiosqlite.connect(db_path)
+    # No cache, so that every lookup hits the database
+    coin_store = await CoinStore.create(DBWrapper(connection, db_version), cache_size=uint32(0))
+    start = time.time()
+    for name in names:
+        record = await coin_store.get_coin_record(name)
+        assert record is not None
+    duration = time.time() - start
+    await connection.close()
+    return duration
+
+
+async def main() -> None:
+    random.seed(1337)
+    v1_path = Path("benchmark_db_keys_v1.sqlite")
+    v2_path = Path("benchmark_db_keys_v2.sqlite")
+    for path in [v1_path, v2_path]:
+        if path.exists():
+            path.unlink()
+
+    print(f"creating a v1 database with {NUM_COINS} coins")
+    names = await make_v1_db(v1_path)
+
+    start = time.time()
+    convert_v1_to_v2(v1_path, v2_path)
+    print(f"upgrade took {time.time() - start:0.2f}s")
+
+    lookups = random.sample(names, NUM_LOOKUPS)
+    for db_version, path in [(1, v1_path), (2, v2_path)]:
+        # Opening the coin store creates the indices of the upgraded database, so sizes are compared afterwards
+        duration = await time_lookups(path, db_version, lookups)
+        size = os.path.getsize(path)
+        print(
+            f"v{db_version}: {size / 1024 / 1024:0.1f} MiB, "
+            f"{duration / NUM_LOOKUPS * 1000000:0.1f} us per coin record lookup"
+        )
+
+    v1_path.unlink()
+    v2_path.unlink()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
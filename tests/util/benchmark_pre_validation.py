@@ -0,0 +1,55 @@
+import asyncio
+import time
+from typing import List
+
+from chia.consensus.multiprocess_validation import pre_validate_blocks_multiprocessing
+from chia.types.full_block import FullBlock
+from tests.core.fixtures import block_format_version, create_blockchain, persistent_blocks
+from tests.setup_nodes import test_constants
+
+# The recorded range of the default_10000_blocks fixture
+NUM_BLOCKS = 10000
+# Blocks pre-validated per call, like a full node syncing in batches
+SYNC_BATCH = 32
+BATCH_SIZE = 4
+
+
+async def time_sync(blocks: List[FullBlock], shared_memory_transport: bool) -> float:
+    blockchain, connection, db_path = await create_blockchain(test_constants)
+    pre_validation_time = 0.0
+    for i in range(0, len(blocks), SYNC_BATCH):
+        blocks_to_validate = blocks[i : i + SYNC_BATCH]
+        start = time.time()
+        results = await pre_validate_blocks_multiprocessing(
+            blockchain.constants,
+            blockchain.constants_json,
+            blockchain,
+            blocks_to_validate,
+            blockchain.pool,
+            True,
+            {},
+            blockchain.get_block_generator,
+            BATCH_SIZE,
+            shared_memory_transport=shared_memory_transport,
+        )
+        pre_validation_time += time.time() - start
+        assert results is not None
+        for block, result in zip(blocks_to_validate, results):
+            _, err, _ = await blockchain.receive_block(block, result)
+            assert err is None
+    await connection.close()
+    blockchain.shut_down()
+    db_path.unlink()
+    return pre_validation_time
+
+
+async def main() -> None:
+    blocks = persistent_blocks(NUM_BLOCKS, f"test_blocks_{NUM_BLOCKS}_{block_format_version}.db")
+    for shared_memory_transport in [False, True]:
+        duration = await time_sync(blocks, shared_memory_transport)
+        transport = "shared memory" if shared_memory_transport else "pickled"
+        print(f"{transport}: {duration:0.2f}s pre-validating {len(blocks)} blocks")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,38 @@
+import time
+
+from blspy import AugSchemeMPL
+
+from chia.util import cached_bls
+from chia.util.lru_cache import LRUCache
+
+# About the number of signatures in a full block of standard transactions
+NUM_SIGNATURES = 1000
+# Signatures per spend bundle, which are verified when they enter the mempool
+BUNDLE_SIZE = 2
+
+
+def main() -> None:
+    sks = [AugSchemeMPL.key_gen(i.to_bytes(32, "big")) for i in range(NUM_SIGNATURES)]
+    pks = [sk.get_g1() for sk in sks]
+    msgs = [i.to_bytes(32, "big") for i in range(NUM_SIGNATURES)]
+    sigs = [AugSchemeMPL.sign(sk, msg) for sk, msg in zip(sks, msgs)]
+    block_sig = AugSchemeMPL.aggregate(sigs)
+
+    start = time.time()
+    assert AugSchemeMPL.aggregate_verify(pks, msgs, block_sig)
+    print(f"Uncached block signature: {time.time() - start:0.3f}s")
+
+    cache = LRUCache(NUM_SIGNATURES)
+    start = time.time()
+    for i in range(0, NUM_SIGNATURES, BUNDLE_SIZE):
+        j = i + BUNDLE_SIZE
+        assert cached_bls.aggregate_verify(pks[i:j], msgs[i:j], AugSchemeMPL.aggregate(sigs[i:j]), True, cache)
+    print(f"Mempool admission of {NUM_SIGNATURES // BUNDLE_SIZE} spend bundles: {time.time() - start:0.3f}s")
+
+    start = time.time()
+    assert cached_bls.aggregate_verify(pks, msgs, block_sig, cache=cache)
+    print(f"Block signature of already seen transactions: {time.time() - start:0.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import io
+import time
+from typing import Any, Callable, List
+
+from chia.protocols.full_node_protocol import RespondBlocks
+from chia.types.full_block import FullBlock
+from chia.util.generator_tools import get_block_header
+from chia.util.ints import uint32
+from chia.util.streamable import PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS, Streamable
+from tests.setup_nodes import bt
+
+ITERATIONS = 200
+
+
+def generic_stream(obj: Streamable, f: io.BytesIO) -> None:
+    # Inspects the field types on every call, like Streamable.stream did before the codecs were compiled
+    for f_name, f_type in obj.__annotations__.items():
+        obj.stream_one_item(f_type, getattr(obj, f_name), f)
+
+
+def generic_bytes(obj: Streamable) -> bytes:
+    f = io.BytesIO()
+    generic_stream(obj, f)
+    return f.getvalue()
+
+
+def generic_parse(cls: Any, blob: bytes) -> Any:
+    # Builds the object from generator zips, like Streamable.parse did before
+    f = io.BytesIO(blob)
+    obj = object.__new__(cls)
+    fields = iter(getattr(cls, "__annotations__", {}))
+    values = (parse_f(f) for parse_f in PARSE_FUNCTIONS_FOR_STREAMABLE_CLASS[cls])
+    for field, value in zip(fields, values):
+        object.__setattr__(obj, field, value)
+    return obj
+
+
+def time_it(function: Callable[[], Any]) -> float:
+    start = time.time()
+    for _ in range(ITERATIONS):
+        function()
+    return time.time() - start
+
+
+def benchmark(name: str, objects: List[Streamable]) -> None:
+    cls = type(objects[0])
+    blobs = [bytes(obj) for obj in objects]
+    for obj, blob in zip(objects, blobs):
+        assert generic_bytes(obj) == blob
+        assert cls.from_bytes(blob) == obj
+
+    total_size = sum(len(blob) for blob in blobs)
+    generic_stream_time = time_it(lambda: [generic_bytes(obj) for obj in objects])
+    compiled_stream_time = time_it(lambda: [bytes(obj) for obj in objects])
+    generic_parse_time = time_it(lambda: [generic_parse(cls, blob) for blob in blobs])
+    compiled_parse_time = time_it(lambda: [cls.from_bytes(blob) for blob in blobs])
+
+    megabytes = total_size * ITERATIONS / 1024 / 1024
+    print(f"{name} ({len(objects)} objects, {total_size} bytes)")
+    print(
+        f"  stream: generic {megabytes / generic_stream_time:.2f} MB/s, "
+        f"compiled {megabytes / compiled_stream_time:.2f} MB/s, "
+        f"speedup {generic_stream_time / compiled_stream_time:.2f}x"
+    )
+    print(
+        f"  parse: generic {megabytes / generic_parse_time:.2f} MB/s, "
+        f"compiled {megabytes / compiled_parse_time:.2f} MB/s, "
+        f"speedup {generic_parse_time / compiled_parse_time:.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    """
+    Compares round trip throughput of the compiled streamable codecs with the generic, type-inspecting path.
+    """
+    blocks: List[FullBlock] = bt.get_consecutive_blocks(20, guarantee_transaction_block=True)
+    header_blocks = [get_block_header(block, [], []) for block in blocks]
+    benchmark("FullBlock", blocks)
+    benchmark("HeaderBlock", header_blocks)
+    benchmark("RespondBlocks", [RespondBlocks(uint32(0), uint32(len(blocks) - 1), blocks)])
+    benchmark("Foliage", [block.foliage for block in blocks])
+    benchmark("RewardChainBlock", [block.reward_chain_block for block in blocks])
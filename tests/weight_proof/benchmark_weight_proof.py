@@ -0,0 +1,44 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures.process import ProcessPoolExecutor
+
+from chia.full_node.weight_proof import WeightProofHandler
+from chia.util.block_cache import BlockCache
+from tests.core.fixtures import block_format_version, persistent_blocks
+from tests.setup_nodes import test_constants
+from tests.weight_proof.test_weight_proof import load_blocks_dont_validate
+
+# Validations timed per worker count
+NUM_RUNS = 3
+
+
+async def main() -> None:
+    blocks = persistent_blocks(10000, f"test_blocks_10000_{block_format_version}.db")
+    header_cache, height_to_hash, sub_blocks, summaries = await load_blocks_dont_validate(blocks)
+    wpf = WeightProofHandler(test_constants, BlockCache(sub_blocks, header_cache, height_to_hash, summaries))
+    wp = await wpf.get_proof_of_weight(blocks[-1].header_hash)
+    assert wp is not None
+
+    worker_counts = [1]
+    while worker_counts[-1] * 2 <= multiprocessing.cpu_count():
+        worker_counts.append(worker_counts[-1] * 2)
+    for num_workers in worker_counts:
+        executor = ProcessPoolExecutor(max_workers=num_workers)
+        wpf_not_synced = WeightProofHandler(
+            test_constants, BlockCache(sub_blocks, header_cache, height_to_hash, {}), executor
+        )
+        # Warm up the workers, so process startup isn't timed
+        valid, _, _ = await wpf_not_synced.validate_weight_proof(wp)
+        assert valid
+        start = time.time()
+        for _ in range(NUM_RUNS):
+            valid, _, _ = await wpf_not_synced.validate_weight_proof(wp)
+            assert valid
+        duration = (time.time() - start) / NUM_RUNS
+        print(f"{num_workers} workers: {duration:0.2f}s per weight proof validation")
+        executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
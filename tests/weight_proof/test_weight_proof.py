@@ -14,6 +14,7 @@ from chia.consensus.difficulty_adjustment import get_next_sub_slot_iters_and_dif
 from chia.consensus.full_block_to_block_record import block_to_block_record
 from chia.full_node.block_store import BlockStore
 from chia.full_node.coin_store import CoinStore
+from chia.protocols.full_node_protocol import RespondProofOfWeight
 from chia.server.start_full_node import SERVICE_NAME
 from chia.types.blockchain_format.sized_bytes import bytes32
 from chia.types.blockchain_format.sub_epoch_summary import SubEpochSummary
@@ -424,6 +425,31 @@ class TestWeightProof:
                 samples += 1
         assert samples <= wpf.MAX_SAMPLES
 
+    @pytest.mark.asyncio
+    async def test_weight_proof_cache(self, default_1000_blocks):
+        blocks = default_1000_blocks
+        header_cache, height_to_hash, sub_blocks, summaries = await load_blocks_dont_validate(blocks)
+        wpf = WeightProofHandler(test_constants, BlockCache(sub_blocks, header_cache, height_to_hash, summaries))
+        # Tips after the same sub epoch summary reuse its part of the proof, and the recent chain, whether the chain
+        # grows or not
+        last_ses_height = sorted(summaries.keys())[-1]
+        assert last_ses_height + 2 < len(blocks) - 1
+        tips = [blocks[last_ses_height + 2], blocks[-1], blocks[(last_ses_height + len(blocks)) // 2]]
+        for tip in tips:
+            wp = await wpf.get_proof_of_weight(tip.header_hash)
+            wpf_fresh = WeightProofHandler(
+                test_constants, BlockCache(sub_blocks, header_cache, height_to_hash, summaries)
+            )
+            assert wp == await wpf_fresh.get_proof_of_weight(tip.header_hash)
+        assert wpf.stats["cache_misses"] == 3
+        assert wpf.stats["sub_epoch_part_hits"] == 2
+        assert wpf.stats["recent_chain_blocks_reused"] > 0
+
+        response = await wpf.get_proof_of_weight_response(tips[-1].header_hash)
+        assert wpf.stats["cache_hits"] == 1
+        assert response == bytes(RespondProofOfWeight(wp, tips[-1].header_hash))
+        assert response is await wpf.get_proof_of_weight_response(tips[-1].header_hash)
+
     @pytest.mark.asyncio
     async def test_weight_proof_extend_no_ses(self, default_1000_blocks):
         blocks = default_1000_blocks